@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+sync.py 性能基准测试(需要本地 mysqld,源库和目标库为同一实例的两个库)
+
+在本地 mysqld 上按参数生成合成表(行数、字段宽度、主键类型、变更比例、删除比例),
+端到端调用 sync.process_table 运行以下场景,并把结果追加到结果文件,用于比较不同提交的性能:
+
+1. full: 强制全量同步(清空目标表后复制全部记录)
+2. incremental: 按 change_rate 更新源表记录的 editTime,增量同步
+3. delete: 按 delete_rate 删除源表记录并更新少量记录,增量同步 + 删除检测
+
+每个场景在单独的子进程中运行,分别记录耗时、行/秒和峰值 RSS;
+没有 DataX/JVM 时 datax 引擎使用进程内的 stub(读取 job 配置,用 native 引擎复制并输出 DataX 格式的统计)。
+
+使用示例:
+  python3 bench_sync.py --rows 1000000 --engine native
+  python3 bench_sync.py --key string --width 500 --delete-rate 0.01 --repeat 3
+  python3 bench_sync.py --compare          # 比较结果文件中最近两个提交的结果
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pymysql
+
+import sync
+
+# 测试配置(本地 mysqld)
+MYSQL_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': '123456',
+    'port': 3306,
+    'charset': 'utf8mb4'
+}
+
+SRC_DB = 'bench_src'
+DEST_DB = 'bench_dest'
+BENCH_TABLE = 'bench_sync'
+RESULTS_FILE = 'bench_results.jsonl'
+INSERT_BATCH = 5000
+BASE_TIME = datetime.datetime(2025, 1, 1)
+SCENARIOS = ['full', 'incremental', 'delete']
+# 比较结果时区分不同配置的参数
+CONFIG_KEYS = ['scenario', 'engine', 'datax_stub', 'rows', 'key', 'width', 'columns',
+               'change_rate', 'delete_rate', 'delete_mode']
+
+KEY_DEFINITIONS = {
+    'int': (['id'], "`id` INT NOT NULL"),
+    'bigint': (['id'], "`id` BIGINT NOT NULL"),
+    'string': (['id'], "`id` VARCHAR(32) NOT NULL"),
+    'composite': (['a', 'b'], "`a` INT NOT NULL, `b` INT NOT NULL"),
+}
+
+def get_connection(db=None):
+    return pymysql.connect(db=db, **MYSQL_CONFIG)
+
+def make_key(key_type, i):
+    if key_type == 'int':
+        return (i,)
+    if key_type == 'bigint':
+        return (i * 1000003 + (1 << 40),)
+    if key_type == 'string':
+        return (f"k{(i * 2654435761) % (1 << 32):010d}{i:08d}",)
+    return (i // 100, i % 100)
+
+def create_table_sql(args):
+    pk_fields, key_columns = KEY_DEFINITIONS[args.key]
+    payload = ', '.join(f"`payload{n}` VARCHAR({args.width})" for n in range(args.columns))
+    return (
+        f"CREATE TABLE `{BENCH_TABLE}` ({key_columns}, `name` VARCHAR(64), {payload}, "
+        f"`amount` DECIMAL(12, 2), `editTime` DATETIME NOT NULL, "
+        f"PRIMARY KEY ({', '.join(f'`{k}`' for k in pk_fields)}), KEY `idx_edittime` (`editTime`)"
+        f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
+
+def setup_tables(args):
+    """
+    重建源库和目标库的测试表,源表写入 args.rows 条记录
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            for db in (SRC_DB, DEST_DB):
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db}` DEFAULT CHARSET utf8mb4")
+                cursor.execute(f"DROP TABLE IF EXISTS `{db}`.`{BENCH_TABLE}`")
+                cursor.execute(f"USE `{db}`")
+                cursor.execute(create_table_sql(args))
+            cursor.execute(f"USE `{SRC_DB}`")
+            width = len(KEY_DEFINITIONS[args.key][0]) + 3 + args.columns
+            insert_sql = f"INSERT INTO `{BENCH_TABLE}` VALUES ({', '.join(['%s'] * width)})"
+            payload = 'x' * args.width
+            for start in range(0, args.rows, INSERT_BATCH):
+                rows = [
+                    make_key(args.key, i) + (f"name{i}",) + (payload,) * args.columns
+                    + (i % 100000 / 100, BASE_TIME + datetime.timedelta(seconds=i % 86400))
+                    for i in range(start, min(start + INSERT_BATCH, args.rows))
+                ]
+                cursor.executemany(insert_sql, rows)
+                conn.commit()
+    finally:
+        conn.close()
+
+def mutate_source(args, round_no, change_rate, delete_rate=0.0):
+    """
+    按比例更新/删除源表记录(按主键 CRC32 选取,结果可复现)
+    更新的记录 editTime 设为 BASE_TIME 之后的固定时间,保证每一轮都大于上一轮的水位
+
+    返回:
+        (更新条数, 删除条数)
+    """
+    pk_fields = KEY_DEFINITIONS[args.key][0]
+    key_expr = f"CONCAT_WS(',', {', '.join(f'`{k}`' for k in pk_fields)})"
+    edit_time = (BASE_TIME + datetime.timedelta(days=180, seconds=round_no)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = get_connection(SRC_DB)
+    try:
+        with conn.cursor() as cursor:
+            deleted = 0
+            if delete_rate:
+                deleted = cursor.execute(
+                    f"DELETE FROM `{BENCH_TABLE}` WHERE MOD(CRC32(CONCAT('d', {key_expr})), 1000000) < %s",
+                    (int(delete_rate * 1000000),)
+                )
+            set_clause = f"SET `name` = CONCAT('changed', {round_no}), `editTime` = '{edit_time}'"
+            updated = cursor.execute(
+                f"UPDATE `{BENCH_TABLE}` {set_clause} WHERE MOD(CRC32(CONCAT(%s, {key_expr})), 1000000) < %s",
+                (f"u{round_no}", int(change_rate * 1000000))
+            )
+            if not updated and change_rate:
+                # 小表按比例可能选不到记录: 至少更新一条,保证本轮有新数据
+                updated = cursor.execute(f"UPDATE `{BENCH_TABLE}` {set_clause} LIMIT 1")
+        conn.commit()
+        return updated, deleted
+    finally:
+        conn.close()
+
+def count_rows(db):
+    conn = get_connection(db)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM `{BENCH_TABLE}`")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def stub_datax_job(job_name, contents, channels=1):
+    """
+    DataX stub: 按 job 配置(reader 的表/字段/where,writer 的目标表)用 native 引擎在进程内复制,
+    并输出与 DataX 相同格式的统计信息,经 sync.parse_datax_stats 解析后返回(单连接,忽略 channels/splitPk)
+    """
+    # 与 sync.run_datax_job 一致: DataX 只读取 job.content[0],多个条目视为错误
+    if len(contents) != 1:
+        raise ValueError(f"DataX job 只能包含一个 content 条目(实际 {len(contents)} 个)")
+    started = time.monotonic()
+    reader, writer = contents[0]['reader']['parameter'], contents[0]['writer']['parameter']
+    src_conn, dest_conn = sync.get_connection(sync.SRC_CONFIG), sync.get_connection(sync.DEST_CONFIG)
+    try:
+        transfer = sync.run_native_transfer(
+            reader['connection'][0]['table'][0], reader['column'], reader.get('where') or '1=1',
+            src_conn, dest_conn, dest_table=writer['connection'][0]['table'][0]
+        )
+    finally:
+        src_conn.close()
+        dest_conn.close()
+    if not transfer['ok']:
+        return sync.build_datax_result(False, None, started, error=transfer['error'], log='(stub)')
+    records = transfer['rows']
+    seconds = int(time.monotonic() - started)
+    # native 引擎不统计字节数,stub 的字节数固定为 0
+    output = (
+        f"Total {records} records, 0 bytes | Speed 0B/s, 0 records/s | Error 0 records, 0 bytes\n"
+        f"任务总计耗时                    : {seconds:>18}s\n"
+        f"读出记录总数                    : {records:>20}\n"
+        f"读写失败总数                    : {0:>20}\n"
+    )
+    return sync.build_datax_result(True, sync.parse_datax_stats(output), started)
+
+def configure_sync(args, workdir):
+    """
+    把 sync 模块指向本地测试库,checkpoint 和元数据目录缓存放在临时目录中
+    """
+    sync.SRC_CONFIG.update(MYSQL_CONFIG, db=SRC_DB)
+    sync.DEST_CONFIG.update(MYSQL_CONFIG, db=DEST_DB, local_infile=True)
+    sync.CATALOG_CACHE_FILE = os.path.join(workdir, 'schema_catalog.json')
+    if args.engine == 'datax' and args.datax_stub:
+        sync.run_datax_job = stub_datax_job
+
+def run_scenario(args, workdir, scenario, results):
+    """
+    在子进程中运行一个场景,把结果放入 results 队列
+    """
+    configure_sync(args, workdir)
+    store = sync.SqliteCheckpointStore(os.path.join(workdir, 'checkpoint.db'),
+                                       legacy_json=os.path.join(workdir, 'checkpoint.json'))
+    checkpoints = sync.CheckpointManager(store)
+    try:
+        sync.load_schema_catalogs(refresh=True)
+        started = time.monotonic()
+        result = sync.process_table(
+            BENCH_TABLE, force_full_sync=(scenario == 'full'), truncate_before_sync=(scenario == 'full'),
+            detect_deletes=(scenario == 'delete'), delete_mode=args.delete_mode,
+            engine=args.engine, checkpoints=checkpoints
+        )
+        seconds = time.monotonic() - started
+    finally:
+        checkpoints.close()
+        sync.src_pool.close_all()
+        sync.dest_pool.close_all()
+    # Linux 上 ru_maxrss 单位为 KB,macOS 上为字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    results.put({
+        'status': result.status, 'message': result.message, 'seconds': round(seconds, 3),
+        'rows_written': result.rows_written, 'rows_deleted': result.rows_deleted,
+        'phases': {name: round(value, 3) for name, value in result.phases.items()},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    })
+
+def run_in_child(args, workdir, scenario):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_scenario, args=(args, workdir, scenario, results))
+    process.start()
+    deadline = time.monotonic() + args.timeout
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive() or time.monotonic() > deadline:
+                    process.terminate()
+                    raise RuntimeError(f"{scenario} 场景的子进程异常退出或超时")
+    finally:
+        process.join()
+
+def get_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit or None, dirty
+    except OSError:
+        return None, False
+
+def run_benchmark(args):
+    commit, dirty = get_commit()
+    print(f"📋 {args.rows} 行, 主键 {args.key}, {args.columns} 个 VARCHAR({args.width}) 字段, "
+          f"变更 {args.change_rate:.2%}, 删除 {args.delete_rate:.2%}, 引擎 {args.engine}"
+          + (" (stub)" if args.datax_stub else "") + f", 提交 {commit}{' (有未提交修改)' if dirty else ''}")
+    base = {
+        'commit': commit, 'dirty': dirty, 'engine': args.engine, 'datax_stub': args.datax_stub,
+        'rows': args.rows, 'key': args.key, 'width': args.width, 'columns': args.columns,
+        'change_rate': args.change_rate, 'delete_rate': args.delete_rate, 'delete_mode': args.delete_mode,
+        'python': sys.version.split()[0],
+    }
+    for repeat in range(args.repeat):
+        workdir = tempfile.mkdtemp(prefix='bench_sync_')
+        try:
+            started = time.monotonic()
+            setup_tables(args)
+            print(f"🧱 第 {repeat + 1} 轮: 生成源表 {time.monotonic() - started:.1f} 秒")
+            for scenario in SCENARIOS:
+                if scenario == 'incremental':
+                    mutate_source(args, 1, args.change_rate)
+                elif scenario == 'delete':
+                    mutate_source(args, 2, min(args.change_rate, 0.001), args.delete_rate)
+                outcome = run_in_child(args, workdir, scenario)
+                # full 是其他场景的前置步骤,未选择时只运行不记录
+                if scenario not in args.scenarios:
+                    continue
+                # delete 场景的耗时主要是两端主键对比,按源表行数计算速度
+                rows = args.rows if scenario == 'delete' else outcome['rows_written']
+                record = dict(base, scenario=scenario, repeat=repeat,
+                              timestamp=datetime.datetime.now().isoformat(timespec='seconds'),
+                              rows_per_sec=round(rows / outcome['seconds'], 1) if outcome['seconds'] else None,
+                              **outcome)
+                if scenario == 'delete':
+                    record['consistent'] = count_rows(SRC_DB) == count_rows(DEST_DB)
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                mark = "✅" if outcome['status'] == 'ok' and record.get('consistent', True) else "❌"
+                print(f"{mark} {scenario}: {outcome['seconds']:.2f} 秒, {record['rows_per_sec']} 行/秒, "
+                      f"峰值 RSS {outcome['peak_rss_mb']} MB")
+                if outcome['status'] != 'ok':
+                    print(f"    {outcome['message']}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f"📝 结果已追加到 {args.results}")
+
+def compare_results(path):
+    """
+    按配置分组,比较结果文件中最近两个提交的耗时中位数
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    groups = {}
+    for record in records:
+        config = tuple(record.get(k) for k in CONFIG_KEYS)
+        # 不在 git 仓库中运行时没有提交号
+        commit = (record.get('commit') or '未知提交') + ('+' if record.get('dirty') else '')
+        groups.setdefault(config, {}).setdefault(commit, []).append(record['seconds'])
+    for config, by_commit in groups.items():
+        commits = list(by_commit)[-2:]
+        label = ', '.join(f"{k}={v}" for k, v in zip(CONFIG_KEYS, config) if v is not None)
+        medians = [statistics.median(by_commit[c]) for c in commits]
+        line = ' -> '.join(f"{c}: {m:.2f} 秒" for c, m in zip(commits, medians))
+        if len(medians) == 2 and medians[0] > 0:
+            line += f" ({(medians[1] - medians[0]) / medians[0]:+.1%})"
+        print(f"{label}\n    {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description='sync.py 性能基准测试(本地 mysqld)')
+    parser.add_argument('--rows', type=int, default=100000, help='源表记录数(默认 100000)')
+    parser.add_argument('--key', choices=sorted(KEY_DEFINITIONS), default='int', help='主键类型(默认 int)')
+    parser.add_argument('--width', type=int, default=100, help='每个 VARCHAR 字段的宽度(默认 100)')
+    parser.add_argument('--columns', type=int, default=1, help='VARCHAR 字段数(默认 1)')
+    parser.add_argument('--change-rate', type=float, default=0.01, help='incremental 场景更新的记录比例(默认 0.01)')
+    parser.add_argument('--delete-rate', type=float, default=0.001, help='delete 场景删除的记录比例(默认 0.001)')
+    parser.add_argument('--delete-mode', choices=['merge', 'set', 'hash'], default=sync.DELETE_DETECT_MODE,
+                        help=f'删除检测模式(默认 {sync.DELETE_DETECT_MODE})')
+    parser.add_argument('--engine', choices=sorted(sync.TRANSFER_ENGINES), default='native',
+                        help='传输引擎(默认 native);datax 在没有 DataX/JVM 时使用 stub')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS, help='记录的场景(默认全部)')
+    parser.add_argument('--repeat', type=int, default=1, help='重复次数(默认 1)')
+    parser.add_argument('--timeout', type=int, default=3600, help='单个场景的超时秒数(默认 3600)')
+    parser.add_argument('--results', default=RESULTS_FILE, help=f'结果文件(默认 {RESULTS_FILE})')
+    parser.add_argument('--compare', action='store_true', help='比较结果文件中最近两个提交的结果')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(args.results)
+        return
+    args.datax_stub = args.engine == 'datax' and not (os.path.exists(sync.DATAX_PATH) and shutil.which('java'))
+    try:
+        get_connection().close()
+    except Exception as e:
+        print(f"❌ 连接本地 mysqld 失败: {e}")
+        return
+    run_benchmark(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+测试共用的模拟对象(不依赖数据库)
+
+- FakeConnection / FakeCursor: 记录执行的语句,按 SQL 返回预先配置的结果
+- FakePool: 与 ConnectionPool 相同的 acquire / release / connection() 接口,记录借出的连接数
+- SqliteConnection: sqlite 库,注册 CRC32 / CONCAT_WS / BIT_XOR 等 MySQL 函数,用于需要真实查询结果的测试
+- MemoryStore: 内存中的 checkpoint 存储
+"""
+import sqlite3
+import zlib
+from contextlib import contextmanager
+
+from pymysql.constants import SERVER_STATUS
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+        self.description = None
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        self.conn.calls.append((sql, None if params is None else list(params)))
+        self.rows, columns = self.conn.respond(sql, params)
+        self.description = [(name,) for name in columns] if columns else None
+        # 带参数的语句(按主键删除)按参数个数计算影响行数
+        self.rowcount = len(params) // self.conn.key_width if params else len(self.rows)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.conn.statements.append(sql)
+        self.conn.calls.append((sql, rows))
+        self.conn.respond(sql, rows)
+        self.rowcount = len(rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self):
+        batch, self.rows = self.rows, []
+        return batch
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class FakeConnection:
+    """
+    on(match, result) 配置查询结果,按添加顺序取第一条匹配的规则,没有匹配时返回空结果
+    - match: SQL 中包含的字符串,或 callable(sql) -> bool
+    - result: 行列表;异常实例(执行时抛出);或 callable(sql, params) -> 行列表(可以抛出异常)
+    - columns: 结果的列名(cursor.description)
+    healthy=False 时 ping() 失败(连接已断开);server_status 与 pymysql 连接一样记录是否有未结束的事务
+    """
+    def __init__(self, key_width=1):
+        self.key_width = key_width
+        self.rules = []
+        self.statements = []
+        self.calls = []  # [(sql, 参数)]
+        self.commits = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.healthy = True
+        self.open = True
+        self.server_status = 0
+
+    def on(self, match, result, columns=None):
+        self.rules.append((match, result, columns))
+        return self
+
+    def respond(self, sql, params):
+        for match, result, columns in self.rules:
+            if match(sql) if callable(match) else match in sql:
+                if isinstance(result, Exception):
+                    raise result
+                rows = result(sql, params) if callable(result) else result
+                return list(rows), columns
+        return [], None
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status &= ~SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if not self.healthy:
+            raise ConnectionError("MySQL server has gone away")
+
+    def close(self):
+        self.open = False
+
+class FakePool:
+    """
+    conn 为每次借出的连接(为异常实例时 acquire 抛出);factory 不为空时每次借出新建的连接,归还时关闭
+    """
+    def __init__(self, conn=None, factory=None):
+        self.conn = conn
+        self.factory = factory
+        self.acquired = 0
+        self.held = 0
+
+    def acquire(self):
+        self.acquired += 1
+        if isinstance(self.conn, Exception):
+            raise self.conn
+        self.held += 1
+        return self.factory() if self.factory else self.conn
+
+    def release(self, conn):
+        if conn is not None:
+            self.held -= 1
+            if self.factory:
+                conn.close()
+
+    def discard(self, conn):
+        self.release(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+class BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+class SqliteCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.raw.cursor()
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        # ISNULL 在 sqlite 中是关键字,改名后注册为函数
+        self.cursor.execute(sql.replace('%s', '?').replace('ISNULL(', 'IS_NULL('), params or ())
+
+    def executemany(self, sql, rows):
+        self.conn.statements.append(sql)
+        self.cursor.executemany(sql.replace('%s', '?'), rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class SqliteConnection:
+    """提供与 pymysql 连接相同的 cursor() 上下文管理器接口"""
+    def __init__(self, path=':memory:'):
+        self.raw = sqlite3.connect(path)
+        self.raw.create_function('CRC32', 1, lambda v: zlib.crc32(str(v).encode('utf-8')))
+        self.raw.create_function('CONCAT_WS', -1, lambda sep, *vals: sep.join(str(v) for v in vals if v is not None))
+        self.raw.create_function('CONCAT', -1, lambda *vals: ''.join(str(v) for v in vals))
+        self.raw.create_function('IS_NULL', 1, lambda v: int(v is None))
+        self.raw.create_aggregate('BIT_XOR', 1, BitXor)
+        self.statements = []
+
+    def load(self, ddl, rows=()):
+        """建表并写入初始数据,返回自身"""
+        self.raw.execute(ddl)
+        rows = list(rows)
+        if rows:
+            table = ddl.split()[2]
+            self.raw.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        self.raw.commit()
+        return self
+
+    def cursor(self, cursor_class=None):
+        return SqliteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    def load_all(self, namespace='watermark'):
+        return dict(self.data.get(namespace, {}))
+
+    def set_many(self, items, namespace='watermark'):
+        self.data.setdefault(namespace, {}).update(items)
+
+    def close(self):
+        pass
@@ -1,16 +1,87 @@
 import pymysql
+import re
 import subprocess
 import sys
 import os
 import json
+import sqlite3
+import tempfile
+import datetime
 import threading
+import signal
+import time
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as wait_futures, FIRST_COMPLETED
+from pymysql.constants import SERVER_STATUS
+from pymysql.converters import escape_item
+
+# CDC 模式(--cdc)依赖 mysql-replication,未安装时其他功能不受影响
+try:
+    from pymysqlreplication import BinLogStreamReader
+    from pymysqlreplication.event import XidEvent, HeartbeatLogEvent
+    from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+except ImportError:
+    BinLogStreamReader = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ================= 配置区域 =================
 DATAX_PATH = "/Users/demon/Downloads/datax/bin/datax.py"
 CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_DB_FILE = "checkpoint.db"  # sqlite 后端的 checkpoint 库
+CHECKPOINT_BACKEND = "sqlite"  # checkpoint 后端: sqlite(WAL,每次更新 O(1)) / json(原 checkpoint.json 格式)
+CHECKPOINT_FLUSH_INTERVAL = 5  # checkpoint 批量写入后端的间隔秒数
+CATALOG_CACHE_FILE = "schema_catalog.json"  # 元数据目录缓存(按库结构指纹失效)
 MAX_WORKERS = 8  # 并发线程数
+POOL_SIZE = MAX_WORKERS + 2  # 每个数据库端点连接池保留的空闲连接数(命令行运行时按 --max-workers 计算)
+POOL_MAX_OPEN = 2 * MAX_WORKERS + 2  # 每个数据库端点同时打开的连接数上限(命令行运行时按 --max-workers 计算)
+POOL_ACQUIRE_TIMEOUT = 300  # 连接数达到上限时 acquire() 最多等待的秒数,超时抛出 TimeoutError
+STREAM_BUDGET_READERS = None  # 整个运行同时传输的源库读取流上限(DataX 每个通道一个),None 为不限制
+STREAM_BUDGET_WRITERS = None  # 整个运行同时传输的目标库写入流上限(DataX 每个通道一个),None 为不限制
+POOL_PING_INTERVAL = 30  # 连接空闲超过该秒数后,取出时先 ping 检查(失效自动重连)
+DELETE_DETECT_MODE = "merge"  # 删除检测模式: merge(流式有序归并,内存恒定) / set(全量主键集合) / hash(分段哈希,只传摘要)
+MERGE_FETCH_SIZE = 10000  # merge 模式下每次从服务端游标拉取的主键行数
+DELETE_BATCH_SIZE = 1000  # 删除多余记录时每条 DELETE 语句(每个事务)包含的主键数
+DELETE_PRECHECK = "count"  # 删除检测前的预检: count(两端 COUNT(*) + 主键 MIN/MAX) / checksum(另加主键集合校验和) / off
+HASH_FANOUT = 64  # hash 模式下每个分段细分的子分段数
+HASH_LEAF_ROWS = 2000  # hash 模式下分段行数不超过该值时直接拉取主键对比
+VERIFY_CHUNK_ROWS = 100000  # --verify 每个主键分段的估算行数(两端各计算一次行哈希摘要)
+VERIFY_REPORT_FILE = "verify_report.json"  # --verify 不一致分段的报告文件
+TRANSFER_ENGINE = "datax"  # 传输引擎: datax(每张表启动 DataX) / native(进程内 pymysql 流式读写)
+WRITE_MODE = "replace"  # 写入模式: replace(REPLACE INTO) / update(INSERT ... ON DUPLICATE KEY UPDATE)
+NATIVE_BATCH_SIZE = 2000  # native 引擎每批读取/写入(每个事务)的行数
+LOAD_DATA_DIR = None  # load 引擎的中转文件目录(None 为系统临时目录),需要能容纳最大一段数据
+SHADOW_SUFFIX = "__shadow"  # --shadow-swap 全量同步时的影子表后缀
+CDC_SERVER_ID = 4379  # CDC 模式读取 binlog 时使用的 server_id,不能与源库的其他从库重复
+CDC_BATCH_ROWS = 5000  # CDC 模式每个目标库事务最多应用的行变更数
+CDC_FLUSH_INTERVAL = 1  # CDC 模式攒批的最长秒数(同时作为 binlog 心跳间隔)
+DAEMON_MIN_INTERVAL = 5  # --daemon 模式下表的最短轮询间隔(秒),有变化的表间隔减半直到该值
+DAEMON_MAX_INTERVAL = 3600  # --daemon 模式下表的最长轮询间隔(秒),无变化的表间隔加倍直到该值
+GOVERNOR_MIN_WORKERS = 1  # --adaptive-workers 时并发线程数的下限(上限为 --max-workers)
+GOVERNOR_INTERVAL = 10  # --adaptive-workers 时采样源库负载的间隔(秒)
+GOVERNOR_MAX_THREADS_RUNNING = 32  # 源库 Threads_running 超过该值时并发减半
+GOVERNOR_MAX_REPLICA_LAG = 30  # 源库(为从库时)复制延迟超过该值(秒)时并发减半
+GOVERNOR_MAX_PROBE_MS = 200  # 探测查询耗时超过该值(毫秒)时并发减半
+GOVERNOR_PROBE_SQL = "SELECT 1"  # 探测查询,可替换为业务表上的轻量查询
+DAEMON_CATALOG_REFRESH = 600  # --daemon 模式下重新加载元数据目录和表清单的间隔(秒)
+SYNC_CHUNK_ROWS = 1000000  # 大表按 (editTime, 主键) 分段传输,每段的行数;每段成功后记录 checkpoint,中断后从断点继续
+DATAX_ROWS_PER_CHANNEL = 500000  # DataX 每个通道负责的估算行数,按此计算单表的通道数
+DATAX_MAX_CHANNELS = 8  # DataX 单个 job 的最大通道数
+GROUP_SMALL_TABLE_ROWS = 50000  # 估算行数不超过该值的表视为小表,可合并进同一个批量任务(native 引擎,不启动 JVM)
+GROUP_MAX_TABLES = 30  # 每个小表批量任务最多包含的表数
+GROUP_MAX_ROWS = 500000  # 每个小表批量任务内各表估算行数之和的上限
+TABLE_FIXED_COST = 20 * 1024 * 1024  # 调度估算: 每张表的固定开销(折算为字节数)
+INCREMENTAL_COST_RATIO = 0.05  # 调度估算: 增量同步的数据量约为全表的比例
+PK_SCAN_BYTES_PER_ROW = 16  # 调度估算: 删除检测每行主键的字节数
+SKIP_UNCHANGED_CHECKSUM = False  # 跳过未变化的表: 无 editTime 的表额外用 CHECKSUM TABLE 判断(扫描整表并阻塞写入,默认关闭,--skip-unchanged-checksum 开启)
+METRICS_JSONL_FILE = "sync_metrics.jsonl"  # 每次运行结束追加每张表的阶段耗时/行数/字节数和运行汇总(JSON lines),None 为不写入
+THROUGHPUT_REGRESSION_RATIO = 0.5  # 单表传输速度(行/秒)低于历史基线的该比例时标记为吞吐下降
+THROUGHPUT_MIN_ROWS = 10000  # 传输行数不少于该值时才比较吞吐(少量增量的速度主要由固定开销决定)
+METRICS_PROM_FILE = None  # Prometheus textfile collector 文件(如 /var/lib/node_exporter/textfile/mysql_sync.prom),None 为不写入
 
 # 源数据库
 SRC_CONFIG = {
@@ -21,47 +92,495 @@ SRC_CONFIG = {
 # 本地数据库
 DEST_CONFIG = {
     'host': 'localhost', 'user': 'root', 'password': '123456',
-    'db': 'meicloud_plm', 'port': 3306, 'charset': 'utf8'
+    'db': 'meicloud_plm', 'port': 3306, 'charset': 'utf8',
+    'local_infile': True  # load 引擎需要 LOAD DATA LOCAL INFILE(服务端也需开启 local_infile)
 }
 # ===========================================
 
-file_lock = threading.Lock()
-
 def get_connection(config):
     return pymysql.connect(
         host=config['host'], user=config['user'], password=config['password'],
-        db=config['db'], port=config['port'], charset=config['charset']
+        db=config['db'], port=config['port'], charset=config['charset'],
+        local_infile=config.get('local_infile', False)
     )
 
-def load_checkpoint():
-    if not os.path.exists(CHECKPOINT_FILE):
-        return {}
-    with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+def default_pool_limits(workers):
+    """
+    按并发表数计算连接池的默认大小: (保留的空闲连接数, 同时打开的连接数上限)
+    每张表最多同时占用一个源库连接和两个目标库连接(merge 删除检测另开一个读取连接),另留 2 个给主线程和负载采样
+    """
+    return workers + 2, 2 * workers + 2
+
+class ConnectionPool:
+    """
+    线程安全的连接池(每个数据库端点一个),在各张表之间复用连接,避免每张表重新握手认证
+    
+    - acquire() 优先复用空闲连接,没有空闲连接时新建;
+      已打开 max_open 个连接时等待其他线程归还,超过 timeout 秒抛出 TimeoutError(max_open 为 None 时不限制)
+    - 空闲超过 ping_interval 秒的连接在取出时做健康检查,失效则重连
+    - release() 时回滚未结束的事务(避免下一张表读到旧的一致性快照),
+      空闲连接超过 size 个时直接关闭
+    - 不再归还的连接(如出错后关闭)用 discard() 释放名额
+    """
+    def __init__(self, config, size=POOL_SIZE, ping_interval=POOL_PING_INTERVAL, max_open=POOL_MAX_OPEN,
+                 timeout=POOL_ACQUIRE_TIMEOUT):
+        self.config = config
+        self.size = size
+        self.ping_interval = ping_interval
+        self.max_open = max_open
+        self.timeout = timeout
+        self._idle = []  # [(连接, 放回时间)],后进先出
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self.open = 0  # 已打开(空闲 + 使用中)的连接数
+        self.created = 0
+        self.reused = 0
+        self.waits = 0  # 因达到连接数上限而等待的次数
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._available:
+                while not self._idle and self.max_open is not None and self.open >= self.max_open:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待 {self.timeout} 秒仍无可用连接(已打开 {self.open} 个,上限 {self.max_open})")
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._available.wait(remaining)
+                if not self._idle:
+                    self.open += 1
+                    self.created += 1
+                    break
+                conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.ping_interval:
+                with self._lock:
+                    self.reused += 1
+                return conn
+            try:
+                conn.ping(reconnect=True)
+                with self._lock:
+                    self.reused += 1
+                return conn
+            except Exception:
+                self.discard(conn)
         try:
-            return json.load(f)
-        except:
+            return get_connection(self.config)
+        except Exception:
+            self.discard(None)
+            raise
+
+    def release(self, conn):
+        if conn is None:
+            return
+        try:
+            if not conn.open:
+                self.discard(conn)
+                return
+            if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                conn.rollback()
+        except Exception:
+            self.discard(conn)
+            return
+        with self._available:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+                return
+        self.discard(conn)
+
+    def discard(self, conn):
+        """关闭一个取出后不再归还的连接,释放其占用的名额"""
+        if conn is not None:
+            self._close(conn)
+        with self._available:
+            self.open -= 1
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self.open -= len(idle)
+            self._available.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# 源库/目标库连接池(连接在首次使用时才创建)
+src_pool = ConnectionPool(SRC_CONFIG)
+dest_pool = ConnectionPool(DEST_CONFIG)
+
+class CheckpointCorruptedError(Exception):
+    """checkpoint 文件无法解析(不再静默返回 {} 触发全量重同步)"""
+
+# checkpoint 命名空间: watermark 为各表的同步水位(原 checkpoint.json 的内容),
+# state 为各表上次成功同步时观察到的源表状态(用于跳过未变化的表)
+WATERMARK = 'watermark'
+TABLE_STATE = 'state'
+BINLOG = 'binlog'  # CDC 模式已应用到的 binlog 位置,按源库 host:port 保存
+THROUGHPUT = 'throughput'  # 每张表传输速度的历史基线,用于发现吞吐下降
+
+class JsonCheckpointStore:
+    """
+    JSON 文件 checkpoint 后端(兼容原有 checkpoint.json 格式)
+    每次更新先写临时文件并 fsync,再用 os.replace 原子替换,崩溃时不会留下半个文件
+    watermark 保存在 checkpoint.json,其他命名空间保存在 checkpoint.<命名空间>.json
+    """
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {WATERMARK: self._read(path)}
+
+    def _path_of(self, namespace):
+        if namespace == WATERMARK:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{namespace}{ext}"
+
+    @staticmethod
+    def _read(path):
+        if not os.path.exists(path):
             return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                return json.load(f)
+            except ValueError as e:
+                raise CheckpointCorruptedError(f"{path} 无法解析: {e}")
+
+    def _namespace_data(self, namespace):
+        if namespace not in self._data:
+            self._data[namespace] = self._read(self._path_of(namespace))
+        return self._data[namespace]
+
+    def load_all(self, namespace=WATERMARK):
+        with self._lock:
+            return dict(self._namespace_data(namespace))
+
+    def set_many(self, items, namespace=WATERMARK):
+        with self._lock:
+            data = self._namespace_data(namespace)
+            data.update(items)
+            path = self._path_of(namespace)
+            temp_file = path + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, path)
+
+    def close(self):
+        pass
+
+class SqliteCheckpointStore:
+    """
+    SQLite(WAL 模式)checkpoint 后端
+    每次更新是一条 UPSERT 的独立事务,开销与表的数量无关;synchronous=FULL 保证提交即落盘
+    首次打开时自动从原有的 checkpoint.json 一次性迁移
+    watermark 保存在 checkpoints 表,其他命名空间保存在 checkpoints_<命名空间> 表
+    """
+    def __init__(self, path=CHECKPOINT_DB_FILE, legacy_json=CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._tables = set()
+        self.migrated = self._migrate_from_json(legacy_json)
+
+    def _table_of(self, namespace):
+        """
+        返回命名空间对应的表名(首次使用时建表),调用方需持有 self._lock
+        """
+        table = 'checkpoints' if namespace == WATERMARK else f"checkpoints_{namespace}"
+        if table not in self._tables:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "name TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._tables.add(table)
+        return table
+
+    def _migrate_from_json(self, legacy_json):
+        """
+        一次性迁移: 只在从未迁移过时导入 checkpoint.json,返回导入的条数
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+            if done or not legacy_json or not os.path.exists(legacy_json):
+                return 0
+        data = JsonCheckpointStore(legacy_json).load_all()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert(data, WATERMARK)
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (legacy_json,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(data)
+
+    def _upsert(self, items, namespace):
+        now = time.time()
+        self._conn.executemany(
+            f"INSERT INTO {self._table_of(namespace)} (name, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            [(name, json.dumps(value, ensure_ascii=False), now) for name, value in items.items()]
+        )
+
+    def load_all(self, namespace=WATERMARK):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT name, value FROM {self._table_of(namespace)}").fetchall()
+        return {name: json.loads(value) for name, value in rows}
+
+    def set_many(self, items, namespace=WATERMARK):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert(items, namespace)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+CHECKPOINT_BACKENDS = {
+    'json': JsonCheckpointStore,
+    'sqlite': SqliteCheckpointStore,
+}
+
+class CheckpointManager:
+    """
+    每次运行创建一次的 checkpoint 管理器,由 main 传给各个工作线程
+    
+    - 读取全部走内存视图,不再每张表重新读取/解析 checkpoint
+    - commit() 只在表的传输成功后调用,写入先进入待提交队列,
+      由后台线程每 flush_interval 秒批量写入后端,退出时 close() 再写入剩余部分
+    """
+    def __init__(self, store, flush_interval=CHECKPOINT_FLUSH_INTERVAL):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._views = {WATERMARK: store.load_all(WATERMARK)}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._flush_loop, name="checkpoint-flush", daemon=True)
+        self._thread.start()
+        return self
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"    ⚠️  checkpoint 写入失败(稍后重试): {str(e)}")
+
+    def _view(self, namespace):
+        """调用方需持有 self._lock"""
+        if namespace not in self._views:
+            self._views[namespace] = self.store.load_all(namespace)
+        return self._views[namespace]
+
+    def get(self, table, default=None, namespace=WATERMARK):
+        with self._lock:
+            return self._view(namespace).get(table, default)
+
+    def commit(self, table, value, namespace=WATERMARK):
+        """
+        记录一张表的新 checkpoint,调用方必须保证该表的传输已经成功
+        """
+        with self._lock:
+            self._view(namespace)[table] = value
+            self._pending.setdefault(namespace, {})[table] = value
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        written = 0
+        for namespace in list(pending):
+            try:
+                self.store.set_many(pending[namespace], namespace)
+            except Exception:
+                # 写入失败: 放回队列,期间更新过的表以较新的值为准
+                with self._lock:
+                    for ns, items in pending.items():
+                        self._pending[ns] = {**items, **self._pending.get(ns, {})}
+                raise
+            written += len(pending.pop(namespace))
+        return written
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            self.store.close()
+
+# 未使用 CheckpointManager 时(如单独调用 process_table)的后端,首次使用时打开
+checkpoint_store = None
+
+def open_checkpoint_store(backend=CHECKPOINT_BACKEND):
+    global checkpoint_store
+    checkpoint_store = CHECKPOINT_BACKENDS[backend]()
+    return checkpoint_store
+
+def load_checkpoint():
+    if checkpoint_store is None:
+        open_checkpoint_store()
+    return checkpoint_store.load_all()
 
 def update_checkpoint(table, time_str):
-    with file_lock:
-        data = load_checkpoint()
-        data[table] = time_str
-        with open(CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+    if checkpoint_store is None:
+        open_checkpoint_store()
+    checkpoint_store.set_many({table: time_str})
+
+def make_watermark(edit_time, pk=None):
+    """
+    构建 checkpoint 水位: 已同步到的 (editTime, 主键)
+    pk 为 None 表示 editTime <= edit_time 的记录已全部同步;
+    无 editTime 的表在全量复制中途中断时 edit_time 为 None,只记录主键进度
+    """
+    return {'edit_time': edit_time, 'pk': list(pk) if pk is not None else None}
+
+def parse_watermark(value):
+    """
+    解析 checkpoint 水位,兼容旧格式(只有 editTime 字符串)
+    返回: (edit_time, 主键元组或 None)
+    """
+    if not value:
+        return None, None
+    if isinstance(value, str):
+        return value, None
+    pk = value.get('pk')
+    return value.get('edit_time'), tuple(pk) if pk is not None else None
+
+def save_watermark(checkpoints, table, value):
+    if checkpoints is not None:
+        checkpoints.commit(table, value)
+    else:
+        update_checkpoint(table, value)
 
-def get_local_max_time(conn, table):
+def get_local_max_time(conn, table, catalog=None):
     try:
         with conn.cursor() as cursor:
-            cursor.execute(f"SHOW TABLES LIKE '{table}'")
-            if not cursor.fetchone(): return None
-            cursor.execute(f"SHOW COLUMNS FROM `{table}` LIKE 'editTime'")
-            if not cursor.fetchone(): return None
+            if catalog:
+                # 元数据目录中已有表和字段信息,无需 SHOW TABLES / SHOW COLUMNS
+                meta = catalog['tables'].get(table)
+                if not meta or not meta['has_edittime']: return None
+            else:
+                cursor.execute(f"SHOW TABLES LIKE '{table}'")
+                if not cursor.fetchone(): return None
+                cursor.execute(f"SHOW COLUMNS FROM `{table}` LIKE 'editTime'")
+                if not cursor.fetchone(): return None
             cursor.execute(f"SELECT MAX(editTime) FROM `{table}`")
             res = cursor.fetchone()
             return str(res[0]) if res and res[0] else None
     except:
         return None
 
+class StreamBudget:
+    """
+    整个运行共享的读取/写入流预算: 每张表(或小表批量任务)传输前按通道数申请,传输结束后归还
+    
+    - 申请数超过预算总量时按总量申请(fit),不会永远等待
+    - 预算不足时排队等待而不是失败,按申请顺序先到先得,大表不会被后来的小表一直插队
+    - readers / writers 为 None 时该项不限制
+    """
+    def __init__(self, readers=STREAM_BUDGET_READERS, writers=STREAM_BUDGET_WRITERS):
+        self.readers = readers
+        self.writers = writers
+        self.used_readers = 0
+        self.used_writers = 0
+        self.peak_readers = 0
+        self.peak_writers = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._queue = []  # 排队中的申请,按先后顺序
+        self._cond = threading.Condition()
+
+    def fit(self, streams):
+        """
+        把一张表希望使用的通道数限制在预算总量以内
+        """
+        for total in (self.readers, self.writers):
+            if total is not None:
+                streams = min(streams, total)
+        return max(1, streams)
+
+    def _available(self, readers, writers):
+        return ((self.readers is None or self.used_readers + readers <= self.readers) and
+                (self.writers is None or self.used_writers + writers <= self.writers))
+
+    def acquire(self, readers, writers):
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            waited = False
+            while self._queue[0] is not ticket or not self._available(readers, writers):
+                waited = True
+                self._cond.wait()
+            self._queue.pop(0)
+            self.used_readers += readers
+            self.used_writers += writers
+            self.peak_readers = max(self.peak_readers, self.used_readers)
+            self.peak_writers = max(self.peak_writers, self.used_writers)
+            if waited:
+                self.waits += 1
+                self.wait_seconds += time.monotonic() - started
+            self._cond.notify_all()
+
+    def release(self, readers, writers):
+        with self._cond:
+            self.used_readers -= readers
+            self.used_writers -= writers
+            self._cond.notify_all()
+
+@contextmanager
+def claim_streams(budget, streams, record=None):
+    """
+    按通道数申请读取/写入流各 streams 个,排队时间计入 record 的 queue 阶段;budget 为 None 时不限制
+    """
+    if budget is None:
+        yield
+        return
+    if record is not None:
+        with record.phase('queue'):
+            budget.acquire(streams, streams)
+    else:
+        budget.acquire(streams, streams)
+    try:
+        yield
+    finally:
+        budget.release(streams, streams)
+
 def get_table_columns_quoted(conn, db, table):
     """
     获取表的所有字段,并给每个字段加上反引号 `field`
@@ -73,275 +592,2606 @@ def get_table_columns_quoted(conn, db, table):
     ORDER BY ORDINAL_POSITION
     """
     with conn.cursor() as cursor:
-        cursor.execute(sql)
-        # 将每个字段名用反引号包起来,解决 KEY, VALUE, CONDITION 等关键字报错问题
-        return [f"`{row[0]}`" for row in cursor.fetchall()]
+        cursor.execute(sql)
+        # 将每个字段名用反引号包起来,解决 KEY, VALUE, CONDITION 等关键字报错问题
+        return [f"`{row[0]}`" for row in cursor.fetchall()]
+
+def get_primary_keys(conn, db, table):
+    """
+    获取表的主键字段列表
+    返回: 主键字段名列表,如果没有主键返回空列表
+    """
+    sql = f"""
+    SELECT COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = '{db}' 
+    AND TABLE_NAME = '{table}'
+    AND CONSTRAINT_NAME = 'PRIMARY'
+    ORDER BY ORDINAL_POSITION
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return [row[0] for row in cursor.fetchall()]
+
+# 字符串类主键在 MySQL 中按排序规则(如 utf8mb4_general_ci)排序,与 Python 的比较顺序不一致,
+# merge 模式下这类主键不在 Python 端比较大小,改为按主键范围分批对比(iter_orphaned_pks_keyset)
+STRING_KEY_TYPES = {'char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'set'}
+
+# 元数据目录: main 启动时为源库/目标库各加载一次,加载失败时为 None,各函数回退为逐表查询
+src_catalog = None
+dest_catalog = None
+
+def get_schema_fingerprint(conn, db):
+    """
+    计算库结构指纹: 所有字段(表名/字段名/位置/类型/键)的 CRC32 之和,只返回一行
+    """
+    sql = f"""
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, DATA_TYPE, COLUMN_KEY))), 0)
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = '{db}'
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        count, checksum = cursor.fetchone()
+        return f"{count}:{checksum}"
+
+def fetch_schema_tables(conn, db):
+    """
+    一次性获取库内所有表的字段、字段类型、主键
+    返回: {表名: {'columns': [...], 'types': {...}, 'primary_keys': [...], 'has_edittime': bool}}
+    """
+    tables = {}
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = '{db}'
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """)
+        for table, column, data_type in cursor.fetchall():
+            meta = tables.setdefault(table, {'columns': [], 'types': {}, 'primary_keys': [], 'has_edittime': False})
+            meta['columns'].append(column)
+            meta['types'][column] = data_type.lower()
+            if column.lower() == 'edittime':
+                meta['has_edittime'] = True
+        
+        cursor.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = '{db}' AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """)
+        for table, column in cursor.fetchall():
+            if table in tables:
+                tables[table]['primary_keys'].append(column)
+    return tables
+
+def disable_stats_cache(conn):
+    """
+    关闭本会话的 information_schema 统计信息缓存(MySQL 8.0 默认缓存 24 小时,UPDATE_TIME 可能过期)
+    返回 True 表示读到的 UPDATE_TIME 是实时值: 设置成功,或服务端没有该变量(5.7 / MariaDB 不缓存)
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        return True
+    except pymysql.err.MySQLError as e:
+        return e.args[0] == 1193  # Unknown system variable
+
+def fetch_table_stats(conn, db):
+    """
+    一次性获取库内所有表的统计信息(估算行数、数据量、最后更新时间)
+    读取前关闭会话的统计信息缓存;无法确认 UPDATE_TIME 是实时值时 update_time 记为 None
+    (跳过未变化的表时不以其为依据)
+    返回: {表名: {'rows': ..., 'data_length': ..., 'update_time': ...}}
+    """
+    fresh = disable_stats_cache(conn)
+    sql = f"""
+    SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = '{db}'
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return {
+            row[0]: {'rows': row[1] or 0, 'data_length': row[2] or 0,
+                     'update_time': str(row[3]) if row[3] and fresh else None}
+            for row in cursor.fetchall()
+        }
+
+def load_schema_catalog(conn, db, cached=None, refresh=False):
+    """
+    加载一个库的元数据目录
+    结构指纹与缓存一致时直接使用缓存的字段/主键信息,只刷新统计信息;
+    总共 2 条查询(指纹 + 统计),指纹变化时再加 2 条批量查询
+    
+    返回:
+        {'fingerprint': ..., 'tables': {...}, 'stats': {...}, 'from_cache': bool}
+    """
+    fingerprint = get_schema_fingerprint(conn, db)
+    from_cache = bool(not refresh and cached and cached.get('fingerprint') == fingerprint)
+    tables = cached['tables'] if from_cache else fetch_schema_tables(conn, db)
+    return {
+        'fingerprint': fingerprint,
+        'tables': tables,
+        'stats': fetch_table_stats(conn, db),
+        'from_cache': from_cache,
+    }
+
+def load_schema_catalogs(refresh=False):
+    """
+    加载源库和目标库的元数据目录,并把结构信息缓存到 CATALOG_CACHE_FILE
+    """
+    global src_catalog, dest_catalog
+    cache = {}
+    if not refresh and os.path.exists(CATALOG_CACHE_FILE):
+        try:
+            with open(CATALOG_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except Exception:
+            cache = {}
+    
+    catalogs = {}
+    for role, config, pool in (('src', SRC_CONFIG, src_pool), ('dest', DEST_CONFIG, dest_pool)):
+        with pool.connection() as conn:
+            cached = cache.get(f"{config['host']}:{config['port']}/{config['db']}")
+            catalogs[role] = load_schema_catalog(conn, config['db'], cached, refresh)
+    src_catalog, dest_catalog = catalogs['src'], catalogs['dest']
+    
+    # 只缓存结构信息,统计信息每次运行都重新获取
+    cache = {
+        f"{config['host']}:{config['port']}/{config['db']}": {
+            'fingerprint': catalogs[role]['fingerprint'], 'tables': catalogs[role]['tables']
+        }
+        for role, config in (('src', SRC_CONFIG), ('dest', DEST_CONFIG))
+    }
+    temp_file = CATALOG_CACHE_FILE + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(temp_file, CATALOG_CACHE_FILE)
+    return src_catalog, dest_catalog
+
+def get_table_meta(conn, db, table, catalog=None):
+    """
+    获取表的元数据(字段、字段类型、主键、是否有 editTime)
+    优先使用元数据目录,目录中没有该表时回退为逐表查询
+    """
+    if catalog and table in catalog['tables']:
+        return catalog['tables'][table]
+    columns = [col.strip('`') for col in get_table_columns_quoted(conn, db, table)]
+    return {
+        'columns': columns,
+        'types': get_column_types(conn, db, table),
+        'primary_keys': get_primary_keys(conn, db, table),
+        'has_edittime': any(col.lower() == 'edittime' for col in columns),
+    }
+
+def get_table_sizes(conn, db):
+    """
+    一次性获取库内所有表的估算大小(information_schema.TABLES,InnoDB 的 TABLE_ROWS 为估算值)
+    返回: {表名: (估算行数, 数据字节数)}
+    """
+    sql = f"""
+    SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = '{db}'
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return {row[0]: (row[1] or 0, row[2] or 0) for row in cursor.fetchall()}
+
+def plan_table_groups(tables, table_sizes, small_rows=GROUP_SMALL_TABLE_ROWS,
+                      max_tables=GROUP_MAX_TABLES, max_rows=GROUP_MAX_ROWS):
+    """
+    按估算行数把小表分组,大表(或无统计信息的表)单独运行
+    返回: (单独运行的表列表, [小表分组, ...])
+    """
+    single_tables = []
+    small_tables = []
+    for table in tables:
+        if table in table_sizes and table_sizes[table][0] <= small_rows:
+            small_tables.append(table)
+        else:
+            single_tables.append(table)
+    
+    groups = []
+    current, current_rows = [], 0
+    for table in small_tables:
+        rows = table_sizes[table][0]
+        if current and (len(current) >= max_tables or current_rows + rows > max_rows):
+            groups.append(current)
+            current, current_rows = [], 0
+        current.append(table)
+        current_rows += rows
+    if current:
+        groups.append(current)
+    
+    # 只有一张表的分组没有合并的意义
+    for group in [g for g in groups if len(g) == 1]:
+        groups.remove(group)
+        single_tables.extend(group)
+    return single_tables, groups
+
+def estimate_table_cost(table, stats=None, meta=None, checkpoint=None, force_full_sync=False, detect_deletes=True):
+    """
+    估算一张表的处理耗时(以"需要搬运的字节数"为单位),用于最长处理时间优先(LPT)调度
+    
+    - 固定开销: 每张表的连接/元数据/进程启动成本 TABLE_FIXED_COST
+    - 传输: 全量(无 editTime 或 --full)按 DATA_LENGTH 计;增量按 DATA_LENGTH * INCREMENTAL_COST_RATIO 计,
+            如果 UPDATE_TIME 不晚于 checkpoint 则视为没有待同步的数据
+    - 删除检测: 按 TABLE_ROWS * 每个主键的字节数计
+    """
+    if not stats:
+        # 没有统计信息的表无法估算,排在最前面,避免未知的大表最后才开始
+        return float('inf')
+    data_length = stats.get('data_length') or 0
+    rows = stats.get('rows') or 0
+    cost = TABLE_FIXED_COST
+    if force_full_sync or not (meta and meta.get('has_edittime')):
+        cost += data_length
+    elif not (checkpoint and stats.get('update_time') and stats['update_time'] <= (parse_watermark(checkpoint)[0] or '')):
+        cost += data_length * INCREMENTAL_COST_RATIO
+    if detect_deletes:
+        cost += rows * PK_SCAN_BYTES_PER_ROW
+    return cost
+
+def order_by_expected_cost(units, cost_of):
+    """
+    按预计耗时从大到小排序(LPT),线程池按提交顺序取任务,
+    大表最先开始,整体完成时间趋近于 总工作量 / 并发数
+    """
+    return sorted(units, key=cost_of, reverse=True)
+
+def observe_table_states(conn, tables, catalog, use_checksum=SKIP_UNCHANGED_CHECKSUM):
+    """
+    同步开始前观察源表的状态,用于判断表自上次成功同步后是否变化
+    
+    - update_time: information_schema.TABLES.UPDATE_TIME(来自元数据目录,不额外查询);
+      与当前时间同一秒内的值不可靠(同一秒内的后续写入不会改变它),记为 None
+    - checksum: use_checksum=True 时,无 editTime(每次全量复制)的表批量执行一次 CHECKSUM TABLE;
+      CHECKSUM TABLE 会扫描整张表并在执行期间阻塞写入,只在显式开启时使用
+    
+    返回: {表名: {'update_time': ..., 'checksum': ...}}
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT NOW()")
+        now = str(cursor.fetchone()[0])
+        states = {}
+        for table in tables:
+            update_time = catalog['stats'].get(table, {}).get('update_time')
+            states[table] = {'update_time': update_time if update_time and update_time < now else None}
+        
+        checksum_tables = [t for t in tables if not catalog['tables'].get(t, {}).get('has_edittime')]
+        if use_checksum and checksum_tables:
+            cursor.execute("CHECKSUM TABLE " + ', '.join(f"`{t}`" for t in checksum_tables))
+            # 返回的表名形如 "库名.表名"
+            checksums = {name.split('.', 1)[1]: value for name, value in cursor.fetchall()}
+            for table in checksum_tables:
+                states[table]['checksum'] = checksums.get(table)
+    return states
+
+def is_table_unchanged(saved, current):
+    """
+    saved 为上次成功同步时记录的状态,current 为本次观察到的状态,任一信号一致即视为未变化
+    """
+    if not saved or not current:
+        return False
+    if current.get('update_time') and current['update_time'] == saved.get('update_time'):
+        return True
+    if current.get('checksum') is not None and current['checksum'] == saved.get('checksum'):
+        return True
+    return False
+
+def find_unchanged_tables(tables, states, checkpoints):
+    """
+    返回自上次成功同步后确定没有变化的表(可直接跳过,不占用线程和连接)
+    """
+    return [
+        table for table in tables
+        if is_table_unchanged(checkpoints.get(table, namespace=TABLE_STATE), states.get(table))
+    ]
+
+def find_advanced_tables(conn, tables, checkpoints):
+    """
+    常驻模式的第二个变化信号: 有 editTime 水位的表用一条 UNION ALL 查询各表的 MAX(editTime),
+    返回超过已同步水位的表(即使 UPDATE_TIME 判断为未变化,也不应跳过)
+    """
+    watermarks = {}
+    for table in tables:
+        edit_time, pk = parse_watermark(checkpoints.get(table))
+        if edit_time and pk is None:
+            watermarks[table] = edit_time
+    if not watermarks:
+        return []
+    sql = " UNION ALL ".join(f"SELECT '{table}', MAX(editTime) FROM `{table}`" for table in watermarks)
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return [table for table, max_time in cursor.fetchall()
+                if max_time is not None and str(max_time) > watermarks[table]]
+
+def find_polled_unchanged_tables(conn, tables, catalog, checkpoints, poll_cache, now):
+    """
+    常驻模式轮询时判断到期的表是否未变化,poll_cache 在各次轮询之间保留:
+    - 统计信息(UPDATE_TIME)最多每 DAEMON_MIN_INTERVAL 秒读取一次,不随每次轮询刷新
+    - 有 editTime 水位的表只在 UPDATE_TIME 与上次确认时不同时才查询 MAX(editTime)
+    返回: (观察到的状态, 未变化的表集合)
+    """
+    if now - poll_cache.get('stats_at', float('-inf')) >= DAEMON_MIN_INTERVAL:
+        catalog['stats'] = fetch_table_stats(conn, SRC_CONFIG['db'])
+        poll_cache['stats_at'] = now
+    states = observe_table_states(conn, tables, catalog, use_checksum=False)
+    unchanged = set(find_unchanged_tables(tables, states, checkpoints))
+    # UPDATE_TIME 可能是缓存值: 有 editTime 的表再确认 MAX(editTime) 没有超过水位,同一个 UPDATE_TIME 只确认一次
+    confirmed = poll_cache.setdefault('confirmed', {})
+    edit_tables = [t for t in unchanged if catalog['tables'].get(t, {}).get('has_edittime')
+                   and confirmed.get(t) != states[t]['update_time']]
+    advanced = set(find_advanced_tables(conn, edit_tables, checkpoints))
+    for table in edit_tables:
+        if table not in advanced:
+            confirmed[table] = states[table]['update_time']
+    return states, unchanged - advanced
+
+def get_column_types(conn, db, table):
+    """
+    获取表的字段类型
+    返回: {字段名: DATA_TYPE(小写)}
+    """
+    sql = f"""
+    SELECT COLUMN_NAME, DATA_TYPE
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = '{db}' AND TABLE_NAME = '{table}'
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return {row[0]: row[1].lower() for row in cursor.fetchall()}
+
+def stream_primary_keys(conn, table, pk_fields, where_clause="1=1", fetch_size=MERGE_FETCH_SIZE):
+    """
+    使用服务端游标(SSCursor)按主键索引顺序流式读取主键,内存占用只与 fetch_size 有关
+    """
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(f"SELECT {pk_columns} FROM `{table}` WHERE {where_clause} ORDER BY {pk_columns}")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
+
+def confirm_orphaned_pks(src_conn, table, pk_fields, candidates, batch_size=DELETE_BATCH_SIZE):
+    """
+    在源库确认候选的多余主键: Python 按值比较时,不区分大小写或 PAD SPACE 的排序规则下 MySQL 视为相同的主键
+    ('a' 与 'A'、'x' 与 'x ')会被当作源表没有;把候选主键发回源库,按列的排序规则与源表比较,只保留确实不存在的
+    返回: 确认多余的主键列表(保持候选顺序)
+    """
+    candidates = list(candidates)
+    orphaned = []
+    matches = ' AND '.join(f"`{pk}` = c.k{i}" for i, pk in enumerate(pk_fields))
+    row_sql = "SELECT %s AS i, " + ', '.join(f"%s AS k{i}" for i in range(len(pk_fields)))
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        params = [value for i, key in enumerate(batch) for value in (i, *key)]
+        with src_conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT c.i FROM ({' UNION ALL '.join([row_sql] * len(batch))}) c "
+                f"WHERE EXISTS (SELECT 1 FROM `{table}` WHERE {matches})",
+                params
+            )
+            present = {int(row[0]) for row in cursor.fetchall()}
+        orphaned.extend(key for i, key in enumerate(batch) if i not in present)
+    return orphaned
+
+def iter_orphaned_pks_keyset(src_conn, dest_conn, table, pk_fields, fetch_size=MERGE_FETCH_SIZE):
+    """
+    按主键范围分批对比(含字符串字段的主键): 源表每次按主键顺序读取 fetch_size 个主键,
+    目标表读取同一范围 (上一批末尾, 本批末尾] 内的主键,不在源表这一批中的作为候选
+    排序和范围比较都由 MySQL 按列的排序规则在主键索引上完成;Python 按值比较得到的候选
+    再发回源库按排序规则确认(confirm_orphaned_pks),MySQL 视为相同的主键不会被删除
+    """
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    lower = None
+    while True:
+        with src_conn.cursor() as cursor:
+            cursor.execute(f"SELECT {pk_columns} FROM `{table}` WHERE {build_key_range_where(pk_fields, lower, None)} "
+                           f"ORDER BY {pk_columns} LIMIT {fetch_size}")
+            src_keys = [tuple(row) for row in cursor.fetchall()]
+        # 源表最后一批: 目标表剩余的主键都要对比
+        upper = src_keys[-1] if len(src_keys) == fetch_size else None
+        src_keys = set(src_keys)
+        candidates = []
+        for dest_pk in stream_primary_keys(dest_conn, table, pk_fields, build_key_range_where(pk_fields, lower, upper),
+                                           fetch_size):
+            if tuple(dest_pk) not in src_keys:
+                candidates.append(tuple(dest_pk))
+                if len(candidates) >= fetch_size:
+                    yield from confirm_orphaned_pks(src_conn, table, pk_fields, candidates)
+                    candidates = []
+        yield from confirm_orphaned_pks(src_conn, table, pk_fields, candidates)
+        if upper is None:
+            return
+        lower = upper
+
+def iter_orphaned_pks_merge(src_keys, dest_keys):
+    """
+    对两个按相同顺序排好的主键流做有序归并,产出目标表有但源表没有的主键
+    只用于不含字符串字段的主键(整数/日期等),其 Python 比较顺序与 MySQL 主键索引顺序一致
+    """
+    src_iter = iter(src_keys)
+    src_pk = next(src_iter, None)
+    for dest_pk in dest_keys:
+        while src_pk is not None and src_pk < dest_pk:
+            src_pk = next(src_iter, None)
+        if src_pk is None or src_pk != dest_pk:
+            yield dest_pk
+
+def find_orphaned_pks_set(src_conn, dest_conn, table, pk_fields):
+    """
+    将两端主键全部加载为集合后求差集(适合小表)
+    """
+    # 构建主键字段的 SQL 片段
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    
+    # 获取源表的所有主键值
+    src_cursor = src_conn.cursor()
+    src_cursor.execute(f"SELECT {pk_columns} FROM `{table}`")
+    src_pks = set(src_cursor.fetchall())
+    src_cursor.close()
+    
+    # 获取目标表的所有主键值
+    dest_cursor = dest_conn.cursor()
+    dest_cursor.execute(f"SELECT {pk_columns} FROM `{table}`")
+    dest_pks = set(dest_cursor.fetchall())
+    dest_cursor.close()
+    
+    # 计算需要删除的记录(目标表有但源表没有)
+    return dest_pks - src_pks
+
+def fetch_int_keys(conn, table, pk, fetch_size=MERGE_FETCH_SIZE):
+    """
+    使用服务端游标分批读取整数主键到 int64 数组(每个主键 8 字节),不创建整表的 Python 元组
+    主键超出 int64 范围(BIGINT UNSIGNED)时抛出 OverflowError
+    """
+    chunks = []
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(f"SELECT `{pk}` FROM `{table}`")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            chunks.append(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+    finally:
+        cursor.close()
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+def find_orphaned_int_pks_numpy(src_conn, dest_conn, table, pk):
+    """
+    整数单主键的 set 模式: 两端主键读入 int64 数组,排序后用 searchsorted 向量化求差集
+    内存约为 Python 元组集合的 1/10,返回按主键升序的 [(主键,), ...]
+    """
+    src_keys = fetch_int_keys(src_conn, table, pk)
+    dest_keys = fetch_int_keys(dest_conn, table, pk)
+    if not len(dest_keys):
+        return []
+    src_keys.sort()
+    dest_keys.sort()
+    # 二分查找每个目标端主键在源端的位置,位置上的值不相等即为源表没有的主键(原地排序,不额外拼接两端数组)
+    positions = np.searchsorted(src_keys, dest_keys)
+    found = positions < len(src_keys)
+    found[found] = src_keys[positions[found]] == dest_keys[found]
+    return [(key,) for key in dest_keys[~found].tolist()]
+
+def build_pk_in_clause(pk_fields, batch_len):
+    """
+    构建多行删除的 WHERE 条件
+    单主键: `id` IN (%s, %s, ...)
+    复合主键: (`a`, `b`) IN ((%s, %s), (%s, %s), ...)
+    """
+    if len(pk_fields) == 1:
+        placeholders = ', '.join(['%s'] * batch_len)
+        return f"`{pk_fields[0]}` IN ({placeholders})"
+    row_placeholder = '(' + ', '.join(['%s'] * len(pk_fields)) + ')'
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    return f"({pk_columns}) IN ({', '.join([row_placeholder] * batch_len)})"
+
+def delete_pks_in_batches(dest_conn, table, pk_fields, pk_iter, batch_size=DELETE_BATCH_SIZE):
+    """
+    按批次删除目标表记录,每批一条 DELETE ... IN (...) 语句并单独提交,
+    避免逐行往返和长时间持有行锁的大事务
+    
+    返回:
+        (删除的记录数, 删除耗时秒数)
+    """
+    deleted_count = 0
+    elapsed = 0.0
+    batch = []
+    
+    def flush():
+        nonlocal deleted_count, elapsed
+        started = time.monotonic()
+        params = [value for pk_values in batch for value in pk_values]
+        with dest_conn.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM `{table}` WHERE {build_pk_in_clause(pk_fields, len(batch))}",
+                params
+            )
+            deleted_count += cursor.rowcount
+        dest_conn.commit()
+        elapsed += time.monotonic() - started
+        batch.clear()
+    
+    for pk_values in pk_iter:
+        batch.append(pk_values)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    
+    return deleted_count, elapsed
+
+# 哈希分段检测: 整数单主键按主键值区间切分,其他主键按主键顺序(keyset)切分
+INTEGER_KEY_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint'}
+
+def build_row_hash_expr(columns_quoted):
+    """
+    构建行内容哈希表达式: CRC32(所有字段 + NULL 标记)
+    CONCAT_WS 会跳过 NULL,所以额外拼接每个字段的 ISNULL 标记以区分 NULL 与空串
+    """
+    null_flags = ', '.join([f"ISNULL({col})" for col in columns_quoted])
+    return f"CRC32(CONCAT_WS('#', {', '.join(columns_quoted)}, CONCAT({null_flags})))"
+
+def build_key_hash_expr(pk_fields):
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    return f"CRC32(CONCAT_WS('#', {pk_columns}))"
+
+def keys_match_by_aggregate(src_conn, dest_conn, table, pk_fields, checksum=False):
+    """
+    删除检测前的快速预检: 比较两端的 COUNT(*) 和首个主键字段的 MIN/MAX,
+    checksum=True 时另外比较主键集合的 BIT_XOR(CRC32(主键))
+    只在服务端做聚合,每端只返回一行;一致时认为目标表没有多余记录
+    
+    返回:
+        (是否一致, 源端聚合结果, 目标端聚合结果)
+    """
+    first_pk = f"`{pk_fields[0]}`"
+    exprs = ["COUNT(*)", f"MIN({first_pk})", f"MAX({first_pk})"]
+    if checksum:
+        exprs.append(f"BIT_XOR({build_key_hash_expr(pk_fields)})")
+    sql = f"SELECT {', '.join(exprs)} FROM `{table}`"
+    results = []
+    for conn in (src_conn, dest_conn):
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            results.append(tuple(cursor.fetchone()))
+    return results[0] == results[1], results[0], results[1]
+
+def split_int_range(lo, hi, fanout):
+    """
+    将整数区间 [lo, hi] 切分为最多 fanout 段(在 Python 中计算,不受 BIGINT 范围限制)
+    返回: (步长, [(段号, 段下界, 段上界), ...])
+    """
+    step = max(1, -(-(hi - lo + 1) // fanout))
+    children = []
+    bucket = 0
+    start = lo
+    while start <= hi:
+        children.append((bucket, start, min(hi, start + step - 1)))
+        bucket += 1
+        start += step
+    return step, children
+
+def fetch_range_digests(conn, table, bucket_expr, where, row_hash):
+    """
+    按分段计算摘要,只有 (段号, 行数, BIT_XOR(行哈希)) 经过网络传输
+    返回: {段号: (行数, 摘要)}
+    """
+    sql = (f"SELECT {bucket_expr} AS bucket, COUNT(*), BIT_XOR({row_hash}) "
+           f"FROM `{table}` WHERE {where} GROUP BY bucket")
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return {int(row[0]): (row[1], int(row[2])) for row in cursor.fetchall()}
+
+def fetch_range_rows(conn, table, pk_fields, where, row_hash):
+    """
+    获取某个分段内的 {主键: 行哈希}
+    """
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT {pk_columns}, {row_hash} FROM `{table}` WHERE {where}")
+        return {tuple(row[:-1]): row[-1] for row in cursor.fetchall()}
+
+def get_int_key_bounds(conn, table, pk):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(`{pk}`), MAX(`{pk}`) FROM `{table}`")
+        return cursor.fetchone()
+
+def build_key_range_where(pk_fields, lower, upper):
+    """主键范围 (lower, upper] 的条件,边界为 None 表示不限"""
+    conditions = []
+    if lower is not None:
+        conditions.append(build_keyset_condition(pk_fields, lower, '>'))
+    if upper is not None:
+        conditions.append(build_keyset_condition(pk_fields, upper, '<='))
+    return " AND ".join(conditions) or "1=1"
+
+def find_key_boundaries(conn, table, pk_fields, where, step, count):
+    """
+    在 where 范围内按主键顺序每 step 行取一个主键作为分段上界,最多 count 个
+    每次从上一个边界沿主键索引向后扫描 step 行,不需要对整个范围计算
+    """
+    pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
+    boundaries = []
+    with conn.cursor() as cursor:
+        while len(boundaries) < count:
+            condition = where
+            if boundaries:
+                condition = f"{where} AND {build_keyset_condition(pk_fields, boundaries[-1], '>')}"
+            cursor.execute(f"SELECT {pk_columns} FROM `{table}` WHERE {condition} "
+                           f"ORDER BY {pk_columns} LIMIT 1 OFFSET {step - 1}")
+            row = cursor.fetchone()
+            if not row:
+                break
+            boundaries.append(tuple(row))
+    return boundaries
+
+def diff_by_hash_ranges(src_conn, dest_conn, table, pk_fields, columns_quoted, column_types,
+                        fanout=HASH_FANOUT, leaf_rows=HASH_LEAF_ROWS):
+    """
+    分段哈希(Merkle 风格)对比两端数据,只有摘要不一致的分段才继续细分或拉取主键
+    整数单主键按主键值区间等分;其他主键按主键顺序切分(keyset),在行数较多的一端每隔若干行取一个边界,
+    两端用相同的边界计算摘要,每个分段都是主键索引上的范围扫描
+    
+    返回:
+        (多余主键列表(目标表有源表没有), 内容不一致或目标表缺失的记录数, 对比过的分段数)
+    """
+    row_hash = build_row_hash_expr(columns_quoted)
+    int_key = len(pk_fields) == 1 and column_types.get(pk_fields[0]) in INTEGER_KEY_TYPES
+    string_key = any(column_types.get(pk) in STRING_KEY_TYPES for pk in pk_fields)
+    
+    orphaned_pks = []
+    drift_count = 0
+    ranges_compared = 0
+    
+    def compare_leaf(where):
+        nonlocal drift_count
+        src_rows = fetch_range_rows(src_conn, table, pk_fields, where, row_hash)
+        dest_rows = fetch_range_rows(dest_conn, table, pk_fields, where, row_hash)
+        candidates = [key for key in dest_rows if key not in src_rows]
+        if candidates and string_key:
+            # 排序规则下与源表主键相同的不是多余记录(见 confirm_orphaned_pks)
+            candidates = confirm_orphaned_pks(src_conn, table, pk_fields, candidates)
+        orphaned_pks.extend(candidates)
+        drift_count += sum(1 for key, digest in src_rows.items() if dest_rows.get(key) != digest)
+    
+    if int_key:
+        pk = f"`{pk_fields[0]}`"
+        src_bounds = get_int_key_bounds(src_conn, table, pk_fields[0])
+        dest_bounds = get_int_key_bounds(dest_conn, table, pk_fields[0])
+        if dest_bounds[0] is None:
+            return [], 0, 0
+        lows = [b[0] for b in (src_bounds, dest_bounds) if b[0] is not None]
+        highs = [b[1] for b in (src_bounds, dest_bounds) if b[1] is not None]
+        # 分段节点: (下界, 上界)
+        pending = [(min(lows), max(highs))]
+    else:
+        # 分段节点: (下界(不含), 上界(含), 源表行数, 目标表行数),边界为 None 表示不限
+        src_digest = fetch_range_digests(src_conn, table, "0", "1=1", row_hash).get(0, (0, 0))
+        dest_digest = fetch_range_digests(dest_conn, table, "0", "1=1", row_hash).get(0, (0, 0))
+        ranges_compared += 1
+        pending = []
+        if src_digest != dest_digest:
+            if max(src_digest[0], dest_digest[0]) <= leaf_rows:
+                compare_leaf("1=1")
+            else:
+                pending.append((None, None, src_digest[0], dest_digest[0]))
+    
+    while pending:
+        node = pending.pop()
+        if int_key:
+            lo, hi = node
+            where = f"{pk} BETWEEN {lo} AND {hi}"
+            step, children = split_int_range(lo, hi, fanout)
+            # 按段上界比较分组,不对主键做减法: 接近 BIGINT (UNSIGNED) 上下限时 pk - lo 会超出范围
+            cases = ' '.join(f"WHEN {pk} <= {end} THEN {bucket}" for bucket, start, end in children[:-1])
+            bucket_expr = f"CASE {cases} ELSE {children[-1][0]} END" if cases else "0"
+            child_nodes = {bucket: ((start, end), f"{pk} BETWEEN {start} AND {end}")
+                           for bucket, start, end in children}
+        else:
+            lower, upper, src_rows, dest_rows = node
+            where = build_key_range_where(pk_fields, lower, upper)
+            boundary_conn = src_conn if src_rows >= dest_rows else dest_conn
+            step = max(1, -(-max(src_rows, dest_rows) // fanout))
+            boundaries = find_key_boundaries(boundary_conn, table, pk_fields, where, step, fanout - 1)
+            if not boundaries:
+                compare_leaf(where)
+                continue
+            # 子分段: 按边界依次为 (lower, b0], (b0, b1], ..., (b_last, upper]
+            uppers = boundaries + [upper]
+            lowers = [lower] + boundaries
+            cases = ' '.join(f"WHEN {build_keyset_condition(pk_fields, b, '<=')} THEN {i}"
+                             for i, b in enumerate(boundaries))
+            bucket_expr = f"CASE {cases} ELSE {len(boundaries)} END"
+            child_nodes = {i: ((lowers[i], uppers[i]), build_key_range_where(pk_fields, lowers[i], uppers[i]))
+                           for i in range(len(uppers))}
+        
+        src_digests = fetch_range_digests(src_conn, table, bucket_expr, where, row_hash)
+        dest_digests = fetch_range_digests(dest_conn, table, bucket_expr, where, row_hash)
+        
+        for bucket, (child, child_where) in child_nodes.items():
+            src_digest = src_digests.get(bucket, (0, 0))
+            dest_digest = dest_digests.get(bucket, (0, 0))
+            ranges_compared += 1
+            if src_digest == dest_digest:
+                continue
+            child_rows = max(src_digest[0], dest_digest[0])
+            is_single_key_range = int_key and child[0] == child[1]
+            if child_rows <= leaf_rows or is_single_key_range:
+                compare_leaf(child_where)
+            elif int_key:
+                pending.append(child)
+            else:
+                pending.append(child + (src_digest[0], dest_digest[0]))
+    
+    return orphaned_pks, drift_count, ranges_compared
+
+def detect_and_delete_orphaned_records(src_conn, dest_conn, table, pk_fields, db_config, mode=DELETE_DETECT_MODE,
+                                       batch_size=DELETE_BATCH_SIZE, columns_quoted=None, column_types=None):
+    """
+    检测并删除目标表中多余的记录(源表已删除但目标表仍存在的记录)
+    
+    参数:
+        src_conn: 源数据库连接
+        dest_conn: 目标数据库连接
+        table: 表名
+        pk_fields: 主键字段列表
+        db_config: 数据库配置(用于获取数据库名)
+        mode: merge - 两端按主键排序流式归并,内存占用恒定
+              set   - 两端主键全部加载到内存求差集(整数单主键且安装了 numpy 时使用 int64 数组)
+              hash  - 两端按分段计算哈希摘要,只对摘要不一致的分段拉取主键
+        batch_size: 每条 DELETE 语句删除的主键数量(每批单独提交)
+        columns_quoted: 带反引号的字段列表(hash 模式计算行哈希用)
+        column_types: {字段名: 类型},未提供时查询 information_schema
+    
+    返回:
+        (删除的记录数, 删除耗时秒数, 内容不一致的记录数(仅 hash 模式))
+    """
+    if not pk_fields:
+        return 0, 0.0, 0
+    
+    dest_reader = None
+    drift_count = 0
+    try:
+        int_key_set = mode == "set" and np is not None and len(pk_fields) == 1
+        if (mode in ("merge", "hash") or int_key_set) and column_types is None:
+            column_types = get_column_types(src_conn, db_config['db'], table)
+        if mode == "merge":
+            # 目标端读取使用独立连接,dest_conn 留给删除语句使用;两端都按主键索引顺序读取
+            dest_reader = dest_pool.acquire()
+            if any(column_types.get(pk) in STRING_KEY_TYPES for pk in pk_fields):
+                orphaned_pks = iter_orphaned_pks_keyset(src_conn, dest_reader, table, pk_fields)
+            else:
+                orphaned_pks = iter_orphaned_pks_merge(
+                    stream_primary_keys(src_conn, table, pk_fields),
+                    stream_primary_keys(dest_reader, table, pk_fields)
+                )
+        elif mode == "hash":
+            if columns_quoted is None:
+                columns_quoted = get_table_columns_quoted(src_conn, db_config['db'], table)
+            orphaned_pks, drift_count, _ = diff_by_hash_ranges(
+                src_conn, dest_conn, table, pk_fields, columns_quoted, column_types
+            )
+        else:
+            orphaned_pks = None
+            if int_key_set and column_types.get(pk_fields[0]) in INTEGER_KEY_TYPES:
+                try:
+                    orphaned_pks = find_orphaned_int_pks_numpy(src_conn, dest_conn, table, pk_fields[0])
+                except OverflowError:
+                    pass  # BIGINT UNSIGNED 超出 int64,回退为元组集合
+            if orphaned_pks is None:
+                orphaned_pks = find_orphaned_pks_set(src_conn, dest_conn, table, pk_fields)
+            if not orphaned_pks:
+                return 0, 0.0, 0
+        
+        # 删除多余的记录(分批删除,每批单独提交)
+        deleted_count, delete_seconds = delete_pks_in_batches(dest_conn, table, pk_fields, orphaned_pks, batch_size)
+        return deleted_count, delete_seconds, drift_count
+        
+    except Exception as e:
+        print(f"    ⚠️  删除检测失败: {str(e)}")
+        return 0, 0.0, 0
+    finally:
+        dest_pool.release(dest_reader)
+
+def plan_datax_split(meta, stats, is_incremental, rows_per_channel=DATAX_ROWS_PER_CHANNEL,
+                     max_channels=DATAX_MAX_CHANNELS):
+    """
+    根据表的估算行数确定 DataX 的切分字段(splitPk)和通道数
+    
+    - 待读取行数: 全量按 TABLE_ROWS,增量按 TABLE_ROWS * INCREMENTAL_COST_RATIO 估算
+    - 通道数: 待读取行数 / rows_per_channel,向上取整,限制在 1 ~ max_channels
+    - 只有单列整数主键才能作为 splitPk(DataX 按主键的 MIN/MAX 切分区间并行读取),
+      其他表即使很大也只能单通道读取
+    
+    返回: (splitPk 或 None, 通道数)
+    """
+    pk_fields = meta.get('primary_keys') or []
+    if len(pk_fields) != 1 or meta['types'].get(pk_fields[0]) not in INTEGER_KEY_TYPES or not stats:
+        return None, 1
+    rows = stats.get('rows') or 0
+    if is_incremental:
+        rows *= INCREMENTAL_COST_RATIO
+    channels = max(1, min(max_channels, -(-int(rows) // rows_per_channel)))
+    if channels == 1:
+        return None, 1
+    return pk_fields[0], channels
+
+def build_datax_content(table, columns_quoted, where_clause, split_pk=None, dest_table=None):
+    """
+    构建 DataX job.content 中的一个条目(一张表的 reader/writer)
+    我们不再读取 job.json 模板，而是直接在内存里生成配置
+    这样可以将 columns_quoted 列表完美嵌入，不会有格式问题
+    dest_table 为写入的目标表(影子表),默认与源表同名
+    """
+    content = {
+        "reader": {
+            "name": "mysqlreader",
+            "parameter": {
+                "username": SRC_CONFIG['user'],
+                "password": SRC_CONFIG['password'],
+                "column": columns_quoted,  # 使用带反引号的字段列表
+                "connection": [{
+                    "jdbcUrl": [f"jdbc:mysql://{SRC_CONFIG['host']}:{SRC_CONFIG['port']}/{SRC_CONFIG['db']}?useUnicode=true&characterEncoding=utf8"],
+                    "table": [table]
+                }],
+                "where": where_clause
+            }
+        },
+        "writer": {
+            "name": "mysqlwriter",
+            "parameter": {
+                "username": DEST_CONFIG['user'],
+                "password": DEST_CONFIG['password'],
+                "writeMode": WRITE_MODE,
+                "column": columns_quoted,  # 写入端也用同样的字段列表
+                "connection": [{
+                    "jdbcUrl": f"jdbc:mysql://{DEST_CONFIG['host']}:{DEST_CONFIG['port']}/{DEST_CONFIG['db']}?useUnicode=true&characterEncoding=utf8&rewriteBatchedStatements=true",
+                    "table": [dest_table or table]
+                }]
+            }
+        }
+    }
+    if split_pk:
+        # 按主键区间切分,多个通道并行读取
+        content['reader']['parameter']['splitPk'] = split_pk
+    return content
+
+# DataX 周期性输出的累计统计(最后一次即为整个 job 的合计)
+DATAX_TOTAL_RE = re.compile(
+    r"Total (\d+) records, (\d+) bytes \| Speed [^|]*\| Error (\d+) records, (\d+) bytes"
+    r"(?: \|\s*All Task WaitWriterTime ([\d.]+)s \|\s*All Task WaitReaderTime ([\d.]+)s)?"
+)
+# job 结束时输出的汇总
+DATAX_SUMMARY_RES = {
+    'task_seconds': re.compile(r"任务总计耗时\s*:\s*(\d+)s"),
+    'records': re.compile(r"读出记录总数\s*:\s*(\d+)"),
+    'error_records': re.compile(r"读写失败总数\s*:\s*(\d+)"),
+}
+
+def parse_datax_stats(output):
+    """
+    从 DataX 的输出中解析 job 统计信息,无法解析时返回 None
+    
+    返回:
+        {'records': 读出记录数, 'bytes': 读出字节数, 'error_records': 脏数据/失败记录数,
+         'task_seconds': 任务耗时(不含 JVM 启动), 'wait_writer_seconds': ..., 'wait_reader_seconds': ...}
+        WaitReaderTime 明显大于 WaitWriterTime 说明瓶颈在源端读取,反之在目标端写入
+    """
+    totals = DATAX_TOTAL_RE.findall(output)
+    stats = {}
+    if totals:
+        records, byte_count, error_records, _, wait_writer, wait_reader = totals[-1]
+        stats = {
+            'records': int(records), 'bytes': int(byte_count), 'error_records': int(error_records),
+            'wait_writer_seconds': float(wait_writer) if wait_writer else None,
+            'wait_reader_seconds': float(wait_reader) if wait_reader else None,
+        }
+    for key, pattern in DATAX_SUMMARY_RES.items():
+        match = pattern.search(output)
+        if match:
+            stats[key] = int(match.group(1))
+    if 'records' not in stats:
+        return None
+    stats.setdefault('bytes', None)
+    stats.setdefault('error_records', 0)
+    stats.setdefault('task_seconds', None)
+    return stats
+
+def build_datax_result(ok, stats, started, error=None, log=''):
+    """
+    DataX job 结果: 有统计信息时返回读出/写入行数、字节数和任务耗时,写入行数 = 读出 - 失败记录
+    """
+    result = {'ok': ok, 'error': error, 'log': log, 'rows': None, 'seconds': time.monotonic() - started}
+    if stats:
+        result.update(
+            rows=stats['records'] - stats['error_records'], rows_read=stats['records'], bytes=stats['bytes'],
+            error_records=stats['error_records'], task_seconds=stats['task_seconds'], stats=stats
+        )
+    return result
+
+def run_datax_job(job_name, contents, channels=1):
+    """
+    运行一个 DataX job (启动一个 JVM),contents 只能有一个条目:
+    DataX 的 JobContainer 只读取 job.content[0] 的 reader/writer,其余条目不会被传输
+    channels 为 DataX 的并发通道数(speed.channel)
+    
+    返回:
+        {'ok': 是否成功, 'error': 失败原因, 'log': 错误日志提示, 'rows': 写入行数, 'seconds': 耗时, ...}
+        其余字段见 build_datax_result;无法从输出中解析统计信息时 rows 为 None
+    """
+    if len(contents) != 1:
+        raise ValueError(f"DataX job 只能包含一个 content 条目(实际 {len(contents)} 个)")
+    # 动态生成 JSON 文件的路径: 同一张表可能同时运行多个 job(如 --verify-repair 并行修复多个分段),文件名加随机后缀
+    fd, temp_json_file = tempfile.mkstemp(prefix=f"tmp_job_{job_name}_", suffix=".json", dir=".")
+    started = time.monotonic()
+    
+    # 1. 动态构建 DataX JSON 配置字典
+    job_config = {
+        "job": {
+            "content": contents,
+            "setting": {
+                "speed": {"channel": channels}
+            }
+        }
+    }
+
+    # 2. 将配置写入临时 JSON 文件
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(job_config, f, ensure_ascii=False)
+
+    # 3. 调用 DataX (直接指向临时文件,不需要 -p 参数了)
+    cmd = ["python3", DATAX_PATH, temp_json_file]
+
+    result = subprocess.run(
+        cmd, 
+        stdout=subprocess.PIPE, 
+        stderr=subprocess.STDOUT,
+        encoding='utf-8',       
+        errors='ignore'
+    )
+    
+    # 4. 删除临时配置文件 (清理现场)
+    if os.path.exists(temp_json_file):
+        os.remove(temp_json_file)
+
+    if result.returncode != 0:
+        fd, log_file = tempfile.mkstemp(prefix=f"error_{job_name}_", suffix=".log", dir=".")
+        log_file = os.path.basename(log_file)
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            f.write(result.stdout)
+        
+        # 提取错误摘要
+        log_lines = result.stdout.splitlines()
+        error_summary = [line.strip() for line in log_lines if "Exception" in line or "Error" in line]
+        if not error_summary: error_summary = log_lines[-5:]
+        summary_str = "\n    ".join(error_summary[-2:]) 
+
+        return build_datax_result(False, parse_datax_stats(result.stdout), started,
+                                  error=summary_str, log=f"(日志: {log_file})")
+
+    return build_datax_result(True, parse_datax_stats(result.stdout), started)
+
+def run_datax_transfer(table, columns_quoted, where_clause, src_conn=None, dest_conn=None, split_pk=None, channels=1,
+                       dest_table=None):
+    """
+    DataX 传输引擎: 生成临时 job 配置并调用 datax.py (每次调用启动一个 JVM)
+    大表按 split_pk 切分为多个区间,由 channels 个通道并行读取
+    """
+    content = build_datax_content(table, columns_quoted, where_clause, split_pk, dest_table)
+    return run_datax_job(table, [content], channels)
+
+def build_write_sql(table, columns_quoted, write_mode=WRITE_MODE):
+    """
+    构建批量写入语句,pymysql 的 executemany 会把 INSERT/REPLACE ... VALUES 改写为多行语句
+    replace: REPLACE INTO ... VALUES (...)
+    update:  INSERT INTO ... VALUES (...) ON DUPLICATE KEY UPDATE col = VALUES(col), ...
+    """
+    columns = ', '.join(columns_quoted)
+    placeholders = ', '.join(['%s'] * len(columns_quoted))
+    if write_mode == "update":
+        updates = ', '.join([f"{col} = VALUES({col})" for col in columns_quoted])
+        return f"INSERT INTO `{table}` ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+    return f"REPLACE INTO `{table}` ({columns}) VALUES ({placeholders})"
+
+def run_native_transfer(table, columns_quoted, where_clause, src_conn, dest_conn, split_pk=None, channels=1,
+                        dest_table=None):
+    """
+    进程内传输引擎: 源端 SSCursor 流式读取,目标端 executemany 批量写入,每批单独提交
+    不启动 JVM,适合大量只有少量变更的小表(单连接读取,忽略 split_pk / channels)
+    
+    返回:
+        {'ok': 是否成功, 'error': 失败原因, 'log': '', 'rows': 写入行数, 'seconds': 耗时}
+    """
+    started = time.monotonic()
+    rows_written = 0
+    write_sql = build_write_sql(dest_table or table, columns_quoted)
+    src_cursor = src_conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        src_cursor.execute(f"SELECT {', '.join(columns_quoted)} FROM `{table}` WHERE {where_clause}")
+        with dest_conn.cursor() as dest_cursor:
+            while True:
+                rows = src_cursor.fetchmany(NATIVE_BATCH_SIZE)
+                if not rows:
+                    break
+                dest_cursor.executemany(write_sql, rows)
+                dest_conn.commit()
+                rows_written += len(rows)
+    except Exception as e:
+        try:
+            dest_conn.rollback()
+        except:
+            pass
+        return {'ok': False, 'error': f"{str(e)} (已写入 {rows_written} 行)", 'log': '',
+                'rows': rows_written, 'seconds': time.monotonic() - started}
+    finally:
+        src_cursor.close()
+    
+    return {'ok': True, 'error': None, 'log': '', 'rows': rows_written, 'seconds': time.monotonic() - started}
+
+# LOAD DATA 默认格式(FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n')需要转义的字符
+LOAD_DATA_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+# 二进制类字段以十六进制写入中转文件,加载时用 UNHEX 还原,避免字符集转换破坏数据
+HEX_COLUMN_TYPES = {'binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob', 'bit'}
+
+def format_load_value(value, as_hex=False):
+    """
+    把一个字段值转换为 LOAD DATA 中转文件中的文本,NULL 写为 \\N
+    """
+    if value is None:
+        return '\\N'
+    if as_hex:
+        return (value if isinstance(value, bytes) else str(value).encode('utf-8')).hex()
+    if isinstance(value, bytes):
+        # 非二进制字段中的原始字节原样保留(写文件时按 surrogateescape 还原)
+        value = value.decode('utf-8', 'surrogateescape')
+    elif isinstance(value, datetime.timedelta):
+        # TIME 字段: str(timedelta) 会输出 "1 day, 2:00:00",需要转换为 [-]H:MM:SS[.ffffff]
+        sign = '-' if value < datetime.timedelta(0) else ''
+        value = abs(value)
+        hours, rest = divmod(value.days * 86400 + value.seconds, 3600)
+        minutes, seconds = divmod(rest, 60)
+        text = f"{sign}{hours}:{minutes:02d}:{seconds:02d}"
+        return text + (f".{value.microseconds:06d}" if value.microseconds else '')
+    elif isinstance(value, float):
+        return repr(value)
+    return str(value).translate(LOAD_DATA_ESCAPES)
+
+def build_load_data_sql(table, columns_quoted, column_types, path):
+    """
+    构建 LOAD DATA LOCAL INFILE 语句,二进制类字段先读入用户变量再 UNHEX
+    """
+    targets, assignments = [], []
+    for i, col in enumerate(columns_quoted):
+        if column_types.get(col.strip('`')) in HEX_COLUMN_TYPES:
+            targets.append(f"@v{i}")
+            assignments.append(f"{col} = UNHEX(@v{i})")
+        else:
+            targets.append(col)
+    sql = (
+        f"LOAD DATA LOCAL INFILE {sql_literal(path)} REPLACE INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({', '.join(targets)})"
+    )
+    if assignments:
+        sql += " SET " + ', '.join(assignments)
+    return sql
+
+def run_load_data_transfer(table, columns_quoted, where_clause, src_conn, dest_conn, split_pk=None, channels=1,
+                           dest_table=None):
+    """
+    LOAD DATA 传输引擎(适合全量复制): 源端 SSCursor 流式读取写入制表符分隔的中转文件,
+    再用一条 LOAD DATA LOCAL INFILE ... REPLACE 批量加载,整段在一个事务中提交
+    LOCAL 模式下数据转换错误只产生警告,出现警告时回滚并视为失败
+    
+    返回:
+        {'ok': 是否成功, 'error': 失败原因, 'log': '', 'rows': 加载行数, 'seconds': 耗时, 'bytes': 中转文件字节数}
+    """
+    started = time.monotonic()
+    rows_written = 0
+    column_types = get_table_meta(src_conn, SRC_CONFIG['db'], table, src_catalog)['types']
+    as_hex = [column_types.get(col.strip('`')) in HEX_COLUMN_TYPES for col in columns_quoted]
+    fd, path = tempfile.mkstemp(prefix=f"load_{table}_", suffix=".tsv", dir=LOAD_DATA_DIR)
+    src_cursor = src_conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        # 1. 流式读取源表,写入中转文件
+        with os.fdopen(fd, 'wb') as f:
+            src_cursor.execute(f"SELECT {', '.join(columns_quoted)} FROM `{table}` WHERE {where_clause}")
+            while True:
+                rows = src_cursor.fetchmany(NATIVE_BATCH_SIZE)
+                if not rows:
+                    break
+                f.write(''.join(
+                    '\t'.join(format_load_value(v, h) for v, h in zip(row, as_hex)) + '\n' for row in rows
+                ).encode('utf-8', 'surrogateescape'))
+                rows_written += len(rows)
+        bytes_written = os.path.getsize(path)
+        
+        # 2. 批量加载
+        with dest_conn.cursor() as dest_cursor:
+            dest_cursor.execute(build_load_data_sql(dest_table or table, columns_quoted, column_types, path))
+            dest_cursor.execute("SHOW WARNINGS LIMIT 3")
+            warnings = dest_cursor.fetchall()
+            if warnings:
+                dest_conn.rollback()
+                return {'ok': False, 'error': "LOAD DATA 产生警告,已回滚: " + "; ".join(w[2] for w in warnings),
+                        'log': '', 'rows': 0, 'seconds': time.monotonic() - started}
+        dest_conn.commit()
+    except Exception as e:
+        try:
+            dest_conn.rollback()
+        except:
+            pass
+        return {'ok': False, 'error': str(e), 'log': '', 'rows': 0, 'seconds': time.monotonic() - started}
+    finally:
+        src_cursor.close()
+        if os.path.exists(path):
+            os.remove(path)
+    
+    return {'ok': True, 'error': None, 'log': '', 'rows': rows_written, 'seconds': time.monotonic() - started,
+            'bytes': bytes_written}
+
+TRANSFER_ENGINES = {
+    'datax': run_datax_transfer,
+    'native': run_native_transfer,
+    'load': run_load_data_transfer,
+}
+
+def sql_literal(value):
+    return escape_item(value, SRC_CONFIG['charset'])
+
+def to_json_value(value):
+    """主键值写入 checkpoint 前转换为 JSON 可保存的类型"""
+    return value if isinstance(value, (int, float, str)) or value is None else str(value)
+
+def build_keyset_condition(keys, values, op):
+    """
+    构建按字段顺序比较的条件(keyset 分页),展开为 OR 形式以便使用索引
+    op 为 '>' 时表示 (keys) > (values),为 '<=' 时表示 (keys) <= (values)
+    """
+    strict = '>' if op == '>' else '<'
+    literals = [sql_literal(v) for v in values]
+    terms = []
+    for i, key in enumerate(keys):
+        parts = [f"`{k}` = {v}" for k, v in zip(keys[:i], literals[:i])]
+        parts.append(f"`{key}` {strict} {literals[i]}")
+        terms.append(" AND ".join(parts))
+    if op == '<=':
+        terms.append(" AND ".join(f"`{k}` = {v}" for k, v in zip(keys, literals)))
+    return "(" + " OR ".join(f"({term})" for term in terms) + ")"
+
+def find_chunk_boundary(conn, table, keys, where_clause, chunk_rows=SYNC_CHUNK_ROWS):
+    """
+    找到按 keys 排序后第 chunk_rows 行的键值(分段的上界),剩余不足 chunk_rows 行时返回 None
+    """
+    order_by = ', '.join(f"`{k}`" for k in keys)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {order_by} FROM `{table}` WHERE {where_clause} "
+            f"ORDER BY {order_by} LIMIT 1 OFFSET {chunk_rows - 1}"
+        )
+        row = cursor.fetchone()
+    return tuple(to_json_value(v) for v in row) if row else None
+
+def iter_sync_chunks(conn, plan, chunk_rows=SYNC_CHUNK_ROWS):
+    """
+    按 plan['chunk_keys'] 把同步范围切成若干段
+    生成: (该段的 where 条件, 该段上界键值),最后一段的上界为 None
+    """
+    keys = plan['chunk_keys']
+    lower_clause = plan['lower_clause']
+    while True:
+        where_clause = " AND ".join(c for c in (lower_clause, plan['upper_clause']) if c) or "1=1"
+        boundary = find_chunk_boundary(conn, plan['table'], keys, where_clause, chunk_rows)
+        if boundary is None:
+            yield where_clause, None
+            return
+        yield f"{where_clause} AND {build_keyset_condition(keys, boundary, '<=')}", boundary
+        lower_clause = build_keyset_condition(keys, boundary, '>')
+
+def percentile(values, p):
+    """
+    最近秩(nearest-rank)百分位数,values 为空时返回 None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+def classify_result(msg):
+    """
+    根据结果消息判断同步状态: ok(已同步) / skipped(无新数据) / failed(失败)
+    """
+    if msg.startswith("❌"):
+        return 'failed'
+    return 'ok' if msg.endswith("[✅ 成功]") else 'skipped'
+
+class TableResult:
+    """
+    单张表一次同步的结构化结果: 结果消息和状态、各阶段耗时(秒)、读取/写入/删除行数、传输字节数
+    阶段: connect(取连接) / prepare(元数据和同步范围) / reload(清空或创建影子表) / queue(等待流预算) / transfer(传输引擎)
+          / row_check(小表批量任务传输后核对两端行数) / swap(影子表替换) / delete_detect(删除检测)
+          / checkpoint(记录水位和表状态)
+    engine 为实际使用的传输引擎: 小表批量任务中的表为 native(即使 --engine 为 datax),改为 DataX 重跑时为 datax
+    DataX 引擎另外记录 startup_seconds(JVM 启动等 job 之外的耗时,包含在 transfer 中)和 error_records(脏数据)
+    """
+    def __init__(self, table):
+        self.table = table
+        self.message = None
+        self.status = None
+        self.engine = None
+        self.phases = {}
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_deleted = 0
+        self.bytes = None  # 传输引擎无法统计时为 None
+        self.error_records = 0
+        self.startup_seconds = None
+        self.throughput = None  # 本次传输速度(行/秒),传输行数不足 THROUGHPUT_MIN_ROWS 时为 None
+        self.baseline = None  # 历史传输速度基线(行/秒)
+        self.regressed = False
+        self.delete_precheck = None  # 删除预检结果: match(两端一致,跳过主键对比) / mismatch / None(未预检)
+        self.seconds = None
+        self.started = time.monotonic()
+
+    def __str__(self):
+        return self.message or ''
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - started
+
+    def add_transfer(self, engine, transfer):
+        """
+        累加一次传输引擎调用(一段)的行数、字节数和 DataX 统计
+        """
+        self.engine = engine
+        if transfer['rows'] is not None:
+            self.rows_read += transfer.get('rows_read', transfer['rows'])
+            self.rows_written += transfer['rows']
+        if transfer.get('bytes') is not None:
+            self.bytes = (self.bytes or 0) + transfer['bytes']
+        self.error_records += transfer.get('error_records', 0)
+        if transfer.get('task_seconds') is not None:
+            self.startup_seconds = (self.startup_seconds or 0.0) + max(transfer['seconds'] - transfer['task_seconds'], 0.0)
+
+    def finish(self, msg):
+        self.message = msg
+        self.seconds = time.monotonic() - self.started
+        self.status = classify_result(msg)
+        return self
+
+    def to_dict(self):
+        return {
+            'table': self.table, 'status': self.status, 'engine': self.engine,
+            'seconds': round(self.seconds or 0.0, 3),
+            'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'rows_read': self.rows_read, 'rows_written': self.rows_written,
+            'rows_deleted': self.rows_deleted, 'bytes': self.bytes, 'error_records': self.error_records,
+            'startup_seconds': round(self.startup_seconds, 3) if self.startup_seconds is not None else None,
+            'throughput': self.throughput, 'baseline': self.baseline, 'regressed': self.regressed,
+            'delete_precheck': self.delete_precheck,
+        }
+
+def check_throughput(checkpoints, record, rows, seconds):
+    """
+    比较本次传输速度与该表历史基线(同一引擎),低于基线的 THROUGHPUT_REGRESSION_RATIO 时标记为吞吐下降
+    基线按指数滑动平均更新(新值权重 0.3),保存在 checkpoint 的 throughput 命名空间
+    """
+    if checkpoints is None or not rows or rows < THROUGHPUT_MIN_ROWS or seconds <= 0:
+        return
+    record.throughput = round(rows / seconds, 1)
+    saved = checkpoints.get(record.table, namespace=THROUGHPUT)
+    if saved and saved.get('engine') == record.engine:
+        record.baseline = saved['rows_per_sec']
+        record.regressed = record.throughput < record.baseline * THROUGHPUT_REGRESSION_RATIO
+        rate = round(record.baseline * 0.7 + record.throughput * 0.3, 1)
+    else:
+        rate = record.throughput
+    checkpoints.commit(record.table, {'engine': record.engine, 'rows_per_sec': rate}, namespace=THROUGHPUT)
+
+def export_metrics(metrics, prefix=""):
+    """
+    写出运行指标并输出一行汇总;写入失败只提示,不影响同步结果
+    """
+    try:
+        summary = metrics.export()
+    except Exception as e:
+        print(f"{prefix}⚠️  写入运行指标失败: {e}")
+        return None
+    if summary['table_seconds_count']:
+        volume = f" ({summary['bytes'] / 1048576:.1f} MB, {summary['bytes_per_sec'] / 1048576:.2f} MB/s)" if summary['bytes'] else ""
+        print(f"{prefix}📈 单表耗时 p50 {summary['table_seconds_p50']:.1f} 秒 / p95 {summary['table_seconds_p95']:.1f} 秒, "
+              f"写入 {summary['rows_written']} 行{volume}, 删除 {summary['rows_deleted']} 行")
+    if summary['delete_precheck']['match'] or summary['delete_precheck']['mismatch']:
+        print(f"{prefix}🔍 删除预检: {summary['delete_precheck']['match']} 张表两端一致(跳过主键对比), "
+              f"{summary['delete_precheck']['mismatch']} 张表执行完整删除检测")
+    if summary['regressed']:
+        print(f"{prefix}⚠️  吞吐下降: {', '.join(summary['regressed'])}")
+    return summary
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsCollector:
+    """
+    收集一次运行中每张表的 TableResult(线程安全),运行结束时调用 export:
+    - jsonl_path: 每张表一行 {"type": "table", ...},最后一行为运行汇总 {"type": "run", ...}(追加写入)
+    - prom_path: Prometheus textfile collector 格式,每次整体替换(先写临时文件再 os.replace)
+    run_phases 记录不属于单张表的运行级耗时(如元数据目录加载、checkpoint 写入)
+    """
+    def __init__(self, jsonl_path=METRICS_JSONL_FILE, prom_path=METRICS_PROM_FILE):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.run_phases = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.records = []
+        self.run_phases = {}
+        self.run_started = time.time()
+        self.started = time.monotonic()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        """
+        运行汇总: 各状态表数、行数/字节数合计和整体流量、各阶段耗时合计、单表耗时 p50/p95(不含无新数据的表)、
+        吞吐下降的表
+        """
+        with self._lock:
+            records = list(self.records)
+        durations = [r.seconds for r in records if r.status != 'skipped']
+        phases = dict(self.run_phases)
+        for record in records:
+            for name, seconds in record.phases.items():
+                phases[name] = phases.get(name, 0.0) + seconds
+        byte_counts = [r.bytes for r in records if r.bytes is not None]
+        seconds = time.monotonic() - self.started
+        return {
+            'started_at': datetime.datetime.fromtimestamp(self.run_started).isoformat(timespec='seconds'),
+            'seconds': round(seconds, 3),
+            'tables': len(records),
+            'status': {status: sum(1 for r in records if r.status == status) for status in ('ok', 'skipped', 'failed')},
+            'rows_read': sum(r.rows_read for r in records),
+            'rows_written': sum(r.rows_written for r in records),
+            'rows_deleted': sum(r.rows_deleted for r in records),
+            'bytes': sum(byte_counts) if byte_counts else None,
+            'bytes_per_sec': round(sum(byte_counts) / seconds, 1) if byte_counts and seconds > 0 else None,
+            'error_records': sum(r.error_records for r in records),
+            'startup_seconds': round(sum(r.startup_seconds or 0.0 for r in records), 3),
+            'regressed': sorted(r.table for r in records if r.regressed),
+            'delete_precheck': {result: sum(1 for r in records if r.delete_precheck == result)
+                                for result in ('match', 'mismatch')},
+            'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+            'table_seconds_p50': percentile(durations, 50),
+            'table_seconds_p95': percentile(durations, 95),
+            'table_seconds_sum': round(sum(durations), 3),
+            'table_seconds_count': len(durations),
+        }
+
+    def export(self):
+        """
+        写出本次运行的指标并清空(常驻模式下每个周期调用一次),返回运行汇总
+        """
+        summary = self.summary()
+        with self._lock:
+            records = list(self.records)
+            self._reset()
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(dict(record.to_dict(), type='table', run=summary['started_at']),
+                                       ensure_ascii=False) + "\n")
+                f.write(json.dumps(dict(summary, type='run'), ensure_ascii=False) + "\n")
+        if self.prom_path:
+            temp_file = self.prom_path + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(self.format_prometheus(summary, records))
+            os.replace(temp_file, self.prom_path)
+        return summary
+
+    @staticmethod
+    def format_prometheus(summary, records):
+        """
+        Prometheus 文本格式: 运行级合计 + 单表耗时 summary(p50/p95) + 每张表的耗时/行数
+        """
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        
+        metric('mysql_sync_last_run_timestamp_seconds', 'gauge', '最近一次运行结束的时间戳',
+               [({}, round(time.time(), 3))])
+        metric('mysql_sync_run_duration_seconds', 'gauge', '最近一次运行的总耗时',
+               [({}, summary['seconds'])])
+        metric('mysql_sync_run_tables', 'gauge', '最近一次运行各状态的表数',
+               [({'status': status}, count) for status, count in summary['status'].items()])
+        metric('mysql_sync_run_rows', 'gauge', '最近一次运行读取/写入/删除的行数',
+               [({'kind': kind}, summary[f'rows_{kind}']) for kind in ('read', 'written', 'deleted')])
+        if summary['bytes'] is not None:
+            metric('mysql_sync_run_bytes', 'gauge', '最近一次运行传输的字节数(仅统计能提供字节数的引擎)',
+                   [({}, summary['bytes'])])
+        metric('mysql_sync_run_error_records', 'gauge', '最近一次运行 DataX 报告的脏数据记录数',
+               [({}, summary['error_records'])])
+        metric('mysql_sync_run_delete_precheck_tables', 'gauge', '最近一次运行删除预检的表数(match 为跳过主键对比)',
+               [({'result': result}, count) for result, count in summary['delete_precheck'].items()])
+        metric('mysql_sync_run_throughput_regressions', 'gauge', '最近一次运行传输速度低于历史基线的表数',
+               [({}, len(summary['regressed']))])
+        metric('mysql_sync_run_phase_seconds', 'gauge', '最近一次运行各阶段耗时合计',
+               [({'phase': name}, seconds) for name, seconds in sorted(summary['phases'].items())])
+        quantiles = [({'quantile': q}, summary[key]) for q, key in (('0.5', 'table_seconds_p50'), ('0.95', 'table_seconds_p95'))
+                     if summary[key] is not None]
+        metric('mysql_sync_table_duration_seconds', 'summary', '最近一次运行单表耗时(不含无新数据的表)', quantiles)
+        lines.append(f"mysql_sync_table_duration_seconds_sum {summary['table_seconds_sum']}")
+        lines.append(f"mysql_sync_table_duration_seconds_count {summary['table_seconds_count']}")
+        metric('mysql_sync_table_seconds', 'gauge', '最近一次运行每张表的耗时',
+               [({'table': r.table, 'status': r.status}, round(r.seconds, 3)) for r in records])
+        metric('mysql_sync_table_rows_written', 'gauge', '最近一次运行每张表写入的行数',
+               [({'table': r.table}, r.rows_written) for r in records])
+        metric('mysql_sync_table_rows_deleted', 'gauge', '最近一次运行每张表删除的行数',
+               [({'table': r.table}, r.rows_deleted) for r in records])
+        return "\n".join(lines) + "\n"
+
+def prepare_table_sync(src_conn, dest_conn, table, force_full_sync=False, checkpoints=None, table_state=None):
+    """
+    确定一张表本次的同步范围
+    table_state 为同步开始前观察到的源表状态,表同步成功(或确认无新数据)后记录,供下次跳过未变化的表
+    
+    返回:
+        (plan, None) 需要传输时, plan 包含 columns_quoted / where_clause / current_max_time /
+                     is_incremental / result_msg,以及分段传输用的 chunk_keys / lower_clause / upper_clause
+        (None, msg)  不需要传输(无新数据、源表为空、无法获取字段)时
+    """
+    # 1. 获取表元数据(优先使用启动时加载的元数据目录)
+    meta = get_table_meta(src_conn, SRC_CONFIG['db'], table, src_catalog)
+    # 将每个字段名用反引号包起来,解决 KEY, VALUE, CONDITION 等关键字报错问题
+    columns_quoted = [f"`{col}`" for col in meta['columns']]
+    if not columns_quoted:
+        return None, f"❌ {table}: 无法获取字段信息，跳过"
+
+    # 2. 检查是否有 editTime
+    has_edittime = meta['has_edittime']
+    pk_fields = meta['primary_keys']
+    stats = src_catalog['stats'].get(table) if src_catalog else None
+    saved = None
+    if not force_full_sync:
+        saved = checkpoints.get(table) if checkpoints is not None else load_checkpoint().get(table)
+    saved_time, saved_pk = parse_watermark(saved)
+    if saved_pk is not None and len(saved_pk) != len(pk_fields):
+        # 主键结构已变化,断点无效
+        saved_pk = None
+
+    current_max_time = None
+    is_incremental = False
+    lower_clause = upper_clause = None
+    # 有主键的大表按 (editTime, 主键) 或主键分段传输,每段成功后记录断点(--full 的有 editTime 表除外)
+    chunkable = bool(pk_fields) and (stats is None or (stats.get('rows') or 0) > SYNC_CHUNK_ROWS)
+    chunk_keys = None
+    resumable = False
+
+    # 强制全量同步模式
+    if force_full_sync:
+        result_msg = f"🔄 {table}: 强制全量同步"
+        chunk_keys = pk_fields
+        # 如果有 editTime,获取当前最大时间用于更新 checkpoint
+        if has_edittime:
+            with src_conn.cursor() as cursor:
+                cursor.execute(f"SELECT MAX(editTime) FROM `{table}`")
+                res = cursor.fetchone()[0]
+                if res:
+                    current_max_time = str(res)
+        else:
+            resumable = True
+    elif not has_edittime:
+        result_msg = f"🔄 {table}: 全量同步 (无 editTime)"
+        chunk_keys = pk_fields
+        resumable = True
+        if saved_pk is not None:
+            # 上次全量复制中途中断: 从断点继续
+            lower_clause = build_keyset_condition(pk_fields, saved_pk, '>')
+            result_msg += f" (从主键 {', '.join(map(str, saved_pk))} 之后继续)"
+    else:
+        start_time = "1970-01-01 00:00:00"
+        if saved_time:
+            start_time = saved_time
+        else:
+            saved_pk = None
+            local_max = get_local_max_time(dest_conn, table, dest_catalog)
+            if local_max: start_time = local_max
+
+        with src_conn.cursor() as cursor:
+            cursor.execute(f"SELECT MAX(editTime) FROM `{table}`")
+            res = cursor.fetchone()[0]
+            if res is None:
+                return None, f"⚠️ {table}: 源表为空，跳过"
+            current_max_time = str(res)
+
+        # 断点在 start_time 中间(同一 editTime 的记录只同步了一部分)时,等于 start_time 的记录可能还没同步完
+        if current_max_time < start_time or (current_max_time == start_time and saved_pk is None):
+            if checkpoints is not None and table_state is not None:
+                checkpoints.commit(table, table_state, namespace=TABLE_STATE)
+            return None, f"⏹️  {table}: 无新数据 (Current: {current_max_time})"
+
+        if saved_pk is not None:
+            lower_clause = build_keyset_condition(['editTime'] + pk_fields, (start_time,) + saved_pk, '>')
+        else:
+            lower_clause = f"editTime > '{start_time}'"
+        upper_clause = f"editTime <= '{current_max_time}'"
+        is_incremental = True
+        chunk_keys = ['editTime'] + pk_fields
+        resumable = True
+        result_msg = f"🚀 {table}: 增量同步 ({start_time} -> {current_max_time})"
+
+    where_clause = " AND ".join(c for c in (lower_clause, upper_clause) if c) or "1=1"
+
+    # 大表按主键区间切分并行读取,小表单通道
+    split_pk, channels = plan_datax_split(meta, stats, is_incremental)
+
+    plan = {
+        'table': table,
+        'meta': meta,
+        'columns_quoted': columns_quoted,
+        'where_clause': where_clause,
+        'current_max_time': current_max_time,
+        'is_incremental': is_incremental,
+        'result_msg': result_msg,
+        'table_state': table_state,
+        'split_pk': split_pk,
+        'channels': channels,
+        'lower_clause': lower_clause,
+        'upper_clause': upper_clause,
+        'chunk_keys': chunk_keys if chunkable else None,
+        'resumable': resumable,
+        # 无 editTime 的表从断点继续或记录过断点时,同步成功后需要清除断点
+        'clear_progress': not has_edittime and saved_pk is not None,
+    }
+    if checkpoints is not None:
+        # 即将写入目标表: 先作废上次记录的状态,传输失败时下次不会被误判为未变化而跳过
+        checkpoints.commit(table, None, namespace=TABLE_STATE)
+    return plan, None
+
+def truncate_before_transfer(dest_conn, plan):
+    """
+    全量同步模式:先清空目标表
+    """
+    try:
+        with dest_conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE TABLE `{plan['table']}`")
+        dest_conn.commit()
+        plan['result_msg'] += " (已清空目标表)"
+    except Exception as e:
+        print(f"    ⚠️  清空表失败: {str(e)}")
+
+def find_deferrable_indexes(create_sql):
+    """
+    从 SHOW CREATE TABLE 的结果中找出可以延后创建的二级索引(普通/全文/空间索引)
+    主键和唯一索引保留(REPLACE 依赖它们去重)
+    返回: [(索引名, 索引定义), ...]
+    """
+    indexes = []
+    for line in create_sql.splitlines():
+        definition = line.strip().rstrip(',')
+        match = re.match(r"(?:FULLTEXT |SPATIAL )?KEY `((?:[^`]|``)+)`", definition)
+        if match:
+            indexes.append((match.group(1), definition))
+    return indexes
+
+def prepare_shadow_table(dest_conn, plan):
+    """
+    影子表全量同步: 按目标表结构创建 <表名>__shadow,并去掉二级索引(加载完成后一次性重建)
+    有外键(引用或被引用)的表不能安全地 RENAME 替换,返回 False
+    """
+    table = plan['table']
+    shadow = f"{table}{SHADOW_SUFFIX}"
+    with dest_conn.cursor() as cursor:
+        cursor.execute(f"""
+        SELECT COUNT(*) FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = '{DEST_CONFIG['db']}' AND (TABLE_NAME = '{table}' OR REFERENCED_TABLE_NAME = '{table}')
+        """)
+        if cursor.fetchone()[0]:
+            return False
+        # 清理上次中断留下的影子表
+        cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+        cursor.execute(f"CREATE TABLE `{shadow}` LIKE `{table}`")
+        cursor.execute(f"SHOW CREATE TABLE `{shadow}`")
+        indexes = find_deferrable_indexes(cursor.fetchone()[1])
+        if indexes:
+            cursor.execute(f"ALTER TABLE `{shadow}` " + ', '.join(f"DROP INDEX `{name}`" for name, _ in indexes))
+    plan['dest_table'] = shadow
+    plan['deferred_indexes'] = [definition for _, definition in indexes]
+    # 影子表失败后会被丢弃,不能从中途断点继续
+    plan['resumable'] = False
+    return True
+
+def swap_shadow_table(dest_conn, plan):
+    """
+    影子表加载完成: 一次性重建二级索引,再用一条 RENAME TABLE 原子替换目标表
+    """
+    table, shadow = plan['table'], plan['dest_table']
+    old = f"{table}__old"
+    with dest_conn.cursor() as cursor:
+        if plan['deferred_indexes']:
+            cursor.execute(f"ALTER TABLE `{shadow}` " + ', '.join(f"ADD {d}" for d in plan['deferred_indexes']))
+        cursor.execute(f"DROP TABLE IF EXISTS `{old}`")
+        cursor.execute(f"RENAME TABLE `{table}` TO `{old}`, `{shadow}` TO `{table}`")
+        cursor.execute(f"DROP TABLE `{old}`")
+    plan['result_msg'] += f" (影子表替换, 重建 {len(plan['deferred_indexes'])} 个索引)"
+
+def drop_shadow_table(dest_conn, plan):
+    try:
+        with dest_conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS `{plan['dest_table']}`")
+    except Exception as e:
+        print(f"    ⚠️  删除影子表失败: {str(e)}")
+
+def prepare_full_reload(dest_conn, plan, truncate_before_sync=False, shadow_swap=False):
+    """
+    全量同步前处理目标表: 影子表(优先)或清空目标表
+    """
+    if shadow_swap:
+        if prepare_shadow_table(dest_conn, plan):
+            return
+        plan['result_msg'] += " (有外键,不使用影子表)"
+    if truncate_before_sync:
+        truncate_before_transfer(dest_conn, plan)
+
+def finish_table_sync(src_conn, dest_conn, plan, force_full_sync=False, detect_deletes=True,
+                      truncate_before_sync=False, delete_mode=DELETE_DETECT_MODE,
+                      delete_batch_size=DELETE_BATCH_SIZE, checkpoints=None, record=None,
+                      delete_precheck=DELETE_PRECHECK):
+    """
+    传输成功后的收尾: 删除检测 + 更新 checkpoint(耗时和删除行数记录到 record)
+    merge / set 模式先做聚合预检(delete_precheck),两端一致时跳过逐主键对比;
+    hash 模式本身从聚合摘要开始,且需要发现内容不一致,不做预检
+    """
+    table = plan['table']
+    result_msg = plan['result_msg']
+    record = record or TableResult(table)
+    
+    # 删除检测:检测并删除目标表中多余的记录
+    deleted_count = 0
+    delete_failed = False
+    if detect_deletes and not (force_full_sync and truncate_before_sync) and not plan.get('dest_table'):
+        # 如果是全量同步且已清空表(或替换为影子表),则不需要删除检测
+        with record.phase('delete_detect'):
+            try:
+                pk_fields = plan['meta']['primary_keys']
+                if pk_fields and delete_precheck != 'off' and delete_mode != 'hash':
+                    # 预检: 两端数量和主键范围(及校验和)一致时跳过逐主键对比
+                    record.delete_precheck = 'mismatch'
+                    try:
+                        if keys_match_by_aggregate(src_conn, dest_conn, table, pk_fields,
+                                                   checksum=(delete_precheck == 'checksum'))[0]:
+                            record.delete_precheck = 'match'
+                    except Exception as e:
+                        print(f"    ⚠️  {table}: 删除预检失败,执行完整删除检测: {str(e)}")
+                if not pk_fields:
+                    # 没有主键,跳过删除检测
+                    result_msg += " (无主键,跳过删除检测)"
+                elif record.delete_precheck != 'match':
+                    deleted_count, delete_seconds, drift_count = detect_and_delete_orphaned_records(
+                        src_conn, dest_conn, table, pk_fields, SRC_CONFIG,
+                        mode=delete_mode, batch_size=delete_batch_size, columns_quoted=plan['columns_quoted'],
+                        column_types=plan['meta']['types']
+                    )
+                    record.rows_deleted += deleted_count
+                    if deleted_count > 0:
+                        rate = deleted_count / delete_seconds if delete_seconds > 0 else deleted_count
+                        result_msg += f" (删除 {deleted_count} 条, {rate:.0f} 条/秒)"
+                    if drift_count > 0:
+                        result_msg += f" (⚠️ {drift_count} 条记录内容不一致)"
+            except Exception as e:
+                delete_failed = True
+                result_msg += f" (删除检测异常: {str(e)})"
+    
+    with record.phase('checkpoint'):
+        # 更新 checkpoint: 增量同步或强制全量同步(有 editTime),水位推进到 editTime <= current_max_time 全部完成
+        if plan['current_max_time'] and (plan['is_incremental'] or force_full_sync):
+            save_watermark(checkpoints, table, make_watermark(plan['current_max_time']))
+        elif plan.get('clear_progress'):
+            # 无 editTime 的表全量复制完成: 清除中途记录的断点
+            save_watermark(checkpoints, table, None)
+        
+        # 记录本次同步前观察到的源表状态(删除检测失败时不记录,下次仍会处理该表)
+        if checkpoints is not None and plan.get('table_state') is not None and not delete_failed:
+            checkpoints.commit(table, plan['table_state'], namespace=TABLE_STATE)
+        
+    return result_msg + " [✅ 成功]"
+
+def process_table(table, force_full_sync=False, detect_deletes=True, truncate_before_sync=False,
+                  delete_mode=DELETE_DETECT_MODE, delete_batch_size=DELETE_BATCH_SIZE, engine=TRANSFER_ENGINE,
+                  checkpoints=None, table_states=None, shadow_swap=False, full_engine=None, metrics=None,
+                  delete_precheck=DELETE_PRECHECK, budget=None):
+    """
+    同步一张表,返回 TableResult(结果消息、状态、各阶段耗时和行数),metrics(MetricsCollector)不为空时加入其中
+    budget(StreamBudget)不为空时传输前按通道数申请读取/写入流
+    """
+    record = TableResult(table)
+    msg = run_table_sync(
+        record, table, force_full_sync=force_full_sync, detect_deletes=detect_deletes,
+        truncate_before_sync=truncate_before_sync, delete_mode=delete_mode, delete_batch_size=delete_batch_size,
+        engine=engine, checkpoints=checkpoints, table_states=table_states, shadow_swap=shadow_swap,
+        full_engine=full_engine, delete_precheck=delete_precheck, budget=budget
+    )
+    record.finish(msg)
+    if metrics is not None:
+        metrics.add(record)
+    return record
+
+def run_table_sync(record, table, force_full_sync=False, detect_deletes=True, truncate_before_sync=False,
+                   delete_mode=DELETE_DETECT_MODE, delete_batch_size=DELETE_BATCH_SIZE, engine=TRANSFER_ENGINE,
+                   checkpoints=None, table_states=None, shadow_swap=False, full_engine=None,
+                   delete_precheck=DELETE_PRECHECK, budget=None):
+    src_conn = dest_conn = None
+    try:
+        with record.phase('connect'):
+            src_conn = src_pool.acquire()
+            dest_conn = dest_pool.acquire()
+    except Exception as e:
+        src_pool.release(src_conn)
+        return f"❌ {table}: 数据库连接失败 - {str(e)}"
+
+    try:
+        # 1. 确定同步范围(增量/全量)
+        with record.phase('prepare'):
+            plan, skip_msg = prepare_table_sync(
+                src_conn, dest_conn, table, force_full_sync, checkpoints, (table_states or {}).get(table)
+            )
+        if plan is None:
+            return skip_msg
+
+        # 2. 全量同步模式:可选择写入影子表或先清空目标表
+        if force_full_sync:
+            with record.phase('reload'):
+                prepare_full_reload(dest_conn, plan, truncate_before_sync, shadow_swap)
+        
+        # 3. 调用传输引擎 (datax: 每张表启动一次 DataX; native: 进程内 pymysql 流式读写;
+        #    load: LOAD DATA LOCAL INFILE 批量加载),全量复制可以单独指定引擎(full_engine)
+        #    大表按 (editTime, 主键) 分段,每段成功后记录断点,失败或中断时下次从断点继续
+        if full_engine and not plan['is_incremental']:
+            engine = full_engine
+        chunks = iter_sync_chunks(src_conn, plan, SYNC_CHUNK_ROWS) if plan['chunk_keys'] else [(plan['where_clause'], None)]
+        rows, seconds, chunk_count = None, 0.0, 0
+        # DataX 每个通道占用一个读取流和一个写入流,native / load 各占一个;预算不足时在 queue 阶段排队
+        if engine == 'datax' and budget is not None:
+            plan['channels'] = budget.fit(plan['channels'])
+        streams = plan['channels'] if engine == 'datax' else 1
+        with claim_streams(budget, streams, record), record.phase('transfer'):
+            for where_clause, boundary in chunks:
+                transfer = TRANSFER_ENGINES[engine](
+                    table, plan['columns_quoted'], where_clause, src_conn, dest_conn,
+                    split_pk=plan['split_pk'], channels=plan['channels'], dest_table=plan.get('dest_table')
+                )
+                record.add_transfer(engine, transfer)
+                if not transfer['ok']:
+                    if plan.get('dest_table'):
+                        drop_shadow_table(dest_conn, plan)
+                    progress = f" (已完成 {chunk_count} 段,下次从断点继续)" if chunk_count and plan['resumable'] else ""
+                    return f"❌ {table} 失败!{transfer['log']}{progress}\n    原因: {transfer['error']}"
+                chunk_count += 1
+                seconds += transfer['seconds']
+                if transfer['rows'] is not None:
+                    rows = (rows or 0) + transfer['rows']
+                if boundary is not None and plan['resumable']:
+                    if plan['is_incremental']:
+                        save_watermark(checkpoints, table, make_watermark(boundary[0], boundary[1:]))
+                    else:
+                        save_watermark(checkpoints, table, make_watermark(None, boundary))
+                        plan['clear_progress'] = True
+        if rows is not None:
+            rate = rows / seconds if seconds > 0 else rows
+            plan['result_msg'] += f" ({engine}: {rows} 行, {seconds:.1f} 秒, {rate:.0f} 行/秒)"
+            check_throughput(checkpoints, record, rows, seconds)
+            if record.regressed:
+                plan['result_msg'] += f" (⚠️ 吞吐下降: 基线 {record.baseline:.0f} 行/秒)"
+        if record.error_records:
+            plan['result_msg'] += f" (⚠️ {record.error_records} 条脏数据未写入)"
+        if chunk_count > 1:
+            plan['result_msg'] += f" ({chunk_count} 段)"
+        if plan.get('dest_table'):
+            try:
+                with record.phase('swap'):
+                    swap_shadow_table(dest_conn, plan)
+            except Exception as e:
+                drop_shadow_table(dest_conn, plan)
+                return f"❌ {table}: 影子表替换失败(目标表未改动) - {str(e)}"
+        if engine == 'datax' and plan['split_pk']:
+            plan['result_msg'] += f" ({plan['channels']} 通道, splitPk={plan['split_pk']})"
+
+        # 4. 删除检测 + 更新 checkpoint
+        return finish_table_sync(
+            src_conn, dest_conn, plan,
+            force_full_sync=force_full_sync, detect_deletes=detect_deletes,
+            truncate_before_sync=truncate_before_sync, delete_mode=delete_mode,
+            delete_batch_size=delete_batch_size, checkpoints=checkpoints, record=record,
+            delete_precheck=delete_precheck
+        )
+
+    except Exception as e:
+        return f"❌ {table}: 脚本异常 - {str(e)}"
+    finally:
+        src_pool.release(src_conn)
+        dest_pool.release(dest_conn)
+
+def transfer_rows_match(src_conn, dest_conn, plan):
+    """
+    核对一张表的传输结果: 同步范围(where 条件)内目标表的行数不少于源表
+    (源表在传输后新增的记录会使核对失败并重跑,删除的记录不影响)
+    """
+    counts = []
+    for conn, table in ((src_conn, plan['table']), (dest_conn, plan.get('dest_table') or plan['table'])):
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM `{table}` WHERE {plan['where_clause']}")
+            counts.append(cursor.fetchone()[0])
+    return counts[1] >= counts[0]
+
+def process_table_group(tables, force_full_sync=False, detect_deletes=True, truncate_before_sync=False,
+                        delete_mode=DELETE_DETECT_MODE, delete_batch_size=DELETE_BATCH_SIZE, checkpoints=None,
+                        table_states=None, shadow_swap=False, metrics=None, delete_precheck=DELETE_PRECHECK,
+                        budget=None):
+    """
+    在一个任务内依次同步多张小表,用进程内 native 引擎传输(按 WRITE_MODE 写入,默认 REPLACE INTO),
+    不为每张小表启动一次 DataX JVM;组内的表在 TableResult 中记录为 native 引擎
+    每张表传输后核对同步范围内的行数(transfer_rows_match,两端各一条 COUNT(*),耗时计入 row_check 阶段),
+    一致才做删除检测和 checkpoint 更新;传输失败或行数不一致的表在归还本任务的连接后单独用 DataX 重跑,
+    失败只影响对应的表
+    
+    返回:
+        每张表的 TableResult 列表
+    """
+    task_kwargs = dict(
+        force_full_sync=force_full_sync, detect_deletes=detect_deletes,
+        truncate_before_sync=truncate_before_sync, delete_mode=delete_mode,
+        delete_batch_size=delete_batch_size, checkpoints=checkpoints, table_states=table_states,
+        shadow_swap=shadow_swap, metrics=metrics, delete_precheck=delete_precheck, budget=budget
+    )
+    records = {table: TableResult(table) for table in tables}
+    results = []
+    
+    def done(table, msg):
+        results.append(records[table].finish(msg))
+        if metrics is not None:
+            metrics.add(records[table])
+    
+    src_conn = dest_conn = None
+    try:
+        src_conn = src_pool.acquire()
+        dest_conn = dest_pool.acquire()
+    except Exception as e:
+        src_pool.release(src_conn)
+        for table in tables:
+            done(table, f"❌ {table}: 数据库连接失败 - {str(e)}")
+        return results
+
+    fallback = []
+    try:
+        plans = []
+        for table in tables:
+            try:
+                with records[table].phase('prepare'):
+                    plan, skip_msg = prepare_table_sync(
+                        src_conn, dest_conn, table, force_full_sync, checkpoints, (table_states or {}).get(table)
+                    )
+            except Exception as e:
+                done(table, f"❌ {table}: 脚本异常 - {str(e)}")
+                continue
+            if plan is None:
+                done(table, skip_msg)
+            else:
+                plans.append(plan)
+        
+        if not plans:
+            return results
+        
+        if force_full_sync:
+            for plan in plans:
+                with records[plan['table']].phase('reload'):
+                    prepare_full_reload(dest_conn, plan, truncate_before_sync, shadow_swap)
+        
+        # DataX 的 JobContainer 只读取 job.content[0] 的 reader/writer,多个 content 条目的其余表不会被传输,
+        # 因此组内各表依次用进程内 native 引擎传输(不启动 JVM),传输后核对行数再提交 checkpoint
+        with claim_streams(budget, 1):
+            for plan in plans:
+                record = records[plan['table']]
+                try:
+                    with record.phase('transfer'):
+                        transfer = run_native_transfer(
+                            plan['table'], plan['columns_quoted'], plan['where_clause'], src_conn, dest_conn,
+                            dest_table=plan.get('dest_table')
+                        )
+                    if not transfer['ok']:
+                        fallback.append(plan)
+                        continue
+                    with record.phase('row_check'):
+                        rows_match = transfer_rows_match(src_conn, dest_conn, plan)
+                    if not rows_match:
+                        fallback.append(plan)
+                        continue
+                except Exception:
+                    fallback.append(plan)
+                    continue
+                record.add_transfer('native', transfer)
+                plan['result_msg'] += f" (native: {transfer['rows']} 行, {transfer['seconds']:.1f} 秒) (小表批量: {len(plans)} 张表)"
+                try:
+                    if plan.get('dest_table'):
+                        try:
+                            with record.phase('swap'):
+                                swap_shadow_table(dest_conn, plan)
+                        except Exception as e:
+                            drop_shadow_table(dest_conn, plan)
+                            done(plan['table'], f"❌ {plan['table']}: 影子表替换失败(目标表未改动) - {str(e)}")
+                            continue
+                    done(plan['table'], finish_table_sync(
+                        src_conn, dest_conn, plan, force_full_sync=force_full_sync, detect_deletes=detect_deletes,
+                        truncate_before_sync=truncate_before_sync, delete_mode=delete_mode,
+                        delete_batch_size=delete_batch_size, checkpoints=checkpoints, record=record,
+                        delete_precheck=delete_precheck
+                    ))
+                except Exception as e:
+                    done(plan['table'], f"❌ {plan['table']}: 脚本异常 - {str(e)}")
+        
+        for plan in fallback:
+            if plan.get('dest_table'):
+                drop_shadow_table(dest_conn, plan)
+    finally:
+        src_pool.release(src_conn)
+        dest_pool.release(dest_conn)
+    
+    # 传输失败或行数核对不一致的表: 单独用 DataX 重跑,失败只影响对应的表(指标由 process_table 记录)
+    # 本任务的连接已归还: process_table 从连接池取自己的连接,不与本任务持有的连接叠加占用 max_open
+    if fallback:
+        print(f"    ⚠️  小表批量中 {len(fallback)} 张表传输失败或行数不一致,改为逐表 DataX 同步: "
+              f"{', '.join(plan['table'] for plan in fallback)}")
+    for plan in fallback:
+        results.append(process_table(plan['table'], engine='datax', **task_kwargs))
+    return results
+
+def fetch_chunk_digest(conn, table, where, row_hash):
+    """
+    计算一个分段的摘要 (行数, BIT_XOR(行哈希), SUM(行哈希)),同时使用异或和求和,减少不同修改相互抵消
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*), BIT_XOR({row_hash}), SUM({row_hash}) FROM `{table}` WHERE {where}")
+        count, xor_digest, sum_digest = cursor.fetchone()
+        return int(count), int(xor_digest or 0), int(sum_digest or 0)
+
+def plan_verify_chunks(conn, table, meta, stats, chunk_rows=VERIFY_CHUNK_ROWS):
+    """
+    把一张表按主键切成若干段,返回每段的 where 条件(首尾两段不设下界/上界,覆盖目标表中超出源表范围的记录)
+    - 整数单主键: 按源表 MIN~MAX 等分,段数按估算行数确定,不需要扫描
+    - 其他主键: 按 keyset 在源表上逐段查找边界(与分段续传相同)
+    - 无主键: 整表一段
+    """
+    pk_fields = meta['primary_keys']
+    if not pk_fields:
+        return ["1=1"]
+    if len(pk_fields) == 1 and meta['types'].get(pk_fields[0]) in INTEGER_KEY_TYPES:
+        pk = f"`{pk_fields[0]}`"
+        lo, hi = get_int_key_bounds(conn, table, pk_fields[0])
+        if lo is None:
+            return ["1=1"]
+        rows = (stats or {}).get('rows') or (hi - lo + 1)
+        _, children = split_int_range(lo, hi, max(1, -(-rows // chunk_rows)))
+        chunks = [f"{pk} BETWEEN {start} AND {end}" for _, start, end in children]
+        chunks[0] = f"{pk} <= {children[0][2]}"
+        chunks[-1] = f"{pk} >= {children[-1][1]}" if len(children) > 1 else "1=1"
+        return chunks
+    plan = {'table': table, 'chunk_keys': pk_fields, 'lower_clause': None, 'upper_clause': None}
+    return [where for where, _ in iter_sync_chunks(conn, plan, chunk_rows)]
+
+def plan_table_verify(table, chunk_rows=VERIFY_CHUNK_ROWS):
+    with src_pool.connection() as conn:
+        meta = get_table_meta(conn, SRC_CONFIG['db'], table, src_catalog)
+        stats = src_catalog['stats'].get(table) if src_catalog else None
+        columns_quoted = [f"`{col}`" for col in meta['columns']]
+        return {
+            'table': table, 'meta': meta, 'columns_quoted': columns_quoted,
+            'row_hash': build_row_hash_expr(columns_quoted),
+            'chunks': plan_verify_chunks(conn, table, meta, stats, chunk_rows),
+        }
+
+def verify_chunk_digest(pool, plan, where):
+    with pool.connection() as conn:
+        return fetch_chunk_digest(conn, plan['table'], where, plan['row_hash'])
+
+def compare_chunks(executor, plans, chunk_ids):
+    """
+    两端并行计算分段摘要(每个分段、每一端一个任务),返回不一致的分段 {(表名, 段号): (源端摘要, 目标端摘要)}
+    """
+    futures = {}
+    for table, index in chunk_ids:
+        where = plans[table]['chunks'][index]
+        for side, pool in (('src', src_pool), ('dest', dest_pool)):
+            futures[executor.submit(verify_chunk_digest, pool, plans[table], where)] = (table, index, side)
+    digests = {}
+    for future in as_completed(futures):
+        table, index, side = futures[future]
+        digests.setdefault((table, index), {})[side] = future.result()
+    return {chunk: (d['src'], d['dest']) for chunk, d in digests.items() if d['src'] != d['dest']}
+
+def repair_chunk(plan, where, engine=TRANSFER_ENGINE):
+    """
+    重新同步一个不一致的分段: 用传输引擎写入源表该段的全部记录,再删除目标表该段中源表没有的主键
+    
+    返回:
+        (写入行数, 删除行数)
+    """
+    table, pk_fields = plan['table'], plan['meta']['primary_keys']
+    with src_pool.connection() as src_conn, dest_pool.connection() as dest_conn:
+        transfer = TRANSFER_ENGINES[engine](table, plan['columns_quoted'], where, src_conn, dest_conn)
+        if not transfer['ok']:
+            raise RuntimeError(f"{transfer['error']} {transfer['log']}".strip())
+        src_keys = fetch_range_rows(src_conn, table, pk_fields, where, "0")
+        dest_keys = fetch_range_rows(dest_conn, table, pk_fields, where, "0")
+        orphaned = sorted(key for key in dest_keys if key not in src_keys)
+        deleted, _ = delete_pks_in_batches(dest_conn, table, pk_fields, orphaned)
+        return transfer['rows'], deleted
+
+def run_verify(tables, chunk_rows=VERIFY_CHUNK_ROWS, repair=False, engine=TRANSFER_ENGINE,
+               workers=MAX_WORKERS, report_file=VERIFY_REPORT_FILE):
+    """
+    逐行校验模式(--verify): 每张表按主键切段,两端在服务端计算每段的行哈希摘要(字段与同步时相同),
+    跨表、跨分段并行;不一致的分段在短暂等待后复查一次(排除校验期间源表正在写入造成的差异)
+    repair=True 时只重新同步不一致的分段,完成后再次校验
+    结果写入 report_file,返回不一致的分段数
+    """
+    started = time.monotonic()
+    plans, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 1. 每张表切段
+        futures = {executor.submit(plan_table_verify, table, chunk_rows): table for table in tables}
+        for future in as_completed(futures):
+            try:
+                plans[futures[future]] = future.result()
+            except Exception as e:
+                errors[futures[future]] = str(e)
+        chunk_ids = [(table, i) for table, plan in plans.items() for i in range(len(plan['chunks']))]
+        print(f"🔎 校验 {len(plans)} 张表, {len(chunk_ids)} 个分段 (每段约 {chunk_rows} 行, 并发 {workers})")
+        
+        # 2. 两端计算摘要并对比,不一致的分段复查一次
+        mismatched = {}
+        try:
+            mismatched = compare_chunks(executor, plans, chunk_ids)
+            if mismatched:
+                time.sleep(1)
+                mismatched = compare_chunks(executor, plans, list(mismatched))
+        except Exception as e:
+            errors['*'] = str(e)
+        
+        # 3. 只重新同步不一致的分段
+        repaired = {}
+        if repair and mismatched:
+            repairable = [chunk for chunk in mismatched if plans[chunk[0]]['meta']['primary_keys']]
+            futures = {executor.submit(repair_chunk, plans[t], plans[t]['chunks'][i], engine): (t, i)
+                       for t, i in repairable}
+            for future in as_completed(futures):
+                try:
+                    repaired[futures[future]] = future.result()
+                except Exception as e:
+                    errors[futures[future][0]] = f"分段修复失败: {str(e)}"
+            remaining = compare_chunks(executor, plans, list(repaired)) if repaired else {}
+            mismatched = {chunk: digests for chunk, digests in mismatched.items()
+                          if chunk not in repaired or chunk in remaining}
+    
+    # 4. 输出结果并写入报告
+    report = {'started_at': datetime.datetime.now().isoformat(timespec='seconds'), 'tables': {}}
+    for table in tables:
+        if table in errors and table not in plans:
+            print(f"❌ {table}: 校验失败 - {errors[table]}")
+            report['tables'][table] = {'error': errors[table]}
+            continue
+        plan = plans[table]
+        bad = sorted(i for t, i in mismatched if t == table)
+        fixed = sorted(i for t, i in repaired if t == table and (t, i) not in mismatched)
+        entry = {'chunks': len(plan['chunks']), 'mismatched': [], 'repaired': []}
+        for i in bad:
+            (src_rows, _, _), (dest_rows, _, _) = mismatched[(table, i)]
+            entry['mismatched'].append({'where': plan['chunks'][i], 'src_rows': src_rows, 'dest_rows': dest_rows})
+        for i in fixed:
+            upserted, deleted = repaired[(table, i)]
+            entry['repaired'].append({'where': plan['chunks'][i], 'rows_written': upserted, 'rows_deleted': deleted})
+        if table in errors:
+            entry['error'] = errors[table]
+        report['tables'][table] = entry
+        
+        if fixed:
+            print(f"🔧 {table}: 已重新同步 {len(fixed)} 个不一致的分段 "
+                  f"(写入 {sum(r['rows_written'] or 0 for r in entry['repaired'])} 行, "
+                  f"删除 {sum(r['rows_deleted'] for r in entry['repaired'])} 行)")
+        if bad:
+            print(f"❌ {table}: {len(bad)}/{len(plan['chunks'])} 个分段不一致" + (" (无主键,请使用 --full 重新同步)"
+                  if not plan['meta']['primary_keys'] else ""))
+            for item in entry['mismatched'][:5]:
+                print(f"    {item['where']}: 源 {item['src_rows']} 行 / 目标 {item['dest_rows']} 行")
+            if len(bad) > 5:
+                print(f"    ... 共 {len(bad)} 个分段,详见 {report_file}")
+        if table in errors:
+            print(f"❌ {table}: {errors[table]}")
+        elif not bad and not fixed and '*' not in errors:
+            print(f"✅ {table}: {len(plan['chunks'])} 个分段一致")
+    if '*' in errors:
+        print(f"❌ 校验异常: {errors['*']}")
+        report['error'] = errors['*']
+    
+    report['seconds'] = round(time.monotonic() - started, 1)
+    report['mismatched_chunks'] = len(mismatched)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False, default=str)
+    print(f"📝 校验报告: {report_file} ({report['seconds']} 秒)")
+    return len(mismatched)
+
+def sample_source_load(conn, probe_sql=GOVERNOR_PROBE_SQL):
+    """
+    采样源库负载: Threads_running、复制延迟(源库不是从库或未知时为 None)、探测查询耗时(毫秒)
+    """
+    with conn.cursor() as cursor:
+        started = time.monotonic()
+        cursor.execute(probe_sql)
+        cursor.fetchall()
+        probe_ms = (time.monotonic() - started) * 1000
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+        threads_running = int(cursor.fetchone()[1])
+        # MySQL 8.0.22 之前为 SHOW SLAVE STATUS;没有 REPLICATION CLIENT 权限时不采样复制延迟
+        replica_lag = None
+        for sql in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                cursor.execute(sql)
+            except pymysql.err.MySQLError:
+                continue
+            row = cursor.fetchone()
+            if row:
+                status = dict(zip([d[0] for d in cursor.description], row))
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                replica_lag = int(lag) if lag is not None else None
+            break
+    return {'threads_running': threads_running, 'replica_lag': replica_lag, 'probe_ms': round(probe_ms, 1)}
+
+def next_worker_limit(limit, load, limits, min_workers, max_workers):
+    """
+    按源库负载调整并发线程数(加性增、乘性减): 任一指标超过阈值则减半,
+    所有指标都低于阈值的一半则加 1,其余情况保持不变
+    
+    返回: (新的并发数, 超过阈值的指标列表)
+    """
+    over = [name for name, value in load.items() if value is not None and value > limits[name]]
+    if over:
+        return max(min_workers, limit // 2), over
+    if all(value is None or value <= limits[name] / 2 for name, value in load.items()):
+        return min(max_workers, limit + 1), over
+    return max(min_workers, min(max_workers, limit)), over
+
+class ConcurrencyGovernor:
+    """
+    自适应并发: 后台线程每 interval 秒用一个源库连接采样负载(sample_source_load),
+    按 next_worker_limit 调整允许同时运行的表数;线程池按上限创建,超出当前并发数的任务在 slot() 中排队
+    
+    - 第一次采样在 start() 中同步完成,源库已经繁忙时不会以上限并发开始
+    - 采样失败时保持当前并发数,下次重新取连接
+    """
+    def __init__(self, pool, min_workers=GOVERNOR_MIN_WORKERS, max_workers=MAX_WORKERS,
+                 max_threads_running=GOVERNOR_MAX_THREADS_RUNNING, max_replica_lag=GOVERNOR_MAX_REPLICA_LAG,
+                 max_probe_ms=GOVERNOR_MAX_PROBE_MS, interval=GOVERNOR_INTERVAL):
+        self.pool = pool
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.limits = {'threads_running': max_threads_running, 'replica_lag': max_replica_lag,
+                       'probe_ms': max_probe_ms}
+        self.interval = interval
+        self.limit = max_workers
+        self.active = 0
+        self.adjustments = 0
+        self.lowest = max_workers
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+
+    def set_limit(self, limit):
+        with self._cond:
+            self.limit = limit
+            self.lowest = min(self.lowest, limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def run(self, func, *args, **kwargs):
+        with self.slot():
+            return func(*args, **kwargs)
+
+    def sample(self):
+        try:
+            if self._conn is None:
+                self._conn = self.pool.acquire()
+            load = sample_source_load(self._conn)
+        except Exception as e:
+            print(f"⚠️  采样源库负载失败,保持并发 {self.limit}: {e}")
+            if self._conn is not None:
+                self.pool.discard(self._conn)
+            self._conn = None
+            return
+        limit, over = next_worker_limit(self.limit, load, self.limits, self.min_workers, self.max_workers)
+        if limit != self.limit:
+            self.adjustments += 1
+            reason = ', '.join(f"{name} {load[name]} > {self.limits[name]}" for name in over) or "源库空闲"
+            print(f"[{time.strftime('%H:%M:%S')}] 🎚️  并发 {self.limit} → {limit} ({reason})")
+            self.set_limit(limit)
+
+    def start(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, name="governor", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.pool.release(self._conn)
+        self._conn = None
+
+def next_poll_interval(interval, changed, min_interval=None, max_interval=None):
+    """
+    按表的变化情况调整轮询间隔: 本次有变化则间隔减半,没有变化则加倍
+    经常变化的表很快收敛到最短间隔,长期不变的表收敛到最长间隔
+    """
+    min_interval = DAEMON_MIN_INTERVAL if min_interval is None else min_interval
+    max_interval = DAEMON_MAX_INTERVAL if max_interval is None else max_interval
+    if changed:
+        return max(min_interval, interval / 2)
+    return min(max_interval, interval * 2)
+
+def run_daemon(tables, checkpoints, stop_event, engine=TRANSFER_ENGINE, full_engine=None, task_kwargs=None,
+               skip_unchanged=True, list_tables=None, workers=MAX_WORKERS, governor=None):
+    """
+    常驻模式: 元数据、连接池、checkpoint 在整个进程期间保持加载,每张表按各自的间隔轮询
+    
+    - 每张表同一时间只有一个任务;到期的表先批量判断是否变化(UPDATE_TIME,轮询时不执行 CHECKSUM TABLE),
+      有 editTime 水位的表在 UPDATE_TIME 变化后再确认一次 MAX(editTime) 没有超过水位,未变化的表不提交任务
+      (find_polled_unchanged_tables,统计信息最多每 DAEMON_MIN_INTERVAL 秒读取一次)
+    - 同步有数据写入的表视为有变化,间隔减半;无新数据或未变化的表间隔加倍;失败的表间隔不变
+    - 每 DAEMON_CATALOG_REFRESH 秒重新加载元数据目录,list_tables 不为空时同时刷新表清单,
+      并写出这一周期的运行指标(task_kwargs 中的 metrics)
+    - stop_event 被设置(SIGTERM)或 Ctrl-C 后不再提交新任务,等待进行中的表完成后退出
+    - governor 不为空时按源库负载限制同时运行的表数(ConcurrencyGovernor)
+    """
+    task_kwargs = {k: v for k, v in (task_kwargs or {}).items() if k != 'table_states'}
+    intervals = {table: DAEMON_MIN_INTERVAL for table in tables}
+    next_due = {table: 0.0 for table in tables}
+    in_flight = {}  # {future: 表名}
+    poll_cache = {}  # 统计信息读取时间和已确认的 UPDATE_TIME(find_polled_unchanged_tables)
+    last_refresh = time.monotonic()
+    
+    def report(table, future):
+        try:
+            result = future.result()
+        except Exception as exc:
+            result = TableResult(table).finish(f"❌ {table} 线程异常: {exc}")
+        if "⏹️" not in result.message:
+            print(f"[{time.strftime('%H:%M:%S')}] {result.message}")
+        return result
+    
+    print(f"🔁 常驻模式: {len(tables)} 张表,轮询间隔 {DAEMON_MIN_INTERVAL} ~ {DAEMON_MAX_INTERVAL} 秒 (Ctrl-C / SIGTERM 退出)")
+    run = governor.run if governor else lambda func, *args, **kwargs: func(*args, **kwargs)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while not stop_event.is_set():
+                # 1. 收集已完成的表,调整轮询间隔
+                for future in [f for f in in_flight if f.done()]:
+                    table = in_flight.pop(future)
+                    result = report(table, future)
+                    if table in intervals:
+                        if result.status != 'failed':
+                            intervals[table] = next_poll_interval(intervals[table], result.status == 'ok')
+                        next_due[table] = time.monotonic() + intervals[table]
+                
+                # 2. 定期刷新元数据目录和表清单
+                now = time.monotonic()
+                if now - last_refresh >= DAEMON_CATALOG_REFRESH:
+                    last_refresh = now
+                    if task_kwargs.get('metrics') is not None:
+                        export_metrics(task_kwargs['metrics'], prefix=f"[{time.strftime('%H:%M:%S')}] ")
+                    try:
+                        load_schema_catalogs()
+                        if list_tables is not None:
+                            current = list_tables()
+                            for table in set(current) - set(intervals):
+                                intervals[table], next_due[table] = DAEMON_MIN_INTERVAL, now
+                            for table in set(intervals) - set(current):
+                                del intervals[table], next_due[table]
+                    except Exception as e:
+                        print(f"⚠️  刷新元数据目录失败: {e}")
+                
+                # 3. 提交到期的表
+                busy = set(in_flight.values())
+                due = [table for table, at in next_due.items() if at <= now and table not in busy]
+                states = None
+                if due and skip_unchanged and src_catalog:
+                    try:
+                        with src_pool.connection() as conn:
+                            states, unchanged = find_polled_unchanged_tables(conn, due, src_catalog, checkpoints,
+                                                                             poll_cache, now)
+                    except Exception as e:
+                        print(f"⚠️  检查表是否变化失败: {e}")
+                        unchanged = set()
+                    for table in unchanged:
+                        intervals[table] = next_poll_interval(intervals[table], False)
+                        next_due[table] = now + intervals[table]
+                    due = [table for table in due if table not in unchanged]
+                for table in due:
+                    future = executor.submit(run, process_table, table, engine=engine, full_engine=full_engine,
+                                             table_states=states, **task_kwargs)
+                    in_flight[future] = table
+                    next_due[table] = float('inf')
+                
+                # 4. 等到下一张表到期或有任务完成(最多 1 秒,以便及时响应退出)
+                timeout = min(max(min(list(next_due.values()) + [now + 1]) - time.monotonic(), 0.05), 1.0)
+                if in_flight:
+                    wait_futures(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    stop_event.wait(timeout)
+        except KeyboardInterrupt:
+            pass
+        
+        print(f"⏹️  常驻模式退出" + (f",等待 {len(in_flight)} 张表完成..." if in_flight else ""))
+        for future in as_completed(list(in_flight)):
+            report(in_flight[future], future)
+
+def check_binlog_settings(conn):
+    """
+    检查源库 binlog 设置是否满足 CDC 要求,不满足时抛出 RuntimeError:
+    - binlog_format=ROW
+    - binlog_row_image=FULL: MINIMAL/NOBLOB 时更新事件只记录修改过的列,整行 REPLACE 会把其余列写成 NULL
+    - binlog_row_metadata=FULL(MySQL 8.0.14+): 否则行事件不带列名,无法按列名应用变更;
+      更早的版本没有该变量,列名由 mysql-replication 从 information_schema 读取
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT @@binlog_format, @@binlog_row_image")
+        binlog_format, row_image = cursor.fetchone()
+        if binlog_format != 'ROW':
+            raise RuntimeError(f"源库 binlog_format={binlog_format},CDC 模式需要 ROW")
+        if row_image != 'FULL':
+            raise RuntimeError(f"源库 binlog_row_image={row_image},CDC 模式需要 FULL(否则更新事件缺少未修改的列)")
+        try:
+            cursor.execute("SELECT @@binlog_row_metadata")
+        except pymysql.err.MySQLError as e:
+            if e.args[0] != 1193:  # Unknown system variable: 8.0.14 之前的版本
+                raise
+            return
+        row_metadata = cursor.fetchone()[0]
+        if row_metadata != 'FULL':
+            raise RuntimeError(f"源库 binlog_row_metadata={row_metadata},CDC 模式需要 FULL(否则行事件不带列名)")
+
+def get_binlog_position(conn):
+    """
+    获取源库当前的 binlog 位置,源库的 binlog 设置须满足 check_binlog_settings
+    返回: {'log_file': ..., 'log_pos': ...}
+    """
+    check_binlog_settings(conn)
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SHOW MASTER STATUS")
+        except pymysql.err.MySQLError:
+            # MySQL 8.4 起改名
+            cursor.execute("SHOW BINARY LOG STATUS")
+        row = cursor.fetchone()
+        if not row:
+            raise RuntimeError("源库未开启 binlog")
+        return {'log_file': row[0], 'log_pos': row[1]}
 
-def get_primary_keys(conn, db, table):
+class ChangeBatch:
     """
-    获取表的主键字段列表
-    返回: 主键字段名列表,如果没有主键返回空列表
+    攒批的行变更: 同一主键只保留最后一次的结果(整行写入或删除),
+    重复应用同一批变更的结果不变,因此 binlog 位置稍有滞后时重放是安全的
     """
-    sql = f"""
-    SELECT COLUMN_NAME
-    FROM information_schema.KEY_COLUMN_USAGE
-    WHERE TABLE_SCHEMA = '{db}' 
-    AND TABLE_NAME = '{table}'
-    AND CONSTRAINT_NAME = 'PRIMARY'
-    ORDER BY ORDINAL_POSITION
+    def __init__(self, pk_fields_of):
+        self.pk_fields_of = pk_fields_of
+        self.changes = {}  # {表名: {主键元组: 整行 dict 或 None(删除)}}
+        self.rows = 0
+
+    def _key(self, table, values):
+        try:
+            return tuple(values[pk] for pk in self.pk_fields_of[table])
+        except KeyError as e:
+            raise RuntimeError(f"{table}: binlog 行事件缺少主键字段 {e}(MySQL 8 需要 binlog_row_metadata=FULL)")
+
+    def add(self, table, before, after):
+        """before 为 None 表示插入,after 为 None 表示删除"""
+        changes = self.changes.setdefault(table, {})
+        after_key = self._key(table, after) if after is not None else None
+        if before is not None:
+            before_key = self._key(table, before)
+            if before_key != after_key:
+                # 删除,或修改了主键: 旧主键的记录需要删除
+                changes[before_key] = None
+        if after is not None:
+            changes[after_key] = after
+        self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+def apply_change_batch(dest_conn, batch, columns_of, delete_batch_size=DELETE_BATCH_SIZE):
     """
-    with conn.cursor() as cursor:
-        cursor.execute(sql)
-        return [row[0] for row in cursor.fetchall()]
+    在一个目标库事务中应用一批变更: 先按主键批量删除,再批量 REPLACE
+    返回: (写入行数, 删除行数)
+    """
+    upserted = deleted = 0
+    try:
+        with dest_conn.cursor() as cursor:
+            for table, changes in batch.changes.items():
+                pk_fields = batch.pk_fields_of[table]
+                deletes = [key for key, row in changes.items() if row is None]
+                for i in range(0, len(deletes), delete_batch_size):
+                    keys = deletes[i:i + delete_batch_size]
+                    cursor.execute(
+                        f"DELETE FROM `{table}` WHERE {build_pk_in_clause(pk_fields, len(keys))}",
+                        [value for key in keys for value in key]
+                    )
+                rows = [tuple(row.get(col) for col in columns_of[table]) for row in changes.values() if row is not None]
+                if rows:
+                    cursor.executemany(build_write_sql(table, [f"`{col}`" for col in columns_of[table]]), rows)
+                upserted += len(rows)
+                deleted += len(deletes)
+        dest_conn.commit()
+    except Exception:
+        dest_conn.rollback()
+        raise
+    return upserted, deleted
 
-def detect_and_delete_orphaned_records(src_conn, dest_conn, table, pk_fields, db_config):
+def run_cdc_stream(tables, checkpoints, position, stop_event=None):
     """
-    检测并删除目标表中多余的记录(源表已删除但目标表仍存在的记录)
-    
-    参数:
-        src_conn: 源数据库连接
-        dest_conn: 目标数据库连接
-        table: 表名
-        pk_fields: 主键字段列表
-        db_config: 数据库配置(用于获取数据库名)
+    CDC 模式: 持续读取源库的行格式 binlog,把 INSERT/UPDATE/DELETE 攒批后应用到目标库
     
-    返回:
-        删除的记录数
+    - 只在事务边界(XID)处攒批,每批在一个目标库事务中应用,应用后记录 binlog 位置
+    - 每批最多 CDC_BATCH_ROWS 行变更,或攒批超过 CDC_FLUSH_INTERVAL 秒即应用
+    - 没有主键的表无法按主键应用变更,不处理
+    - 从记录的位置继续时同样检查源库 binlog 设置(可能在两次运行之间被修改)
     """
-    if not pk_fields:
-        return 0
+    with src_pool.connection() as conn:
+        check_binlog_settings(conn)
+        metas = {table: get_table_meta(conn, SRC_CONFIG['db'], table, src_catalog) for table in tables}
+    pk_fields_of = {table: meta['primary_keys'] for table, meta in metas.items() if meta['primary_keys']}
+    columns_of = {table: metas[table]['columns'] for table in pk_fields_of}
+    skipped = [table for table in tables if table not in pk_fields_of]
+    if skipped:
+        print(f"⚠️  CDC: {len(skipped)} 张表无主键,不处理: {', '.join(skipped)}")
+    if not pk_fields_of:
+        print("❌ CDC: 没有可处理的表")
+        return
+    
+    position_key = f"{SRC_CONFIG['host']}:{SRC_CONFIG['port']}"
+    print(f"📡 CDC: 从 {position['log_file']}:{position['log_pos']} 开始读取 binlog ({len(pk_fields_of)} 张表)")
+    stream = BinLogStreamReader(
+        connection_settings={'host': SRC_CONFIG['host'], 'port': SRC_CONFIG['port'],
+                             'user': SRC_CONFIG['user'], 'passwd': SRC_CONFIG['password']},
+        server_id=CDC_SERVER_ID,
+        only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent, HeartbeatLogEvent],
+        only_schemas=[SRC_CONFIG['db']],
+        only_tables=sorted(pk_fields_of),
+        log_file=position['log_file'], log_pos=position['log_pos'], resume_stream=True,
+        blocking=True, slave_heartbeat=CDC_FLUSH_INTERVAL,
+    )
+    
+    batch = ChangeBatch(pk_fields_of)
+    txn = []  # 当前事务中的变更,遇到 XID 才并入 batch
+    batch_position = None
+    last_apply = time.monotonic()
+    
+    def apply_batch():
+        nonlocal batch, last_apply
+        if len(batch):
+            with dest_pool.connection() as dest_conn:
+                upserted, deleted = apply_change_batch(dest_conn, batch, columns_of)
+            print(f"📡 CDC: 写入 {upserted} 行, 删除 {deleted} 行 "
+                  f"({batch_position['log_file']}:{batch_position['log_pos']})")
+        checkpoints.commit(position_key, batch_position, namespace=BINLOG)
+        batch = ChangeBatch(pk_fields_of)
+        last_apply = time.monotonic()
     
     try:
-        # 构建主键字段的 SQL 片段
-        pk_columns = ', '.join([f"`{pk}`" for pk in pk_fields])
-        
-        # 获取源表的所有主键值
-        src_cursor = src_conn.cursor()
-        src_cursor.execute(f"SELECT {pk_columns} FROM `{table}`")
-        src_pks = set(src_cursor.fetchall())
-        src_cursor.close()
-        
-        # 获取目标表的所有主键值
-        dest_cursor = dest_conn.cursor()
-        dest_cursor.execute(f"SELECT {pk_columns} FROM `{table}`")
-        dest_pks = set(dest_cursor.fetchall())
-        dest_cursor.close()
-        
-        # 计算需要删除的记录(目标表有但源表没有)
-        orphaned_pks = dest_pks - src_pks
-        
-        if not orphaned_pks:
-            return 0
-        
-        # 删除多余的记录
-        deleted_count = 0
-        dest_cursor = dest_conn.cursor()
-        
-        for pk_values in orphaned_pks:
-            # 构建 WHERE 条件
-            if len(pk_fields) == 1:
-                # 单主键
-                where_clause = f"`{pk_fields[0]}` = %s"
-                dest_cursor.execute(f"DELETE FROM `{table}` WHERE {where_clause}", (pk_values,))
-            else:
-                # 复合主键
-                conditions = [f"`{pk}` = %s" for pk in pk_fields]
-                where_clause = ' AND '.join(conditions)
-                dest_cursor.execute(f"DELETE FROM `{table}` WHERE {where_clause}", pk_values)
+        for event in stream:
+            if isinstance(event, WriteRowsEvent):
+                txn.extend((event.table, None, row['values']) for row in event.rows)
+            elif isinstance(event, UpdateRowsEvent):
+                txn.extend((event.table, row['before_values'], row['after_values']) for row in event.rows)
+            elif isinstance(event, DeleteRowsEvent):
+                txn.extend((event.table, row['values'], None) for row in event.rows)
+            elif isinstance(event, XidEvent):
+                for change in txn:
+                    batch.add(*change)
+                txn = []
+                batch_position = {'log_file': stream.log_file, 'log_pos': stream.log_pos}
             
-            deleted_count += dest_cursor.rowcount
-        
-        dest_conn.commit()
-        dest_cursor.close()
-        
-        return deleted_count
-        
-    except Exception as e:
-        print(f"    ⚠️  删除检测失败: {str(e)}")
-        return 0
+            if batch_position and (len(batch) >= CDC_BATCH_ROWS or time.monotonic() - last_apply >= CDC_FLUSH_INTERVAL):
+                apply_batch()
+                batch_position = None
+            if stop_event is not None and stop_event.is_set():
+                break
+    finally:
+        # 退出时应用已完整读取的事务(未读到 XID 的事务下次从记录的位置重新读取)
+        try:
+            if batch_position:
+                apply_batch()
+        finally:
+            stream.close()
 
-def process_table(table, force_full_sync=False, detect_deletes=True, truncate_before_sync=False):
-    try:
-        src_conn = get_connection(SRC_CONFIG)
-        dest_conn = get_connection(DEST_CONFIG)
-    except Exception as e:
-        return f"❌ {table}: 数据库连接失败 - {str(e)}"
+def report_unit_results(future_to_table):
+    """
+    按完成顺序输出每个任务(单表或小表批量)的结果
+    返回: 失败(❌ 或线程异常)的表名列表
+    """
+    failed = []
+    for future in as_completed(future_to_table):
+        table = future_to_table[future]
+        try:
+            result = future.result()
+            for table_result in (result if isinstance(result, list) else [result]):
+                if "⏹️" not in table_result.message:
+                    print(table_result.message)
+                if classify_result(table_result.message) == 'failed':
+                    failed.append(table_result.table)
+        except Exception as exc:
+            print(f"❌ {table} 线程异常: {exc}")
+            failed.extend(table.split(', '))
+    return failed
 
-    # 动态生成 JSON 文件的路径
-    temp_json_file = f"tmp_job_{table}.json"
-    result_msg = ""
-    
+def run_cdc_after_sync(failed_tables, tables, checkpoints, position, stop_event=None):
+    """
+    常规同步完成后从 position 开始 CDC
+    有表常规同步失败时不启动 CDC、不记录 binlog 位置(并清除以前记录的位置),以非 0 状态退出:
+    记录位置后下次运行会跳过常规同步,失败的表在该位置之前的记录将永远不会被复制
+    """
+    if failed_tables:
+        position_key = f"{SRC_CONFIG['host']}:{SRC_CONFIG['port']}"
+        if checkpoints.get(position_key, namespace=BINLOG):
+            checkpoints.commit(position_key, None, namespace=BINLOG)
+        print(f"❌ CDC: {len(failed_tables)} 张表常规同步失败,不启动 CDC: {', '.join(failed_tables)}")
+        print("   修复后重新运行 --cdc,会重新记录 binlog 位置并执行常规同步")
+        sys.exit(1)
     try:
-        # 1. 获取带有反引号的字段列表 (关键步骤！)
-        columns_quoted = get_table_columns_quoted(src_conn, SRC_CONFIG['db'], table)
-        if not columns_quoted:
-            return f"❌ {table}: 无法获取字段信息，跳过"
-
-        # 2. 检查是否有 editTime
-        with src_conn.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT count(*) FROM information_schema.COLUMNS 
-                WHERE TABLE_SCHEMA = '{SRC_CONFIG['db']}' 
-                AND TABLE_NAME = '{table}' 
-                AND COLUMN_NAME = 'editTime'
-            """)
-            has_edittime = cursor.fetchone()[0] > 0
-
-        where_clause = ""
-        current_max_time = None
-        is_incremental = False
-        checkpoints = load_checkpoint()
-
-        # 强制全量同步模式
-        if force_full_sync:
-            where_clause = "1=1"
-            result_msg = f"🔄 {table}: 强制全量同步"
-            # 如果有 editTime,获取当前最大时间用于更新 checkpoint
-            if has_edittime:
-                with src_conn.cursor() as cursor:
-                    cursor.execute(f"SELECT MAX(editTime) FROM `{table}`")
-                    res = cursor.fetchone()[0]
-                    if res:
-                        current_max_time = str(res)
-        elif not has_edittime:
-            where_clause = "1=1"
-            result_msg = f"🔄 {table}: 全量同步 (无 editTime)"
-        else:
-            start_time = "1970-01-01 00:00:00"
-            if table in checkpoints:
-                start_time = checkpoints[table]
-            else:
-                local_max = get_local_max_time(dest_conn, table)
-                if local_max: start_time = local_max
-
-            with src_conn.cursor() as cursor:
-                cursor.execute(f"SELECT MAX(editTime) FROM `{table}`")
-                res = cursor.fetchone()[0]
-                if res is None:
-                    return f"⚠️ {table}: 源表为空，跳过"
-                current_max_time = str(res)
-
-            if current_max_time <= start_time:
-                return f"⏹️  {table}: 无新数据 (Current: {current_max_time})"
-
-            where_clause = f"editTime > '{start_time}' AND editTime <= '{current_max_time}'"
-            is_incremental = True
-            result_msg = f"🚀 {table}: 增量同步 ({start_time} -> {current_max_time})"
-
-        # 3. 动态构建 DataX JSON 配置字典
-        # 我们不再读取 job.json 模板，而是直接在内存里生成配置
-        # 这样可以将 columns_quoted 列表完美嵌入，不会有格式问题
-        job_config = {
-            "job": {
-                "content": [{
-                    "reader": {
-                        "name": "mysqlreader",
-                        "parameter": {
-                            "username": SRC_CONFIG['user'],
-                            "password": SRC_CONFIG['password'],
-                            "column": columns_quoted,  # 使用带反引号的字段列表
-                            "connection": [{
-                                "jdbcUrl": [f"jdbc:mysql://{SRC_CONFIG['host']}:{SRC_CONFIG['port']}/{SRC_CONFIG['db']}?useUnicode=true&characterEncoding=utf8"],
-                                "table": [table]
-                            }],
-                            "where": where_clause
-                        }
-                    },
-                    "writer": {
-                        "name": "mysqlwriter",
-                        "parameter": {
-                            "username": DEST_CONFIG['user'],
-                            "password": DEST_CONFIG['password'],
-                            "writeMode": "replace",
-                            "column": columns_quoted,  # 写入端也用同样的字段列表
-                            "connection": [{
-                                "jdbcUrl": f"jdbc:mysql://{DEST_CONFIG['host']}:{DEST_CONFIG['port']}/{DEST_CONFIG['db']}?useUnicode=true&characterEncoding=utf8&rewriteBatchedStatements=true",
-                                "table": [table]
-                            }]
-                        }
-                    }
-                }],
-                "setting": {
-                    "speed": {"channel": 5}
-                }
-            }
-        }
-
-        # 4. 将配置写入临时 JSON 文件
-        with open(temp_json_file, 'w', encoding='utf-8') as f:
-            json.dump(job_config, f, ensure_ascii=False)
-
-        # 5. 全量同步模式:可选择先清空目标表
-        if force_full_sync and truncate_before_sync:
-            try:
-                with dest_conn.cursor() as cursor:
-                    cursor.execute(f"TRUNCATE TABLE `{table}`")
-                dest_conn.commit()
-                result_msg += " (已清空目标表)"
-            except Exception as e:
-                print(f"    ⚠️  清空表失败: {str(e)}")
-        
-        # 6. 调用 DataX (直接指向临时文件,不需要 -p 参数了)
-        cmd = ["python3", DATAX_PATH, temp_json_file]
-
-        result = subprocess.run(
-            cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.STDOUT,
-            encoding='utf-8',       
-            errors='ignore'
-        )
-        
-        # 7. 删除临时配置文件 (清理现场)
-        if os.path.exists(temp_json_file):
-            os.remove(temp_json_file)
-
-        if result.returncode != 0:
-            log_file = f"error_{table}.log"
-            with open(log_file, "w", encoding='utf-8') as f:
-                f.write(result.stdout)
-            
-            # 提取错误摘要
-            log_lines = result.stdout.splitlines()
-            error_summary = [line.strip() for line in log_lines if "Exception" in line or "Error" in line]
-            if not error_summary: error_summary = log_lines[-5:]
-            summary_str = "\n    ".join(error_summary[-2:]) 
-
-            return f"❌ {table} 失败!(日志: {log_file})\n    原因: {summary_str}"
-
-        # 8. 删除检测:检测并删除目标表中多余的记录
-        deleted_count = 0
-        if detect_deletes and not (force_full_sync and truncate_before_sync):
-            # 如果是全量同步且已清空表,则不需要删除检测
-            try:
-                pk_fields = get_primary_keys(src_conn, SRC_CONFIG['db'], table)
-                if pk_fields:
-                    deleted_count = detect_and_delete_orphaned_records(
-                        src_conn, dest_conn, table, pk_fields, SRC_CONFIG
-                    )
-                    if deleted_count > 0:
-                        result_msg += f" (删除 {deleted_count} 条)"
-                else:
-                    # 没有主键,跳过删除检测
-                    if detect_deletes:
-                        result_msg += " (无主键,跳过删除检测)"
-            except Exception as e:
-                result_msg += f" (删除检测异常: {str(e)})"
-        
-        # 9. 更新 checkpoint: 增量同步或强制全量同步(有 editTime)
-        if current_max_time and (is_incremental or force_full_sync):
-            update_checkpoint(table, current_max_time)
-            
-        return result_msg + " [✅ 成功]"
-
+        run_cdc_stream(tables, checkpoints, position, stop_event)
+    except KeyboardInterrupt:
+        print("⏹️  CDC 已停止")
     except Exception as e:
-        return f"❌ {table}: 脚本异常 - {str(e)}"
-    finally:
-        try:
-            src_conn.close()
-            dest_conn.close()
-        except:
-            pass
+        # 源库设置不满足要求、行事件缺少列名、目标库写入失败等: 已应用的批次位置已记录,修复后重新运行即可继续
+        print(f"❌ CDC 异常退出: {e}")
+        sys.exit(1)
 
 def main():
     # 解析命令行参数
@@ -373,6 +3223,54 @@ def main():
   
   # 全量同步前清空表
   python3 sync.py --full --truncate-before-sync
+  
+  # 全量同步写入影子表,完成后原子替换(读取方看不到空表)
+  python3 sync.py --full --shadow-swap
+  
+  # 删除检测使用全量主键集合(小表更快,大表内存占用高)
+  python3 sync.py --delete-mode set
+  
+  # 删除检测使用分段哈希,两端一致时几乎不传输数据(适合远程源库)
+  python3 sync.py --delete-mode hash
+  
+  # 删除检测前的预检同时比较主键集合校验和(更严格,两端数量和范围相同但主键不同时也能发现)
+  python3 sync.py --delete-precheck checksum
+  
+  # 每批删除 5000 条多余记录(每批单独提交)
+  python3 sync.py --delete-batch-size 5000
+  
+  # 使用进程内 pymysql 引擎传输(不启动 DataX/JVM,适合大量小表)
+  python3 sync.py --engine native
+  
+  # 全量复制使用 LOAD DATA LOCAL INFILE 批量加载,增量仍使用 DataX
+  python3 sync.py --full-engine load
+  
+  # 常驻运行,每张表按各自的变化频率轮询(替代 cron 定时运行)
+  python3 sync.py --daemon
+  
+  # 持续读取源库 binlog,实时同步插入/更新/删除(需要 pip install mysql-replication)
+  python3 sync.py --cdc
+  
+  # 小表合并为批量任务(进程内传输,不启动 JVM),大表仍单独运行 DataX
+  python3 sync.py --group-small-tables
+  
+  # 不跳过未变化的表(每张表都检查/复制)
+  python3 sync.py --no-skip-unchanged
+  
+  # 逐段校验两端数据(行哈希摘要),输出不一致的主键范围到 verify_report.json
+  python3 sync.py --verify
+  
+  # 校验并只重新同步不一致的主键范围
+  python3 sync.py --verify-repair --tables table1 table2
+  
+  # 按源库负载自适应调整并发(白天源库繁忙时自动降低,夜间空闲时升到上限)
+  python3 sync.py --adaptive-workers --max-workers 16 --max-threads-running 24
+  
+  # 整个运行最多同时 32 个源库读取流、24 个目标库写入流(DataX 每个通道各占一个),超出时排队
+  python3 sync.py --max-reader-streams 32 --max-writer-streams 24
+  
+  # 运行结束时写出 Prometheus textfile 指标(各阶段耗时、行数、单表耗时 p50/p95)
+  python3 sync.py --metrics-prom /var/lib/node_exporter/textfile/mysql_sync.prom
         '''
     )
     
@@ -408,12 +3306,253 @@ def main():
         help='全量同步前清空目标表(仅在 --full 模式下生效)'
     )
     
+    parser.add_argument(
+        '--shadow-swap',
+        action='store_true',
+        help=f'全量同步写入影子表 <表名>{SHADOW_SUFFIX}(二级索引最后一次性创建),完成后 RENAME TABLE 原子替换(仅在 --full 模式下生效)'
+    )
+    
+    parser.add_argument(
+        '--delete-mode',
+        choices=['merge', 'set', 'hash'],
+        default=DELETE_DETECT_MODE,
+        help=f'删除检测模式: merge 按主键流式归并(内存恒定), set 全量主键集合求差, '
+             f'hash 分段哈希对比(只传输摘要,同时发现内容不一致)(默认 {DELETE_DETECT_MODE})'
+    )
+    
+    parser.add_argument(
+        '--delete-batch-size',
+        type=int,
+        default=DELETE_BATCH_SIZE,
+        metavar='N',
+        help=f'删除多余记录时每批删除的条数,每批单独提交(默认 {DELETE_BATCH_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--delete-precheck',
+        choices=['count', 'checksum', 'off'],
+        default=DELETE_PRECHECK,
+        help=f'删除检测前的聚合预检(merge/set 模式): count 比较两端 COUNT(*) 和主键 MIN/MAX, '
+             f'checksum 另外比较主键集合校验和, off 不预检;一致时跳过逐主键对比(默认 {DELETE_PRECHECK})'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=sorted(TRANSFER_ENGINES),
+        default=TRANSFER_ENGINE,
+        help=f'传输引擎: datax 每张表启动一次 DataX, native 进程内 pymysql 流式读写(不启动 JVM)(默认 {TRANSFER_ENGINE})'
+    )
+    
+    parser.add_argument(
+        '--full-engine',
+        choices=sorted(TRANSFER_ENGINES),
+        help='全量复制(无 editTime 或 --full)使用的传输引擎,load 为 LOAD DATA LOCAL INFILE 批量加载(默认与 --engine 相同)'
+    )
+    
+    parser.add_argument(
+        '--group-small-tables',
+        action='store_true',
+        help=f'将估算行数不超过 {GROUP_SMALL_TABLE_ROWS} 的小表合并为批量任务,用 native 引擎依次传输,减少 JVM 启动次数'
+             f'(组内的表按 WRITE_MODE 写入,默认 REPLACE INTO;每张表传输后两端各执行一次 COUNT(*) 核对行数,'
+             f'不一致时改用 DataX 单独重跑)'
+    )
+    
+    parser.add_argument(
+        '--refresh-catalog',
+        action='store_true',
+        help=f'忽略元数据目录缓存({CATALOG_CACHE_FILE}),重新加载字段和主键信息'
+    )
+    
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=None,
+        metavar='N',
+        help='每个数据库端点连接池保留的空闲连接数(默认 --max-workers + 2)'
+    )
+    
+    parser.add_argument(
+        '--pool-max-open',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'每个数据库端点同时打开的连接数上限,达到上限时等待归还,'
+             f'超过 {POOL_ACQUIRE_TIMEOUT} 秒报错(默认 2 * --max-workers + 2)'
+    )
+    
+    parser.add_argument(
+        '--checkpoint-backend',
+        choices=sorted(CHECKPOINT_BACKENDS),
+        default=CHECKPOINT_BACKEND,
+        help=f'checkpoint 后端: sqlite 保存在 {CHECKPOINT_DB_FILE}(WAL,原子提交), '
+             f'json 保存在 {CHECKPOINT_FILE}(默认 {CHECKPOINT_BACKEND})'
+    )
+    
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help=f'常驻模式: 保持元数据/连接池/checkpoint 常驻,每张表按变化频率在 {DAEMON_MIN_INTERVAL} ~ {DAEMON_MAX_INTERVAL} 秒间自适应轮询'
+    )
+    
+    parser.add_argument(
+        '--cdc',
+        action='store_true',
+        help='CDC 模式: 常规同步后持续读取源库的行格式 binlog,实时应用插入/更新/删除(需要 mysql-replication)'
+    )
+    
+    parser.add_argument(
+        '--no-skip-unchanged',
+        action='store_true',
+        help='不跳过自上次成功同步后未变化的表(默认根据 UPDATE_TIME 跳过)'
+    )
+    
+    parser.add_argument(
+        '--skip-unchanged-checksum',
+        action='store_true',
+        default=SKIP_UNCHANGED_CHECKSUM,
+        help='跳过未变化的表时,无 editTime 的表额外用 CHECKSUM TABLE 判断(扫描整表并阻塞源表写入;'
+             '--full 和 --daemon 时不执行)'
+    )
+    
+    parser.add_argument(
+        '--metrics-jsonl',
+        default=METRICS_JSONL_FILE,
+        metavar='PATH',
+        help=f'运行结束时追加每张表的阶段耗时/行数/字节数和运行汇总(JSON lines),传空字符串不写入(默认 {METRICS_JSONL_FILE})'
+    )
+    
+    parser.add_argument(
+        '--metrics-prom',
+        default=METRICS_PROM_FILE,
+        metavar='PATH',
+        help='运行结束时写出 Prometheus textfile collector 格式的指标文件(默认不写入)'
+    )
+    
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=MAX_WORKERS,
+        metavar='N',
+        help=f'并发处理的表数(启用 --adaptive-workers 时为上限)(默认 {MAX_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--adaptive-workers',
+        action='store_true',
+        help=f'每 {GOVERNOR_INTERVAL} 秒采样源库 Threads_running、复制延迟和探测查询耗时,'
+             f'任一超过阈值时并发减半,都低于阈值一半时加 1'
+    )
+    
+    parser.add_argument(
+        '--min-workers',
+        type=int,
+        default=GOVERNOR_MIN_WORKERS,
+        metavar='N',
+        help=f'自适应并发的下限(默认 {GOVERNOR_MIN_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--max-threads-running',
+        type=int,
+        default=GOVERNOR_MAX_THREADS_RUNNING,
+        metavar='N',
+        help=f'自适应并发: 源库 Threads_running 阈值(默认 {GOVERNOR_MAX_THREADS_RUNNING})'
+    )
+    
+    parser.add_argument(
+        '--max-replica-lag',
+        type=int,
+        default=GOVERNOR_MAX_REPLICA_LAG,
+        metavar='SECONDS',
+        help=f'自适应并发: 源库(为从库时)复制延迟阈值(默认 {GOVERNOR_MAX_REPLICA_LAG} 秒)'
+    )
+    
+    parser.add_argument(
+        '--max-probe-ms',
+        type=int,
+        default=GOVERNOR_MAX_PROBE_MS,
+        metavar='MS',
+        help=f'自适应并发: 探测查询耗时阈值(默认 {GOVERNOR_MAX_PROBE_MS} 毫秒)'
+    )
+    
+    parser.add_argument(
+        '--max-reader-streams',
+        type=int,
+        default=STREAM_BUDGET_READERS,
+        metavar='N',
+        help='整个运行同时传输的源库读取流上限(DataX 每个通道一个,native/load 每张表一个),超出时排队(默认不限制)'
+    )
+    
+    parser.add_argument(
+        '--max-writer-streams',
+        type=int,
+        default=STREAM_BUDGET_WRITERS,
+        metavar='N',
+        help='整个运行同时传输的目标库写入流上限(DataX 每个通道一个,native/load 每张表一个),超出时排队(默认不限制)'
+    )
+    
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help=f'校验模式: 每张表按主键分段,两端在服务端计算每段的行哈希摘要并并行对比,不一致的范围写入 {VERIFY_REPORT_FILE}(不同步)'
+    )
+    
+    parser.add_argument(
+        '--verify-repair',
+        action='store_true',
+        help='校验后只重新同步不一致的主键范围(包含 --verify)'
+    )
+    
+    parser.add_argument(
+        '--verify-chunk-rows',
+        type=int,
+        default=VERIFY_CHUNK_ROWS,
+        metavar='N',
+        help=f'校验模式每个分段的估算行数(默认 {VERIFY_CHUNK_ROWS})'
+    )
+    
     args = parser.parse_args()
     
-    if not os.path.exists(DATAX_PATH):
+    if args.delete_batch_size < 1:
+        parser.error("--delete-batch-size 必须大于 0")
+    if args.daemon and (args.cdc or args.full):
+        parser.error("--daemon 不能与 --cdc / --full 同时使用")
+    args.verify = args.verify or args.verify_repair
+    if args.verify and (args.daemon or args.cdc or args.full):
+        parser.error("--verify 不能与 --daemon / --cdc / --full 同时使用")
+    if args.verify_chunk_rows < 1:
+        parser.error("--verify-chunk-rows 必须大于 0")
+    if not 1 <= args.min_workers <= args.max_workers:
+        parser.error("--min-workers / --max-workers 必须满足 1 <= 下限 <= 上限")
+    if any(n is not None and n < 1 for n in (args.max_reader_streams, args.max_writer_streams)):
+        parser.error("--max-reader-streams / --max-writer-streams 必须大于 0")
+    if any(n is not None and n < 1 for n in (args.pool_size, args.pool_max_open)):
+        parser.error("--pool-size / --pool-max-open 必须大于 0")
+    pool_size, pool_max_open = default_pool_limits(args.max_workers)
+    src_pool.size = dest_pool.size = args.pool_size or pool_size
+    src_pool.max_open = dest_pool.max_open = args.pool_max_open or pool_max_open
+    # 每张表的阶段耗时/行数在运行结束时写出(JSON lines / Prometheus textfile)
+    metrics = MetricsCollector(args.metrics_jsonl or None, args.metrics_prom or None)
+    
+    if args.cdc and BinLogStreamReader is None:
+        print("❌ CDC 模式需要安装 mysql-replication: pip install mysql-replication")
+        return
+    
+    if 'datax' in (args.engine, args.full_engine) and not (args.verify and not args.verify_repair) \
+            and not os.path.exists(DATAX_PATH):
         print(f"❌ DataX 路径错误: {DATAX_PATH}")
         return
 
+    # 打开 checkpoint 后端(sqlite 后端首次打开时自动从 checkpoint.json 迁移),整个运行期间只加载一次
+    try:
+        store = CHECKPOINT_BACKENDS[args.checkpoint_backend]()
+        if getattr(store, 'migrated', 0):
+            print(f"📥 已从 {CHECKPOINT_FILE} 迁移 {store.migrated} 条 checkpoint 到 {CHECKPOINT_DB_FILE}")
+        checkpoints = CheckpointManager(store)
+    except CheckpointCorruptedError as e:
+        print(f"❌ checkpoint 损坏,为避免触发全量重同步已停止: {e}")
+        return
+
     # 获取要处理的表列表
     if args.tables:
         # 用户指定了表名
@@ -422,11 +3561,9 @@ def main():
         
         # 验证表是否存在
         try:
-            conn = get_connection(SRC_CONFIG)
-            with conn.cursor() as cursor:
+            with src_pool.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("SHOW TABLES")
                 all_tables = {row[0] for row in cursor.fetchall()}
-            conn.close()
             
             # 检查不存在的表
             invalid_tables = [t for t in tables if t not in all_tables]
@@ -444,11 +3581,9 @@ def main():
         # 同步所有表
         print("正在获取表清单...")
         try:
-            conn = get_connection(SRC_CONFIG)
-            with conn.cursor() as cursor:
+            with src_pool.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("SHOW TABLES")
                 tables = [row[0] for row in cursor.fetchall()]
-            conn.close()
         except Exception as e:
             print(f"❌ 连接源库失败: {e}")
             return
@@ -482,46 +3617,199 @@ def main():
     detect_deletes = not args.no_detect_deletes  # 默认启用删除检测
     
     print(f"🔧 同步模式: {sync_mode}")
-    print(f"🔍 删除检测: {'启用' if detect_deletes else '禁用'}")
-    if args.truncate_before_sync and args.full:
+    print(f"🔍 删除检测: {f'启用 ({args.delete_mode}, 预检 {args.delete_precheck})' if detect_deletes else '禁用'}")
+    if args.shadow_swap and args.full:
+        print(f"🪞 影子表模式: 启用(写入 <表名>{SHADOW_SUFFIX},完成后 RENAME 替换)")
+    elif args.truncate_before_sync and args.full:
         print(f"🗑️  清空表模式: 启用(全量同步前清空表)")
-    print(f"⚙️  并发线程数: {MAX_WORKERS}")
-    print("=" * 60)
+    print(f"🚚 传输引擎: {args.engine}" + (f" (全量复制: {args.full_engine})" if args.full_engine else ""))
+    group_small_tables = args.group_small_tables and args.engine == 'datax' and not args.daemon
+    if args.group_small_tables and not group_small_tables:
+        print(f"⚠️  --group-small-tables 仅适用于 datax 引擎(非常驻模式),已忽略")
+    if args.adaptive_workers and not args.verify:
+        print(f"⚙️  并发线程数: 自适应 {args.min_workers} ~ {args.max_workers} (Threads_running ≤ {args.max_threads_running}, "
+              f"复制延迟 ≤ {args.max_replica_lag} 秒, 探测 ≤ {args.max_probe_ms} 毫秒)")
+    else:
+        print(f"⚙️  并发线程数: {args.max_workers}")
+    budget = None
+    if (args.max_reader_streams or args.max_writer_streams) and not args.verify:
+        budget = StreamBudget(args.max_reader_streams, args.max_writer_streams)
+        print(f"🎫 流预算: 读取 {args.max_reader_streams or '不限'} / 写入 {args.max_writer_streams or '不限'}")
 
-    # 执行同步
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 根据是否强制全量同步来提交任务
-        if args.full:
-            future_to_table = {
-                executor.submit(
-                    process_table, 
-                    table, 
-                    force_full_sync=True,
-                    detect_deletes=detect_deletes,
-                    truncate_before_sync=args.truncate_before_sync
-                ): table 
-                for table in tables
-            }
+    # 一次性加载元数据目录(字段/主键/editTime/统计信息),替代每张表的 information_schema 查询
+    try:
+        started = time.monotonic()
+        load_schema_catalogs(refresh=args.refresh_catalog)
+        metrics.run_phases['catalog'] = time.monotonic() - started
+        cache_state = "缓存命中" if src_catalog['from_cache'] and dest_catalog['from_cache'] else "已重新加载"
+        print(f"🗂️  元数据目录: 源库 {len(src_catalog['tables'])} 张表 ({cache_state}, {time.monotonic() - started:.1f} 秒)")
+    except Exception as e:
+        print(f"⚠️  加载元数据目录失败,回退为逐表查询: {e}")
+
+    # 校验模式: 只对比两端数据(可选修复不一致的范围),不执行常规同步
+    if args.verify:
+        print("=" * 60)
+        try:
+            run_verify(tables, chunk_rows=args.verify_chunk_rows, repair=args.verify_repair, engine=args.engine,
+                       workers=args.max_workers)
+        finally:
+            checkpoints.close()
+            src_pool.close_all()
+            dest_pool.close_all()
+        print("=" * 60)
+        print("🎉 校验结束。")
+        return
+
+    # 根据是否强制全量同步来确定任务参数
+    task_kwargs = dict(
+        detect_deletes=detect_deletes,
+        delete_mode=args.delete_mode,
+        delete_batch_size=args.delete_batch_size,
+        delete_precheck=args.delete_precheck,
+        checkpoints=checkpoints,
+        metrics=metrics,
+        budget=budget
+    )
+    if args.full:
+        task_kwargs.update(force_full_sync=True, truncate_before_sync=args.truncate_before_sync,
+                           shadow_swap=args.shadow_swap)
+
+    # CDC 模式: 已有 binlog 位置时直接从该位置继续;否则先记录当前位置,执行一次常规同步后再从该位置开始
+    # (常规同步期间的变更会被重放,按主键写入/删除是幂等的)
+    all_tables = list(tables)
+    cdc_position = None
+    if args.cdc:
+        cdc_position = checkpoints.get(f"{SRC_CONFIG['host']}:{SRC_CONFIG['port']}", namespace=BINLOG)
+        if cdc_position and not args.full:
+            tables = []
+            print(f"📡 CDC: 从上次的 binlog 位置继续,跳过常规同步")
         else:
-            future_to_table = {
-                executor.submit(
-                    process_table, 
-                    table,
-                    detect_deletes=detect_deletes
-                ): table 
-                for table in tables
-            }
-        
-        for future in as_completed(future_to_table):
-            table = future_to_table[future]
             try:
-                msg = future.result()
-                if "⏹️" not in msg: 
-                    print(msg)
-            except Exception as exc:
-                print(f"❌ {table} 线程异常: {exc}")
+                with src_pool.connection() as conn:
+                    cdc_position = get_binlog_position(conn)
+            except Exception as e:
+                print(f"❌ CDC: 获取 binlog 位置失败: {e}")
+                return
+            print(f"📡 CDC: 记录 binlog 位置 {cdc_position['log_file']}:{cdc_position['log_pos']},先执行一次常规同步")
+
+    # 跳过未变化的表: 整个库一次性判断,未变化的表不提交任务、不占用连接
+    # --full 时不跳过,但仍记录状态(UPDATE_TIME)供之后的运行使用;不为记录状态执行 CHECKSUM TABLE
+    if tables and not args.daemon and not args.no_skip_unchanged and src_catalog:
+        try:
+            started = time.monotonic()
+            with src_pool.connection() as conn:
+                table_states = observe_table_states(
+                    conn, tables, src_catalog, use_checksum=args.skip_unchanged_checksum and not args.full
+                )
+            task_kwargs['table_states'] = table_states
+            metrics.run_phases['skip_check'] = time.monotonic() - started
+            if not args.full:
+                unchanged = set(find_unchanged_tables(tables, table_states, checkpoints))
+                if unchanged:
+                    tables = [t for t in tables if t not in unchanged]
+                    print(f"⏭️  跳过未变化的表: {len(unchanged)} 张 ({time.monotonic() - started:.1f} 秒)")
+        except Exception as e:
+            print(f"⚠️  检查表是否变化失败,不跳过任何表: {e}")
+
+    # 小表合并: 按估算大小把小表合并为批量任务(native 引擎),大表仍单独运行 DataX
+    single_tables, table_groups = tables, []
+    if group_small_tables:
+        try:
+            if src_catalog:
+                table_sizes = {t: (st['rows'], st['data_length']) for t, st in src_catalog['stats'].items()}
+            else:
+                with src_pool.connection() as conn:
+                    table_sizes = get_table_sizes(conn, SRC_CONFIG['db'])
+            single_tables, table_groups = plan_table_groups(tables, table_sizes)
+            print(f"📦 小表合并: {sum(len(g) for g in table_groups)} 张小表合并为 {len(table_groups)} 个批量任务, "
+                  f"{len(single_tables)} 张表单独运行")
+        except Exception as e:
+            print(f"⚠️  获取表大小失败,不合并小表: {e}")
+
+    print("=" * 60)
+
+    # 常驻模式由 run_daemon 按各表的轮询间隔提交任务
+    if args.daemon:
+        single_tables, table_groups = [], []
+
+    # 按预计耗时从大到小提交(最长处理时间优先),避免大表排在最后拉长整体耗时
+    stats = src_catalog['stats'] if src_catalog else {}
+    def table_cost(table):
+        meta = src_catalog['tables'].get(table) if src_catalog else None
+        return estimate_table_cost(
+            table, stats.get(table), meta, checkpoints.get(table),
+            force_full_sync=args.full, detect_deletes=detect_deletes
+        )
+    units = [(table_cost(table), [table]) for table in single_tables]
+    units += [(sum(table_cost(t) for t in group), group) for group in table_groups]
+    units = order_by_expected_cost(units, lambda unit: unit[0])
+    if stats and units:
+        print(f"📊 调度顺序: 按预计耗时从大到小 (前 3: {', '.join(', '.join(u[1]) for u in units[:3])})")
+
+    # 常驻模式和 CDC 模式: SIGTERM 时不再提交新任务,等待进行中的任务完成后正常退出
+    stop_event = threading.Event()
+    if args.daemon or args.cdc:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    def list_tables():
+        with src_pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SHOW TABLES")
+            return [row[0] for row in cursor.fetchall() if row[0] not in (args.exclude or [])]
+
+    # 自适应并发: 线程池按上限创建,同时运行的表数由 governor 按源库负载调整
+    governor = None
+    if args.adaptive_workers and (units or args.daemon):
+        governor = ConcurrencyGovernor(
+            src_pool, min_workers=args.min_workers, max_workers=args.max_workers,
+            max_threads_running=args.max_threads_running, max_replica_lag=args.max_replica_lag,
+            max_probe_ms=args.max_probe_ms
+        )
+        governor.start()
+    run = governor.run if governor else lambda func, *a, **kw: func(*a, **kw)
+
+    # 执行同步(checkpoint 在后台定时批量写入,结束或中断时写入剩余部分)
+    checkpoints.start()
+    try:
+        if args.daemon:
+            run_daemon(
+                all_tables, checkpoints, stop_event, engine=args.engine, full_engine=args.full_engine,
+                task_kwargs=task_kwargs, skip_unchanged=not args.no_skip_unchanged,
+                list_tables=None if args.tables else list_tables, workers=args.max_workers, governor=governor
+            )
+        with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+            future_to_table = {}
+            for _, unit_tables in units:
+                if len(unit_tables) == 1:
+                    future = executor.submit(run, process_table, unit_tables[0], engine=args.engine,
+                                             full_engine=args.full_engine, **task_kwargs)
+                else:
+                    future = executor.submit(run, process_table_group, unit_tables, **task_kwargs)
+                future_to_table[future] = ', '.join(unit_tables)
+            failed_tables = report_unit_results(future_to_table)
+        
+        if args.cdc:
+            if governor:
+                governor.stop()  # CDC 为单线程应用,不再需要调整并发
+            print("=" * 60)
+            run_cdc_after_sync(failed_tables, all_tables, checkpoints, cdc_position, stop_event)
+    finally:
+        if governor:
+            governor.stop()
+        started = time.monotonic()
+        checkpoints.close()
+        metrics.run_phases['checkpoint_flush'] = time.monotonic() - started
+        src_pool.close_all()
+        dest_pool.close_all()
 
     print("=" * 60)
+    export_metrics(metrics)
+    if governor:
+        print(f"🎚️  自适应并发: 调整 {governor.adjustments} 次, 最低 {governor.lowest}, 结束时 {governor.limit}")
+    if budget:
+        print(f"🎫 流预算: 峰值 读取 {budget.peak_readers} / 写入 {budget.peak_writers}, "
+              f"排队 {budget.waits} 次 共 {budget.wait_seconds:.1f} 秒")
+    print(f"🔌 连接池: 源库新建 {src_pool.created} / 复用 {src_pool.reused}, "
+          f"目标库新建 {dest_pool.created} / 复用 {dest_pool.reused}")
     print("🎉 所有任务结束。")
 
 if __name__ == "__main__":
@@ -2,14 +2,13 @@ import pymysql
 import subprocess
 import sys
 import os
-import json
-import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import sync  # checkpoint 与 sync.py 共用同一后端(sync.CHECKPOINT_BACKEND)和水位格式
+
 # ================= 配置区域 =================
 DATAX_PATH = "/Users/demon/Downloads/datax/bin/datax.py"
 JOB_TEMPLATE = "job.json"
-CHECKPOINT_FILE = "checkpoint.json"
 MAX_WORKERS = 8 
 
 # 源数据库
@@ -25,8 +24,6 @@ DEST_CONFIG = {
 }
 # ===========================================
 
-file_lock = threading.Lock()
-
 def get_connection(config):
     return pymysql.connect(
         host=config['host'], user=config['user'], password=config['password'],
@@ -34,20 +31,11 @@ def get_connection(config):
     )
 
 def load_checkpoint():
-    if not os.path.exists(CHECKPOINT_FILE):
-        return {}
-    with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except:
-            return {}
+    """读取各表水位(sqlite 为 checkpoint.db,json 为 checkpoint.json),值为 sync.make_watermark 的格式"""
+    return sync.load_checkpoint()
 
 def update_checkpoint(table, time_str):
-    with file_lock:
-        data = load_checkpoint()
-        data[table] = time_str
-        with open(CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+    sync.update_checkpoint(table, sync.make_watermark(time_str))
 
 def get_local_max_time(conn, table):
     try:
@@ -92,8 +80,11 @@ def process_table(table):
             result_msg = f"🔄 {table}: 全量同步"
         else:
             start_time = "1970-01-01 00:00:00"
-            if table in checkpoints:
-                start_time = checkpoints[table]
+            # sync.py 在同一 editTime 的记录中途中断时水位带有主键进度: 该 editTime 的记录重新复制(写入幂等)
+            saved_time, saved_pk = sync.parse_watermark(checkpoints.get(table))
+            inclusive = saved_pk is not None
+            if saved_time:
+                start_time = saved_time
             else:
                 local_max = get_local_max_time(dest_conn, table)
                 if local_max: start_time = local_max
@@ -105,10 +96,10 @@ def process_table(table):
                     return f"⚠️ {table}: 源表为空，跳过"
                 current_max_time = str(res)
 
-            if current_max_time <= start_time:
+            if current_max_time < start_time or (current_max_time == start_time and not inclusive):
                 return f"⏹️  {table}: 无新数据"
 
-            where_clause = f"editTime > '{start_time}' AND editTime <= '{current_max_time}'"
+            where_clause = f"editTime {'>=' if inclusive else '>'} '{start_time}' AND editTime <= '{current_max_time}'"
             is_incremental = True
             result_msg = f"🚀 {table}: 增量同步"
 
@@ -185,17 +176,21 @@ def main():
     print(f"📋 共发现 {len(tables)} 张表，启动 {MAX_WORKERS} 个线程并发处理...")
     print("-" * 50)
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_table = {executor.submit(process_table, table): table for table in tables}
-        
-        for future in as_completed(future_to_table):
-            table = future_to_table[future]
-            try:
-                msg = future.result()
-                if "⏹️" not in msg: 
-                    print(msg)
-            except Exception as exc:
-                print(f"❌ {table} 线程异常: {exc}")
+    sync.open_checkpoint_store(sync.CHECKPOINT_BACKEND)
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            future_to_table = {executor.submit(process_table, table): table for table in tables}
+            
+            for future in as_completed(future_to_table):
+                table = future_to_table[future]
+                try:
+                    msg = future.result()
+                    if "⏹️" not in msg: 
+                        print(msg)
+                except Exception as exc:
+                    print(f"❌ {table} 线程异常: {exc}")
+    finally:
+        sync.checkpoint_store.close()
 
     print("-" * 50)
     print("🎉 所有表处理完毕！")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+测试基准测试结果的比较(不依赖数据库)
+
+测试场景:
+1. 按配置分组,比较最近两个提交的耗时中位数
+2. 不在 git 仓库中运行的结果(没有提交号)也能比较
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+from bench_sync import compare_results
+
+def run_compare(records):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench_results.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            compare_results(path)
+        return output.getvalue()
+
+def test_compare_latest_two_commits():
+    base = {'scenario': 'full', 'engine': 'native', 'rows': 1000, 'key': 'int'}
+    output = run_compare([dict(base, commit='a1', seconds=9.0), dict(base, commit='b2', seconds=2.0),
+                          dict(base, commit='b2', seconds=4.0), dict(base, commit='c3', dirty=True, seconds=1.5)])
+    assert "b2: 3.00 秒 -> c3+: 1.50 秒 (-50.0%)" in output and "a1" not in output
+
+def test_missing_commit():
+    base = {'scenario': 'delete', 'engine': 'native', 'rows': 1000, 'key': 'string'}
+    output = run_compare([dict(base, commit=None, seconds=2.0), dict(base, commit='d4', seconds=1.0)])
+    assert "未知提交: 2.00 秒 -> d4: 1.00 秒" in output
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("基准测试结果比较测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+测试 CDC 模式(--cdc),需要本地 mysqld 开启 binlog:
+
+    mysqld --log-bin=mysql-bin --binlog-format=ROW --server-id=1 --binlog-row-metadata=FULL
+
+测试场景:
+1. 在本地 mysqld 上创建源库和目标库(同一实例的两个库)
+2. 记录 binlog 位置,后台启动 CDC
+3. 源表执行插入、更新(包括修改主键)、删除
+4. 验证目标表数据与源表一致
+5. 停止 CDC,确认 binlog 位置已记录
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pymysql
+
+import sync
+
+# 测试配置(本地 mysqld)
+MYSQL_CONFIG = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': '123456',
+    'port': 3306,
+    'charset': 'utf8'
+}
+
+SRC_DB = 'cdc_test_src'
+DEST_DB = 'cdc_test_dest'
+TEST_TABLE = 'test_cdc'
+
+def get_connection(db=None):
+    return pymysql.connect(db=db, **{k: MYSQL_CONFIG[k] for k in ('host', 'user', 'password', 'port', 'charset')})
+
+def run_sql(db, *statements):
+    conn = get_connection(db)
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    conn.commit()
+    conn.close()
+
+def fetch_rows(db):
+    conn = get_connection(db)
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT id, name, value FROM `{TEST_TABLE}` ORDER BY id")
+        rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def create_test_databases():
+    """创建源库和目标库"""
+    print("=" * 70)
+    print("步骤 1: 创建测试库和测试表")
+    print("=" * 70)
+    create_sql = f"""
+    CREATE TABLE `{TEST_TABLE}` (
+        `id` INT PRIMARY KEY,
+        `name` VARCHAR(50),
+        `value` INT
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """
+    for db in (SRC_DB, DEST_DB):
+        run_sql(None, f"DROP DATABASE IF EXISTS `{db}`", f"CREATE DATABASE `{db}`")
+        run_sql(db, create_sql)
+    print(f"✅ 创建 {SRC_DB}.{TEST_TABLE} 和 {DEST_DB}.{TEST_TABLE}")
+    print()
+
+def configure_sync():
+    """让 sync.py 指向本地的两个测试库"""
+    sync.SRC_CONFIG = dict(MYSQL_CONFIG, db=SRC_DB)
+    sync.DEST_CONFIG = dict(MYSQL_CONFIG, db=DEST_DB)
+    sync.src_pool = sync.ConnectionPool(sync.SRC_CONFIG)
+    sync.dest_pool = sync.ConnectionPool(sync.DEST_CONFIG)
+    sync.src_catalog = sync.dest_catalog = None
+
+def main():
+    print()
+    print("=" * 70)
+    print("CDC 模式测试")
+    print("=" * 70)
+    print()
+    
+    if sync.BinLogStreamReader is None:
+        print("❌ 需要安装 mysql-replication: pip install mysql-replication")
+        return
+    
+    tmp = tempfile.TemporaryDirectory()
+    stop_event = threading.Event()
+    cdc_thread = None
+    verify_success = False
+    try:
+        create_test_databases()
+        configure_sync()
+        
+        print("=" * 70)
+        print("步骤 2: 记录 binlog 位置并启动 CDC")
+        print("=" * 70)
+        with sync.src_pool.connection() as conn:
+            position = sync.get_binlog_position(conn)
+        print(f"binlog 位置: {position['log_file']}:{position['log_pos']}")
+        checkpoints = sync.CheckpointManager(sync.JsonCheckpointStore(os.path.join(tmp.name, 'checkpoint.json')))
+        cdc_thread = threading.Thread(
+            target=sync.run_cdc_stream, args=([TEST_TABLE], checkpoints, position, stop_event), daemon=True
+        )
+        cdc_thread.start()
+        print()
+        
+        print("=" * 70)
+        print("步骤 3: 源表执行插入、更新、删除")
+        print("=" * 70)
+        run_sql(SRC_DB, f"INSERT INTO `{TEST_TABLE}` VALUES (1, 'A', 100), (2, 'B', 200), (3, 'C', 300), (4, 'D', 400)")
+        run_sql(SRC_DB,
+                f"UPDATE `{TEST_TABLE}` SET value = 201 WHERE id = 2",
+                f"UPDATE `{TEST_TABLE}` SET id = 5 WHERE id = 3",
+                f"DELETE FROM `{TEST_TABLE}` WHERE id = 4")
+        print("✅ 插入 id=1,2,3,4;更新 id=2;主键 3 改为 5;删除 id=4")
+        print()
+        
+        print("=" * 70)
+        print("步骤 4: 验证数据一致性")
+        print("=" * 70)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline and fetch_rows(DEST_DB) != fetch_rows(SRC_DB):
+            time.sleep(0.5)
+        src_data, dest_data = fetch_rows(SRC_DB), fetch_rows(DEST_DB)
+        print(f"源表数据: {src_data}")
+        print(f"目标表数据: {dest_data}")
+        verify_success = src_data == dest_data == ((1, 'A', 100), (2, 'B', 201), (5, 'C', 300))
+        print("✅ 验证通过: 源表和目标表数据完全一致!" if verify_success else "❌ 验证失败: 源表和目标表数据不一致!")
+        print()
+        
+        print("=" * 70)
+        print("步骤 5: 停止 CDC")
+        print("=" * 70)
+        stop_event.set()
+        cdc_thread.join(timeout=10)
+        checkpoints.close()
+        saved = checkpoints.get(f"{sync.SRC_CONFIG['host']}:{sync.SRC_CONFIG['port']}", namespace=sync.BINLOG)
+        print(f"已记录的 binlog 位置: {saved}")
+        verify_success = verify_success and saved is not None
+        
+    except Exception as e:
+        print(f"❌ 测试异常: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        stop_event.set()
+        for db in (SRC_DB, DEST_DB):
+            try:
+                run_sql(None, f"DROP DATABASE IF EXISTS `{db}`")
+            except Exception:
+                pass
+        tmp.cleanup()
+    
+    print()
+    print("=" * 70)
+    if verify_success:
+        print("🎉 测试成功! CDC 模式工作正常!")
+    else:
+        print("❌ 测试失败! 请检查 CDC 模式!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
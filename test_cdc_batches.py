@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+测试 CDC 模式的攒批与应用逻辑(不依赖数据库和 binlog)
+
+测试场景:
+1. 同一主键多次变更只保留最后结果
+2. 修改主键时删除旧主键的记录
+3. 一批变更在一个事务中应用: 先批量删除,再批量 REPLACE
+4. 应用失败时回滚
+5. 源库 binlog_format / binlog_row_image / binlog_row_metadata 不满足要求时拒绝启动
+6. 有表常规同步失败时不启动 CDC、不记录(并清除)binlog 位置,以非 0 状态退出
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+import sync
+from fakes import FakeConnection
+from sync import (ChangeBatch, apply_change_batch, check_binlog_settings, report_unit_results, run_cdc_after_sync,
+                  CheckpointManager, JsonCheckpointStore, TableResult, BINLOG)
+
+PKS = {'mt_part': ['id'], 'mt_bom': ['parent', 'child']}
+COLUMNS = {'mt_part': ['id', 'name'], 'mt_bom': ['parent', 'child', 'qty']}
+
+def test_last_change_wins():
+    batch = ChangeBatch(PKS)
+    batch.add('mt_part', None, {'id': 1, 'name': 'a'})
+    batch.add('mt_part', {'id': 1, 'name': 'a'}, {'id': 1, 'name': 'b'})
+    batch.add('mt_part', None, {'id': 2, 'name': 'x'})
+    batch.add('mt_part', {'id': 2, 'name': 'x'}, None)
+    assert len(batch) == 4
+    assert batch.changes['mt_part'] == {(1,): {'id': 1, 'name': 'b'}, (2,): None}
+
+def test_primary_key_update():
+    batch = ChangeBatch(PKS)
+    batch.add('mt_bom', {'parent': 1, 'child': 2, 'qty': 1}, {'parent': 1, 'child': 3, 'qty': 1})
+    assert batch.changes['mt_bom'] == {(1, 2): None, (1, 3): {'parent': 1, 'child': 3, 'qty': 1}}
+
+def test_missing_primary_key_column():
+    batch = ChangeBatch(PKS)
+    try:
+        batch.add('mt_part', None, {'UNKNOWN_COL0': 1})
+    except RuntimeError as e:
+        assert "binlog_row_metadata=FULL" in str(e)
+    else:
+        raise AssertionError("应当报错")
+
+def test_apply_in_one_transaction():
+    batch = ChangeBatch(PKS)
+    batch.add('mt_part', None, {'id': 1, 'name': 'a'})
+    batch.add('mt_part', {'id': 5, 'name': 'e'}, None)
+    batch.add('mt_bom', {'parent': 1, 'child': 2, 'qty': 1}, None)
+    conn = FakeConnection()
+    assert apply_change_batch(conn, batch, COLUMNS) == (1, 2)
+    assert conn.commits == 1
+    sqls = conn.statements
+    assert sqls[0] == "DELETE FROM `mt_part` WHERE `id` IN (%s)"
+    assert sqls[1].startswith("REPLACE INTO `mt_part`")
+    assert sqls[2] == "DELETE FROM `mt_bom` WHERE (`parent`, `child`) IN ((%s, %s))"
+    assert conn.calls[1][1] == [(1, 'a')]
+
+def test_apply_failure_rolls_back():
+    batch = ChangeBatch(PKS)
+    batch.add('mt_part', {'id': 5, 'name': 'e'}, None)
+    conn = FakeConnection().on("", RuntimeError("Lock wait timeout exceeded"))
+    try:
+        apply_change_batch(conn, batch, COLUMNS)
+    except RuntimeError:
+        pass
+    assert conn.rollbacks == 1 and conn.commits == 0
+
+def settings_connection(**settings):
+    settings = dict({'binlog_format': 'ROW', 'binlog_row_image': 'FULL', 'binlog_row_metadata': 'FULL'}, **settings)
+    settings = {name: value for name, value in settings.items() if value is not None}
+
+    def select_variables(sql, params):
+        names = [name.strip()[2:] for name in sql[len("SELECT "):].split(",")]
+        if any(name not in settings for name in names):
+            raise pymysql.err.OperationalError(1193, "Unknown system variable")
+        return [tuple(settings[name] for name in names)]
+    return FakeConnection().on("SELECT", select_variables)
+
+def test_binlog_settings_checked():
+    check_binlog_settings(settings_connection())
+    # 8.0.14 之前没有 binlog_row_metadata
+    check_binlog_settings(settings_connection(binlog_row_metadata=None))
+    for settings, expected in (({'binlog_format': 'MIXED'}, "binlog_format=MIXED"),
+                               ({'binlog_row_image': 'MINIMAL'}, "binlog_row_image=MINIMAL"),
+                               ({'binlog_row_metadata': 'MINIMAL'}, "binlog_row_metadata=MINIMAL")):
+        try:
+            check_binlog_settings(settings_connection(**settings))
+        except RuntimeError as e:
+            assert expected in str(e)
+        else:
+            raise AssertionError(f"{settings} 应当报错")
+
+def test_failed_tables_reported():
+    def unit(*messages):
+        return [TableResult(f"t{i}").finish(message) for i, message in enumerate(messages)]
+    def crash():
+        raise RuntimeError("boom")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {
+            executor.submit(unit, "✅ t0 [✅ 成功]", "❌ t1 失败!"): "t0, t1",
+            executor.submit(lambda: TableResult('t2').finish("⏭️  t2: 无新数据")): "t2",
+            executor.submit(crash): "t3, t4",
+        }
+        assert sorted(report_unit_results(futures)) == ['t1', 't3', 't4']
+
+def run_after_sync(failed, saved_position):
+    calls = []
+    position_key = f"{sync.SRC_CONFIG['host']}:{sync.SRC_CONFIG['port']}"
+    saved = sync.run_cdc_stream
+    sync.run_cdc_stream = lambda *args: calls.append(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoints = CheckpointManager(JsonCheckpointStore(os.path.join(tmp, 'checkpoint.json')))
+        if saved_position:
+            checkpoints.commit(position_key, saved_position, namespace=BINLOG)
+        exit_code = None
+        try:
+            run_cdc_after_sync(failed, ['t1', 't2'], checkpoints, {'log_file': 'binlog.000002', 'log_pos': 4})
+        except SystemExit as e:
+            exit_code = e.code
+        finally:
+            sync.run_cdc_stream = saved
+        checkpoints.close()
+        stored = JsonCheckpointStore(os.path.join(tmp, 'checkpoint.json')).load_all(BINLOG).get(position_key)
+    return calls, exit_code, stored
+
+def test_cdc_not_started_after_failed_sync():
+    calls, exit_code, stored = run_after_sync(['t2'], {'log_file': 'binlog.000001', 'log_pos': 120})
+    # 以前记录的位置被清除,下次运行会重新执行常规同步
+    assert calls == [] and exit_code == 1 and stored is None
+    calls, exit_code, stored = run_after_sync(['t2'], None)
+    assert calls == [] and exit_code == 1 and stored is None
+
+def test_cdc_started_after_successful_sync():
+    calls, exit_code, _ = run_after_sync([], None)
+    assert len(calls) == 1 and calls[0][0] == ['t1', 't2'] and exit_code is None
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("CDC 攒批与应用测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
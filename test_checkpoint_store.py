@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+测试 checkpoint 后端
+
+测试场景:
+1. sqlite 后端首次打开时从 checkpoint.json 迁移,且只迁移一次
+2. sqlite 后端更新后重新打开仍然可见
+3. json 后端原子写入,格式与原 checkpoint.json 一致
+4. checkpoint.json 损坏时报错,而不是静默返回空字典
+5. CheckpointManager 从内存读取,批量写入,关闭时写入剩余部分
+6. sync_fast.py 与 sync.py 共用同一后端和水位格式
+"""
+import json
+import os
+import tempfile
+
+import sync
+import sync_fast
+from sync import JsonCheckpointStore, SqliteCheckpointStore, CheckpointCorruptedError, CheckpointManager
+
+class CountingStore:
+    def __init__(self, data):
+        self.data = dict(data)
+        self.loads = 0
+        self.writes = []
+        self.closed = False
+
+    def load_all(self, namespace='watermark'):
+        self.loads += 1
+        return dict(self.data) if namespace == 'watermark' else {}
+
+    def set_many(self, items, namespace='watermark'):
+        self.writes.append(dict(items))
+        self.data.update(items)
+
+    def close(self):
+        self.closed = True
+
+def test_sqlite_migration_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, 'checkpoint.json')
+        db = os.path.join(tmp, 'checkpoint.db')
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump({'mt_part': '2025-12-09 13:34:56.704000', 'acl': '2025-12-05 07:45:36'}, f)
+        
+        store = SqliteCheckpointStore(db, legacy)
+        assert store.migrated == 2
+        assert store.load_all()['mt_part'] == '2025-12-09 13:34:56.704000'
+        store.set_many({'mt_part': '2025-12-10 00:00:00'})
+        store.close()
+        
+        # 再次打开: 不重复迁移,更新仍然保留
+        store = SqliteCheckpointStore(db, legacy)
+        assert store.migrated == 0
+        assert store.load_all() == {'mt_part': '2025-12-10 00:00:00', 'acl': '2025-12-05 07:45:36'}
+        store.close()
+
+def test_json_store_atomic_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'checkpoint.json')
+        store = JsonCheckpointStore(path)
+        store.set_many({'mt_bom': '2025-12-09 05:35:26'})
+        store.set_many({'acl': '2025-12-05 07:45:36'})
+        assert not os.path.exists(path + '.tmp')
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f) == {'mt_bom': '2025-12-09 05:35:26', 'acl': '2025-12-05 07:45:36'}
+
+def test_corrupted_json_raises():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'checkpoint.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"mt_part": "2025-12-09')
+        try:
+            JsonCheckpointStore(path)
+        except CheckpointCorruptedError:
+            pass
+        else:
+            raise AssertionError("损坏的 checkpoint.json 应该报错")
+
+def test_manager_reads_from_memory_and_batches_writes():
+    store = CountingStore({'mt_part': '2025-12-09 00:00:00'})
+    manager = CheckpointManager(store, flush_interval=3600)
+    for _ in range(100):
+        assert manager.get('mt_part') == '2025-12-09 00:00:00'
+    assert manager.get('missing') is None
+    assert store.loads == 1
+    
+    manager.commit('mt_part', '2025-12-10 00:00:00')
+    manager.commit('mt_bom', '2025-12-10 01:00:00')
+    assert manager.get('mt_part') == '2025-12-10 00:00:00'
+    assert store.writes == []
+    
+    manager.start()
+    manager.close()
+    assert store.writes == [{'mt_part': '2025-12-10 00:00:00', 'mt_bom': '2025-12-10 01:00:00'}]
+    assert store.closed
+
+def test_manager_failed_flush_is_retried():
+    class FlakyStore(CountingStore):
+        def set_many(self, items, namespace='watermark'):
+            if not self.writes and not getattr(self, 'failed', False):
+                self.failed = True
+                raise OSError("disk full")
+            super().set_many(items, namespace)
+    store = FlakyStore({})
+    manager = CheckpointManager(store)
+    manager.commit('acl', '2025-12-05 07:45:36')
+    try:
+        manager.flush()
+    except OSError:
+        pass
+    manager.commit('acl', '2025-12-06 00:00:00')
+    assert manager.flush() == 1
+    assert store.data == {'acl': '2025-12-06 00:00:00'}
+
+def test_namespaces_are_separate():
+    with tempfile.TemporaryDirectory() as tmp:
+        for store in (SqliteCheckpointStore(os.path.join(tmp, 'checkpoint.db'), None),
+                      JsonCheckpointStore(os.path.join(tmp, 'checkpoint.json'))):
+            store.set_many({'mt_part': '2025-12-09 00:00:00'})
+            store.set_many({'mt_part': {'update_time': '2025-12-09 01:00:00'}}, 'state')
+            assert store.load_all() == {'mt_part': '2025-12-09 00:00:00'}
+            assert store.load_all('state') == {'mt_part': {'update_time': '2025-12-09 01:00:00'}}
+            store.close()
+        # json 后端: watermark 仍是原 checkpoint.json 格式,其他命名空间在单独的文件
+        with open(os.path.join(tmp, 'checkpoint.json'), encoding='utf-8') as f:
+            assert json.load(f) == {'mt_part': '2025-12-09 00:00:00'}
+        assert os.path.exists(os.path.join(tmp, 'checkpoint.state.json'))
+
+def test_sync_fast_shares_store_and_format():
+    cwd, saved = os.getcwd(), sync.checkpoint_store
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for backend, store_class in (('sqlite', SqliteCheckpointStore), ('json', JsonCheckpointStore)):
+                sync.open_checkpoint_store(backend)
+                # sync.py 中途中断时写入的带主键进度的水位
+                sync.update_checkpoint('mt_bom', sync.make_watermark('2025-12-09 08:00:00', (42,)))
+                sync_fast.update_checkpoint('mt_part', '2025-12-09 09:00:00')
+                loaded = sync_fast.load_checkpoint()
+                sync.checkpoint_store.close()
+                assert sync.parse_watermark(loaded['mt_bom']) == ('2025-12-09 08:00:00', (42,))
+                # sync.py 读取 sync_fast.py 写入的水位
+                checkpoints = CheckpointManager(store_class())
+                assert sync.parse_watermark(checkpoints.get('mt_part')) == ('2025-12-09 09:00:00', None)
+                checkpoints.close()
+        finally:
+            sync.checkpoint_store = saved
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("checkpoint 后端测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
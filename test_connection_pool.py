@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+测试连接池(不依赖数据库)
+
+测试场景:
+1. 连接在多次获取之间复用
+2. 归还时回滚未结束的事务
+3. 空闲过久的连接在取出时做健康检查,失效则重新创建
+4. 多线程并发获取/归还
+5. 同时打开的连接数不超过上限,达到上限时等待归还,超时报错
+6. 默认大小按并发表数计算
+"""
+import threading
+import time
+
+import sync
+from fakes import FakeConnection
+from sync import ConnectionPool
+from pymysql.constants import SERVER_STATUS
+
+def make_pool(**kwargs):
+    created = []
+    def fake_get_connection(config):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+    sync.get_connection, original = fake_get_connection, sync.get_connection
+    return ConnectionPool({}, **kwargs), created, original
+
+def test_reuse_and_rollback():
+    pool, created, original = make_pool(size=2)
+    try:
+        with pool.connection() as conn:
+            conn.server_status |= SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        with pool.connection() as again:
+            pass
+        assert again is conn
+        assert conn.rollbacks == 1
+        assert len(created) == 1 and pool.reused == 1
+    finally:
+        sync.get_connection = original
+
+def test_stale_connection_replaced():
+    pool, created, original = make_pool(size=2, ping_interval=0)
+    try:
+        with pool.connection() as conn:
+            pass
+        conn.healthy = False
+        with pool.connection() as fresh:
+            pass
+        assert fresh is not conn
+        assert not conn.open
+        assert len(created) == 2
+    finally:
+        sync.get_connection = original
+
+def test_idle_limit_and_threads():
+    pool, created, original = make_pool(size=3)
+    try:
+        barrier = threading.Barrier(6)
+        def worker():
+            with pool.connection():
+                barrier.wait()
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(created) == 6
+        assert len(pool._idle) == 3
+        assert sum(1 for c in created if not c.open) == 3
+        pool.close_all()
+        assert all(not c.open for c in created)
+    finally:
+        sync.get_connection = original
+
+def test_max_open_blocks_until_release():
+    pool, created, original = make_pool(size=1, max_open=2, timeout=5)
+    try:
+        in_use, peak = [0], [0]
+        lock = threading.Lock()
+        def worker():
+            with pool.connection():
+                with lock:
+                    in_use[0] += 1
+                    peak[0] = max(peak[0], in_use[0])
+                time.sleep(0.01)
+                with lock:
+                    in_use[0] -= 1
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak[0] == 2 and pool.waits > 0
+        # 空闲只保留 1 个,多出的连接关闭后释放名额
+        assert pool.open == len(pool._idle) == 1
+        assert sum(1 for c in created if c.open) == 1
+    finally:
+        sync.get_connection = original
+
+def test_max_open_timeout():
+    pool, created, original = make_pool(size=2, max_open=1, timeout=0.05)
+    try:
+        held = pool.acquire()
+        try:
+            pool.acquire()
+        except TimeoutError as e:
+            assert "上限 1" in str(e)
+        else:
+            raise AssertionError("应当超时")
+        # 归还或丢弃后可以再次获取
+        pool.discard(held)
+        assert not held.open
+        with pool.connection() as conn:
+            assert conn is not held and pool.open == 1
+    finally:
+        sync.get_connection = original
+
+def test_failed_connect_frees_slot():
+    calls = []
+    def failing_get_connection(config):
+        calls.append(config)
+        raise ConnectionError("Can't connect")
+    sync.get_connection, original = failing_get_connection, sync.get_connection
+    try:
+        pool = ConnectionPool({}, max_open=1, timeout=0.05)
+        for _ in range(2):
+            try:
+                pool.acquire()
+            except ConnectionError:
+                pass
+        assert len(calls) == 2 and pool.open == 0
+    finally:
+        sync.get_connection = original
+
+def test_default_limits_follow_workers():
+    assert sync.default_pool_limits(4) == (6, 10)
+    assert sync.default_pool_limits(16) == (18, 34)
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("连接池测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试常驻模式的自适应轮询(不依赖数据库)
+
+测试场景:
+1. 有变化的表间隔减半,无变化的表间隔加倍,限制在最短/最长间隔之间
+2. 经常变化的表被轮询的次数明显多于不变化的表
+3. stop_event 被设置后等待进行中的表完成再退出
+4. MAX(editTime) 超过水位的表即使 UPDATE_TIME 未变化也不跳过
+5. 轮询时统计信息按最短间隔缓存,UPDATE_TIME 不变的表只确认一次 MAX(editTime)
+"""
+import threading
+import time
+
+import sync
+from fakes import FakeConnection
+from sync import (TableResult, next_poll_interval, run_daemon, find_advanced_tables, find_polled_unchanged_tables,
+                  make_watermark)
+
+def source_connection(max_times, update_times=None):
+    """information_schema.TABLES 返回 update_times 中各表的 UPDATE_TIME,MAX(editTime) 查询返回 max_times"""
+    conn = FakeConnection()
+    conn.update_times = dict(update_times or {})
+    return (conn.on("information_schema.TABLES", lambda sql, params: [(table, 100, 16384, update_time)
+                                                                      for table, update_time in conn.update_times.items()])
+            .on("SELECT NOW()", [('2025-12-09 12:00:00',)])
+            .on("MAX(editTime)", max_times))
+
+class FakeCheckpoints:
+    def __init__(self, watermarks, states=None):
+        self.watermarks = watermarks
+        self.states = states or {}
+
+    def get(self, table, default=None, namespace=None):
+        source = self.states if namespace == sync.TABLE_STATE else self.watermarks
+        return source.get(table, default)
+
+def test_interval_adapts():
+    assert next_poll_interval(60, True, 5, 3600) == 30
+    assert next_poll_interval(6, True, 5, 3600) == 5
+    assert next_poll_interval(60, False, 5, 3600) == 120
+    assert next_poll_interval(3000, False, 5, 3600) == 3600
+
+def test_hot_tables_polled_more_often():
+    calls = {'hot': 0, 'cold': 0}
+    finished = []
+
+    def fake_process_table(table, **kwargs):
+        calls[table] += 1
+        if table == 'hot':
+            return TableResult(table).finish("🚀 hot: 增量同步 [✅ 成功]")
+        return TableResult(table).finish("⏹️  cold: 无新数据")
+
+    saved = (sync.process_table, sync.DAEMON_MIN_INTERVAL, sync.DAEMON_MAX_INTERVAL)
+    sync.process_table = fake_process_table
+    sync.DAEMON_MIN_INTERVAL, sync.DAEMON_MAX_INTERVAL = 0.05, 0.8
+    stop_event = threading.Event()
+    try:
+        worker = threading.Thread(
+            target=lambda: finished.append(run_daemon(['hot', 'cold'], None, stop_event, skip_unchanged=False))
+        )
+        worker.start()
+        time.sleep(1.5)
+        stop_event.set()
+        worker.join(timeout=5)
+    finally:
+        sync.process_table, sync.DAEMON_MIN_INTERVAL, sync.DAEMON_MAX_INTERVAL = saved
+    assert finished, "stop_event 设置后应当退出"
+    assert calls['cold'] >= 1
+    assert calls['hot'] > 2 * calls['cold'], calls
+
+def test_advanced_tables_not_skipped():
+    checkpoints = FakeCheckpoints({
+        'hot': make_watermark('2025-12-09 10:00:00'),
+        'idle': make_watermark('2025-12-09 10:00:00'),
+        'partial': make_watermark('2025-12-09 10:00:00', [42]),
+    })
+    conn = source_connection([('hot', '2025-12-09 11:30:00'), ('idle', '2025-12-09 10:00:00')])
+    assert find_advanced_tables(conn, ['hot', 'idle', 'partial', 'new'], checkpoints) == ['hot']
+    # 只查询有完整水位的表,一条 UNION ALL 查询
+    assert len(conn.statements) == 1 and conn.statements[0].count("UNION ALL") == 1
+    assert "`partial`" not in conn.statements[0] and "`new`" not in conn.statements[0]
+    assert find_advanced_tables(source_connection([]), ['new'], checkpoints) == []
+
+def test_poll_reuses_stats_and_confirmations():
+    update_time = '2025-12-09 10:00:00'
+    checkpoints = FakeCheckpoints(
+        {'orders': make_watermark('2025-12-09 10:00:00')},
+        {'orders': {'update_time': update_time}, 'logs': {'update_time': update_time}},
+    )
+    catalog = {'tables': {'orders': {'has_edittime': True}, 'logs': {'has_edittime': False}}, 'stats': {}}
+    conn = source_connection([('orders', '2025-12-09 10:00:00')], {'orders': update_time, 'logs': update_time})
+    cache = {}
+    poll = lambda now: find_polled_unchanged_tables(conn, ['orders', 'logs'], catalog, checkpoints, cache, now)
+    
+    assert poll(100.0)[1] == {'orders', 'logs'}
+    assert sum('information_schema.TABLES' in q for q in conn.statements) == 1
+    assert sum('MAX(editTime)' in q for q in conn.statements) == 1
+    # 最短间隔内不重新读取统计信息;UPDATE_TIME 未变化,不再查询 MAX(editTime)
+    assert poll(100.0 + sync.DAEMON_MIN_INTERVAL / 2)[1] == {'orders', 'logs'}
+    assert sum('information_schema.TABLES' in q for q in conn.statements) == 1
+    assert sum('MAX(editTime)' in q for q in conn.statements) == 1
+    # 超过最短间隔后重新读取;UPDATE_TIME 变化的表作为有变化处理
+    conn.update_times['orders'] = '2025-12-09 11:00:00'
+    states, unchanged = poll(100.0 + sync.DAEMON_MIN_INTERVAL)
+    assert unchanged == {'logs'} and states['orders']['update_time'] == '2025-12-09 11:00:00'
+    assert sum('information_schema.TABLES' in q for q in conn.statements) == 2
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("常驻模式自适应轮询测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试删除检测前的聚合预检(不依赖数据库)
+
+测试场景:
+1. 两端 COUNT(*) / MIN / MAX 一致时跳过逐主键对比
+2. 不一致时执行完整删除检测
+3. checksum 预检额外比较主键集合校验和
+4. hash 模式和 --delete-precheck off 不做预检
+"""
+import sync
+from fakes import FakeConnection
+from sync import keys_match_by_aggregate, finish_table_sync, TableResult
+
+def aggregate_connection(aggregate):
+    """每条查询都返回同一行聚合结果"""
+    return FakeConnection().on("", [aggregate])
+
+def make_plan():
+    return {
+        'table': 't', 'result_msg': "🚀 t: 增量同步", 'current_max_time': None, 'is_incremental': True,
+        'columns_quoted': ['`id`'], 'meta': {'primary_keys': ['id'], 'types': {'id': 'int'}},
+    }
+
+def run_finish(src_aggregate, dest_aggregate, **kwargs):
+    calls = []
+    def fake_detect(*args, **kw):
+        calls.append(kw['mode'])
+        return 2, 0.1, 0
+    saved = sync.detect_and_delete_orphaned_records
+    sync.detect_and_delete_orphaned_records = fake_detect
+    try:
+        record = TableResult('t')
+        src, dest = aggregate_connection(src_aggregate), aggregate_connection(dest_aggregate)
+        msg = finish_table_sync(src, dest, make_plan(), record=record, **kwargs)
+    finally:
+        sync.detect_and_delete_orphaned_records = saved
+    return msg, record, calls, src.statements
+
+def test_aggregate_sql():
+    src, dest = aggregate_connection((10, 1, 10)), aggregate_connection((10, 1, 10))
+    assert keys_match_by_aggregate(src, dest, 't', ['a', 'b'])[0]
+    assert src.statements == ["SELECT COUNT(*), MIN(`a`), MAX(`a`) FROM `t`"]
+    keys_match_by_aggregate(src, dest, 't', ['a', 'b'], checksum=True)
+    assert src.statements[-1].endswith("BIT_XOR(CRC32(CONCAT_WS('#', `a`, `b`))) FROM `t`")
+
+def test_match_skips_full_diff():
+    msg, record, calls, _ = run_finish((10, 1, 10), (10, 1, 10))
+    assert calls == [] and record.delete_precheck == 'match'
+    assert msg == "🚀 t: 增量同步 [✅ 成功]"
+
+def test_mismatch_runs_full_diff():
+    msg, record, calls, _ = run_finish((10, 1, 10), (12, 1, 12))
+    assert calls == ['merge'] and record.delete_precheck == 'mismatch'
+    assert record.rows_deleted == 2 and "删除 2 条" in msg
+
+def test_checksum_precheck():
+    _, record, calls, statements = run_finish((10, 1, 10, 77), (10, 1, 10, 78), delete_precheck='checksum')
+    assert calls == ['merge'] and 'BIT_XOR' in statements[0]
+
+def test_hash_mode_and_off_skip_precheck():
+    _, record, calls, statements = run_finish((10, 1, 10), (10, 1, 10), delete_mode='hash')
+    assert calls == ['hash'] and statements == [] and record.delete_precheck is None
+    _, record, calls, statements = run_finish((10, 1, 10), (10, 1, 10), delete_precheck='off')
+    assert calls == ['merge'] and statements == []
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("删除预检测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
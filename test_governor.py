@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+测试按源库负载自适应调整并发(不依赖数据库)
+
+测试场景:
+1. 任一指标超过阈值时并发减半,不低于下限
+2. 所有指标都低于阈值一半时加 1,不超过上限;介于两者之间时保持
+3. 采样 Threads_running / 复制延迟 / 探测耗时,不是从库或没有权限时复制延迟为 None
+4. slot() 限制同时运行的任务数,降低并发后新任务排队
+5. 采样失败时保持当前并发并丢弃连接
+"""
+import threading
+import time
+
+import pymysql
+
+from fakes import FakeConnection, FakePool
+from sync import next_worker_limit, sample_source_load, ConcurrencyGovernor
+
+LIMITS = {'threads_running': 32, 'replica_lag': 30, 'probe_ms': 200}
+
+def source_connection(threads_running=5, replica_lag=None, denied=()):
+    """模拟源库的负载查询,denied 中的语句返回权限错误"""
+    conn = FakeConnection()
+    conn.threads_running = threads_running
+    for sql in denied:
+        conn.on(lambda q, denied_sql=sql: q == denied_sql, pymysql.err.OperationalError(1227, "Access denied"))
+    conn.on("SHOW GLOBAL STATUS", lambda sql, params: [('Threads_running', str(conn.threads_running))])
+    if replica_lag is not None:
+        conn.on(lambda q: q.startswith("SHOW"), [('Waiting for source', replica_lag)],
+                columns=['Replica_IO_State', 'Seconds_Behind_Source'])
+    return conn.on(lambda q: q == "SELECT 1", [(1,)])
+
+def test_decrease_on_overload():
+    load = {'threads_running': 40, 'replica_lag': None, 'probe_ms': 3.0}
+    assert next_worker_limit(8, load, LIMITS, 1, 8) == (4, ['threads_running'])
+    assert next_worker_limit(1, load, LIMITS, 1, 8) == (1, ['threads_running'])
+    load = {'threads_running': 5, 'replica_lag': 120, 'probe_ms': 900.0}
+    assert next_worker_limit(6, load, LIMITS, 2, 8) == (3, ['replica_lag', 'probe_ms'])
+
+def test_increase_when_idle():
+    idle = {'threads_running': 4, 'replica_lag': 0, 'probe_ms': 1.5}
+    assert next_worker_limit(3, idle, LIMITS, 1, 8) == (4, [])
+    assert next_worker_limit(8, idle, LIMITS, 1, 8) == (8, [])
+    busy = {'threads_running': 20, 'replica_lag': None, 'probe_ms': 1.5}
+    assert next_worker_limit(3, busy, LIMITS, 1, 8) == (3, [])
+
+def test_sample_source_load():
+    load = sample_source_load(source_connection(threads_running=12, replica_lag=7))
+    assert load['threads_running'] == 12 and load['replica_lag'] == 7 and load['probe_ms'] >= 0
+    assert sample_source_load(source_connection())['replica_lag'] is None
+    # 旧版本没有 SHOW REPLICA STATUS,且没有复制权限
+    conn = source_connection(replica_lag=3, denied={"SHOW REPLICA STATUS"})
+    assert sample_source_load(conn)['replica_lag'] == 3 and "SHOW SLAVE STATUS" in conn.statements
+    conn = source_connection(replica_lag=3, denied={"SHOW REPLICA STATUS", "SHOW SLAVE STATUS"})
+    assert sample_source_load(conn)['replica_lag'] is None
+
+def test_slot_limits_concurrency():
+    governor = ConcurrencyGovernor(FakePool(source_connection()), max_workers=4)
+    governor.set_limit(2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    def task():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+    threads = [threading.Thread(target=governor.run, args=(task,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2 and governor.active == 0 and governor.lowest == 2
+
+def test_governor_samples_and_adjusts():
+    conn = source_connection(threads_running=100)
+    governor = ConcurrencyGovernor(FakePool(conn), min_workers=2, max_workers=8, interval=3600)
+    governor.start()
+    try:
+        assert governor.limit == 4 and governor.adjustments == 1
+        governor.sample()
+        assert governor.limit == 2
+        conn.threads_running = 1
+        governor.sample()
+        assert governor.limit == 3 and governor.lowest == 2
+    finally:
+        governor.stop()
+
+def test_sample_failure_keeps_limit():
+    pool = FakePool(pymysql.err.OperationalError(2003, "Can't connect"))
+    governor = ConcurrencyGovernor(pool, max_workers=6)
+    governor.sample()
+    governor.sample()
+    assert governor.limit == 6 and pool.acquired == 2
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("自适应并发测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试分段哈希(hash 模式)删除/漂移检测
+
+使用 sqlite 内存库模拟源表和目标表,注册 CRC32/BIT_XOR 等 MySQL 函数,
+验证:
+1. 两端一致时不拉取任何主键
+2. 多余记录和内容不一致记录都能被找到
+3. 整数主键(区间切分)、字符串主键和复合主键(按主键顺序切分)结果一致
+4. 非整数主键的分段条件都是主键范围,不对主键计算 CRC32 取模
+5. 整数主键接近 BIGINT 上下限时分段不溢出(不对主键做减法)
+"""
+from fakes import SqliteConnection
+from sync import diff_by_hash_ranges, split_int_range
+
+def make_table(key_type, rows, ddl=None):
+    return SqliteConnection().load(ddl or f"CREATE TABLE t (id {key_type} PRIMARY KEY, name TEXT)", rows)
+
+def build_pair(key_type, make_key):
+    src_rows = [(make_key(i), f"name{i}") for i in range(5000)]
+    dest_rows = list(src_rows)
+    # 源表删除 3 条,修改 2 条
+    deleted = {make_key(17), make_key(2500), make_key(4999)}
+    src_rows = [row for row in src_rows if row[0] not in deleted]
+    src_rows = [(k, 'changed' if k in (make_key(10), make_key(3000)) else v) for k, v in src_rows]
+    return make_table(key_type, src_rows), make_table(key_type, dest_rows), deleted
+
+def test_split_int_range():
+    step, children = split_int_range(1, 10, 4)
+    assert step == 3
+    assert children == [(0, 1, 3), (1, 4, 6), (2, 7, 9), (3, 10, 10)]
+
+def test_integer_key_diff():
+    src, dest, deleted = build_pair('INTEGER', lambda i: i)
+    orphans, drift, _ = diff_by_hash_ranges(
+        src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'bigint'}, fanout=8, leaf_rows=50
+    )
+    assert {key[0] for key in orphans} == deleted
+    assert drift == 2
+
+def test_integer_key_near_bigint_limits():
+    keys = [-2**63 + i for i in range(300)] + [2**63 - 1 - i for i in range(300)]
+    rows = [(k, f"name{k}") for k in keys]
+    deleted = {-2**63, -2**63 + 150, 2**63 - 1, 2**63 - 200}
+    src = make_table('INTEGER', [row for row in rows if row[0] not in deleted])
+    dest = make_table('INTEGER', rows)
+    orphans, drift, _ = diff_by_hash_ranges(
+        src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'bigint'}, fanout=8, leaf_rows=50
+    )
+    assert {key[0] for key in orphans} == deleted
+    assert drift == 0
+    assert not any('FLOOR(' in q for q in src.statements + dest.statements)
+
+def test_string_key_diff():
+    src, dest, deleted = build_pair('TEXT', lambda i: f"key-{i}")
+    orphans, drift, _ = diff_by_hash_ranges(
+        src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'varchar'}, fanout=8, leaf_rows=50
+    )
+    assert {key[0] for key in orphans} == deleted
+    assert drift == 2
+
+def test_string_key_ranges_follow_key_order():
+    src, dest, _ = build_pair('TEXT', lambda i: f"key-{i}")
+    diff_by_hash_ranges(src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'varchar'}, fanout=8, leaf_rows=50)
+    assert any('ORDER BY `id` LIMIT 1 OFFSET' in q for q in src.statements)
+    assert not any('CRC32(CONCAT_WS(\'#\', `id`))' in q for q in src.statements + dest.statements)
+
+def test_composite_key_diff():
+    ddl = "CREATE TABLE t (a INTEGER, b TEXT, name TEXT, PRIMARY KEY (a, b))"
+    src_rows = [(i // 100, f"b{i % 100:02d}", f"name{i}") for i in range(5000)]
+    dest_rows = list(src_rows) + [(7, 'b99x', 'orphan'), (48, 'zz', 'orphan')]
+    src_rows[1234] = src_rows[1234][:2] + ('changed',)
+    src, dest = make_table(None, src_rows, ddl), make_table(None, dest_rows, ddl)
+    orphans, drift, _ = diff_by_hash_ranges(
+        src, dest, 't', ['a', 'b'], ['`a`', '`b`', '`name`'], {'a': 'int', 'b': 'varchar'}, fanout=8, leaf_rows=50
+    )
+    assert sorted(orphans) == [(7, 'b99x'), (48, 'zz')]
+    assert drift == 1
+
+def test_identical_string_keys_compare_once():
+    rows = [(f"key-{i}", f"name{i}") for i in range(5000)]
+    src, dest = make_table('TEXT', rows), make_table('TEXT', rows)
+    orphans, drift, compared = diff_by_hash_ranges(
+        src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'varchar'}, fanout=8, leaf_rows=50
+    )
+    assert orphans == [] and drift == 0 and compared == 1 and len(src.statements) == 1
+
+def test_identical_tables_transfer_only_digests():
+    rows = [(i, f"name{i}") for i in range(5000)]
+    src = make_table('INTEGER', rows)
+    dest = make_table('INTEGER', rows)
+    orphans, drift, _ = diff_by_hash_ranges(
+        src, dest, 't', ['id'], ['`id`', '`name`'], {'id': 'int'}, fanout=8, leaf_rows=50
+    )
+    assert orphans == [] and drift == 0
+    # 只有 MIN/MAX 和一次分段摘要查询
+    assert len(src.statements) == 2
+    assert all('GROUP BY' in q or 'MIN(' in q for q in src.statements)
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("分段哈希检测测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
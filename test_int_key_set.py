@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+测试 set 模式下整数单主键的 int64 数组差集(不依赖数据库;未安装 numpy 时只测试回退路径)
+
+测试场景:
+1. 分批读取的整数主键拼接为 int64 数组
+2. 差集与 Python 集合结果一致,按主键升序返回
+3. BIGINT UNSIGNED 超出 int64 时回退为元组集合
+4. 复合主键、字符串主键或未安装 numpy 时使用元组集合
+"""
+import random
+
+import pytest
+
+import sync
+from fakes import FakeConnection
+from sync import detect_and_delete_orphaned_records
+
+def key_table(rows):
+    """查询返回 rows 中的主键,DELETE 按参数个数计算删除的行数"""
+    return FakeConnection(key_width=len(rows[0]) if rows else 1).on(lambda sql: not sql.startswith("DELETE"), rows)
+
+def deleted_params(conn):
+    return [value for sql, params in conn.calls if sql.startswith("DELETE") for value in params]
+
+def run_set_detect(src_rows, dest_rows, pk_fields=('id',), types=None):
+    src, dest = key_table(src_rows), key_table(dest_rows)
+    deleted, _, _ = detect_and_delete_orphaned_records(
+        src, dest, 't', list(pk_fields), {'db': 'db'}, mode='set',
+        column_types=types or {'id': 'bigint'}
+    )
+    return deleted, dest
+
+def test_int_keys_use_numpy_arrays():
+    if sync.np is None:
+        pytest.skip("未安装 numpy")
+    conn = key_table([(i,) for i in range(25000)])
+    keys = sync.fetch_int_keys(conn, 't', 'id', fetch_size=10000)
+    assert keys.dtype == sync.np.int64 and len(keys) == 25000
+    assert len(sync.fetch_int_keys(key_table([]), 't', 'id')) == 0
+
+def test_numpy_diff_matches_set():
+    if sync.np is None:
+        pytest.skip("未安装 numpy")
+    rng = random.Random(7)
+    src_rows = [(k,) for k in rng.sample(range(1, 10 ** 12), 30000)]
+    dest_rows = src_rows[:20000] + [(k,) for k in rng.sample(range(10 ** 12, 2 * 10 ** 12), 500)]
+    rng.shuffle(dest_rows)
+    orphaned = sync.find_orphaned_int_pks_numpy(key_table(src_rows), key_table(dest_rows), 't', 'id')
+    expected = sorted(set(dest_rows) - set(src_rows))
+    assert orphaned == expected and all(type(key[0]) is int for key in orphaned)
+
+    deleted, dest = run_set_detect(src_rows, dest_rows)
+    assert deleted == 500 and sorted(deleted_params(dest)) == [key[0] for key in expected]
+
+def test_unsigned_overflow_falls_back():
+    if sync.np is None:
+        pytest.skip("未安装 numpy")
+    huge = 2 ** 64 - 1
+    deleted, dest = run_set_detect([(1,)], [(1,), (huge,)])
+    assert deleted == 1 and deleted_params(dest) == [huge]
+
+def test_tuple_set_fallback():
+    # 复合主键 / 字符串主键
+    deleted, dest = run_set_detect([(1, 'a')], [(1, 'a'), (1, 'b')], pk_fields=('id', 'code'),
+                                   types={'id': 'int', 'code': 'varchar'})
+    assert deleted == 1 and deleted_params(dest) == [1, 'b']
+    deleted, dest = run_set_detect([('a',)], [('a',), ('b',)], types={'id': 'varchar'})
+    assert deleted == 1 and deleted_params(dest) == ['b']
+
+    # 未安装 numpy
+    saved, sync.np = sync.np, None
+    try:
+        deleted, dest = run_set_detect([(1,), (2,)], [(1,), (2,), (3,)])
+        assert deleted == 1 and deleted_params(dest) == [3]
+    finally:
+        sync.np = saved
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("整数主键数组差集测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            try:
+                func()
+            except pytest.skip.Exception as e:
+                print(f"⏭️  {name} (跳过: {e})")
+                continue
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试删除检测的有序归并逻辑(不依赖数据库)
+
+测试场景:
+1. 单主键: 目标表多出的主键被识别
+2. 复合主键: 按元组顺序归并
+3. 源表有新增(目标表尚未同步)时不误判
+4. 与集合差集结果一致
+5. 多余记录按批次删除,每批单独提交
+6. 字符串主键按主键范围分批对比,不依赖 Python 的字符串顺序(sqlite NOCASE 模拟不区分大小写的排序规则)
+7. 排序规则下与源表相同的主键('a' 与 'A')在源库确认后不作为多余记录
+"""
+import random
+
+from fakes import FakeConnection, SqliteConnection
+from sync import iter_orphaned_pks_merge, iter_orphaned_pks_keyset, confirm_orphaned_pks, build_pk_in_clause, delete_pks_in_batches
+
+def test_single_key():
+    src = [(1,), (3,), (5,)]
+    dest = [(1,), (2,), (3,), (4,), (5,)]
+    assert list(iter_orphaned_pks_merge(src, dest)) == [(2,), (4,)]
+
+def test_composite_key():
+    src = [(1, 'a'), (1, 'c'), (2, 'a')]
+    dest = [(1, 'a'), (1, 'b'), (1, 'c'), (2, 'a'), (2, 'b')]
+    assert list(iter_orphaned_pks_merge(src, dest)) == [(1, 'b'), (2, 'b')]
+
+def test_source_ahead():
+    # 源表有目标表没有的新记录,不应影响结果
+    src = [(1,), (2,), (7,), (8,)]
+    dest = [(2,), (3,)]
+    assert list(iter_orphaned_pks_merge(src, dest)) == [(3,)]
+    assert list(iter_orphaned_pks_merge(src, [])) == []
+    assert list(iter_orphaned_pks_merge([], dest)) == [(2,), (3,)]
+
+def test_matches_set_difference():
+    rng = random.Random(42)
+    universe = [(i, f"k{i % 7}") for i in range(2000)]
+    src = sorted(rng.sample(universe, 1500))
+    dest = sorted(rng.sample(universe, 1500))
+    expected = sorted(set(dest) - set(src))
+    assert list(iter_orphaned_pks_merge(src, dest)) == expected
+
+def code_table(rows):
+    return SqliteConnection().load("CREATE TABLE t (id INTEGER, code TEXT COLLATE NOCASE, PRIMARY KEY (id, code))", rows)
+
+def test_string_keys_compared_by_range():
+    # NOCASE 下的顺序(a < B < c)与 Python 的顺序(B < a < c)不同
+    codes = ['a', 'B', 'c', 'D', 'e', 'F', 'g']
+    src_rows = [(i, code) for i in range(3) for code in codes if (i, code) not in {(0, 'B'), (2, 'g')}]
+    dest_rows = [(i, code) for i in range(3) for code in codes] + [(5, 'Z')]
+    src, dest = code_table(src_rows), code_table(dest_rows)
+    orphaned = list(iter_orphaned_pks_keyset(src, dest, 't', ['id', 'code'], fetch_size=4))
+    assert sorted(orphaned) == [(0, 'B'), (2, 'g'), (5, 'Z')]
+    # 每次读取都带 ORDER BY 主键,不对字段做 CAST;候选主键在源库确认
+    reads = [q for q in src.statements if "EXISTS" not in q]
+    assert all("ORDER BY `id`, `code`" in q and "CAST(" not in q for q in reads + dest.statements)
+    assert len(reads) == 5 and len(dest.statements) == 5
+    assert list(iter_orphaned_pks_keyset(src, code_table([]), 't', ['id', 'code'])) == []
+
+def test_collation_equal_keys_not_orphaned():
+    # 目标表 'A'/'b' 与源表 'a'/'B' 在不区分大小写的排序规则下是同一条记录,不能删除
+    src = code_table([(1, 'a'), (1, 'B'), (2, 'c')])
+    dest = code_table([(1, 'A'), (1, 'b'), (2, 'c'), (2, 'd')])
+    assert list(iter_orphaned_pks_keyset(src, dest, 't', ['id', 'code'], fetch_size=2)) == [(2, 'd')]
+    assert list(iter_orphaned_pks_keyset(src, dest, 't', ['id', 'code'])) == [(2, 'd')]
+    assert confirm_orphaned_pks(src, 't', ['id', 'code'], [(1, 'A'), (3, 'a'), (2, 'C')], batch_size=2) == [(3, 'a')]
+    assert confirm_orphaned_pks(src, 't', ['id', 'code'], []) == []
+
+def test_in_clause():
+    assert build_pk_in_clause(['id'], 3) == "`id` IN (%s, %s, %s)"
+    assert build_pk_in_clause(['a', 'b'], 2) == "(`a`, `b`) IN ((%s, %s), (%s, %s))"
+
+def test_batched_delete_single_key():
+    conn = FakeConnection()
+    pks = [(i,) for i in range(25)]
+    deleted, elapsed = delete_pks_in_batches(conn, 't', ['id'], iter(pks), batch_size=10)
+    assert deleted == 25
+    assert elapsed >= 0
+    assert conn.commits == 3
+    assert [len(params) for _, params in conn.calls] == [10, 10, 5]
+
+def test_batched_delete_composite_key():
+    conn = FakeConnection(key_width=2)
+    pks = [(i, f"k{i}") for i in range(5)]
+    deleted, _ = delete_pks_in_batches(conn, 't', ['a', 'b'], pks, batch_size=2)
+    assert deleted == 5
+    assert conn.commits == 3
+    sql, params = conn.calls[0]
+    assert "(`a`, `b`) IN ((%s, %s), (%s, %s))" in sql
+    assert params == [0, 'k0', 1, 'k1']
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("删除检测有序归并测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+测试每张表的阶段耗时/吞吐指标(不依赖数据库)
+
+测试场景:
+1. 阶段耗时累加,传输行数/字节数累加
+2. 根据结果消息判断状态
+3. p50/p95 使用最近秩百分位数,无新数据的表不计入单表耗时
+4. export 追加 JSON lines、整体替换 Prometheus 文件,并清空已写出的记录
+5. 解析 DataX 输出的 job 统计,写入行数扣除脏数据
+6. 传输速度低于历史基线时标记为吞吐下降
+"""
+import json
+import os
+import tempfile
+
+from fakes import MemoryStore
+from sync import (TableResult, MetricsCollector, CheckpointManager, percentile, classify_result,
+                  parse_datax_stats, build_datax_result, check_throughput)
+
+DATAX_OUTPUT = """
+2025-12-09 10:00:02.100 [job-0] INFO  StandAloneJobContainerCommunicator - Total 40000 records, 4000000 bytes | Speed 390.63KB/s, 4000 records/s | Error 0 records, 0 bytes |  All Task WaitWriterTime 0.100s |  All Task WaitReaderTime 1.200s | Percentage 33.33%
+2025-12-09 10:00:12.345 [job-0] INFO  StandAloneJobContainerCommunicator - Total 120000 records, 12345678 bytes | Speed 1.18MB/s, 10000 records/s | Error 3 records, 120 bytes |  All Task WaitWriterTime 0.523s |  All Task WaitReaderTime 10.234s | Percentage 100.00%
+2025-12-09 10:00:12.350 [job-0] INFO  JobContainer -
+任务启动时刻                    : 2025-12-09 10:00:00
+任务结束时刻                    : 2025-12-09 10:00:12
+任务总计耗时                    :                 12s
+任务平均流量                    :            1.18MB/s
+记录写入速度                    :          10000rec/s
+读出记录总数                    :              120000
+读写失败总数                    :                   3
+"""
+
+def make_record(table, msg, seconds, rows=0, deleted=0, phases=None):
+    record = TableResult(table)
+    record.add_transfer('native', {'rows': rows, 'seconds': seconds})
+    record.rows_deleted = deleted
+    record.phases = dict(phases or {'transfer': seconds})
+    record.finish(msg)
+    record.seconds = seconds
+    return record
+
+def test_phases_and_transfer_totals():
+    record = TableResult('t')
+    with record.phase('transfer'):
+        pass
+    with record.phase('transfer'):
+        pass
+    assert set(record.phases) == {'transfer'} and record.phases['transfer'] >= 0
+    record.add_transfer('load', {'rows': 10, 'seconds': 1.0, 'bytes': 300})
+    record.add_transfer('load', {'rows': 5, 'seconds': 1.0, 'bytes': 100})
+    record.add_transfer('datax', {'rows': None, 'seconds': 1.0})
+    assert (record.rows_read, record.rows_written, record.bytes) == (15, 15, 400)
+    record.finish("🚀 t: 增量同步 [✅ 成功]")
+    assert record.status == 'ok' and record.to_dict()['engine'] == 'datax'
+
+def test_classify_result():
+    assert classify_result("🚀 t: 增量同步 [✅ 成功]") == 'ok'
+    assert classify_result("⏹️ t: 无新数据") == 'skipped'
+    assert classify_result("❌ t 失败!\n    原因: x") == 'failed'
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 95) == 3.0
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([4, 1, 3, 2], 50) == 2
+
+def test_summary_excludes_skipped_tables():
+    metrics = MetricsCollector(None, None)
+    metrics.add(make_record('a', "🚀 a [✅ 成功]", 10.0, rows=100, deleted=2))
+    metrics.add(make_record('b', "🚀 b [✅ 成功]", 2.0, rows=5))
+    metrics.add(make_record('c', "⏹️ c: 无新数据", 0.1, phases={'prepare': 0.1}))
+    metrics.add(make_record('d', "❌ d 失败!", 4.0))
+    metrics.run_phases['catalog'] = 1.5
+    summary = metrics.summary()
+    assert summary['status'] == {'ok': 2, 'skipped': 1, 'failed': 1}
+    assert summary['rows_written'] == 105 and summary['rows_deleted'] == 2
+    assert summary['table_seconds_count'] == 3
+    assert summary['table_seconds_p50'] == 4.0 and summary['table_seconds_p95'] == 10.0
+    assert summary['phases'] == {'catalog': 1.5, 'transfer': 16.0, 'prepare': 0.1}
+
+def test_export_writes_jsonl_and_prometheus():
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl_path = os.path.join(tmp, 'metrics.jsonl')
+        prom_path = os.path.join(tmp, 'sync.prom')
+        metrics = MetricsCollector(jsonl_path, prom_path)
+        metrics.add(make_record('mt_"part"', "🚀 mt_part [✅ 成功]", 3.0, rows=7))
+        summary = metrics.export()
+        assert summary['tables'] == 1 and metrics.records == []
+
+        lines = [json.loads(line) for line in open(jsonl_path, encoding='utf-8')]
+        assert [line['type'] for line in lines] == ['table', 'run']
+        assert lines[0]['table'] == 'mt_"part"' and lines[0]['rows_written'] == 7
+        assert lines[0]['run'] == lines[1]['started_at']
+
+        prom = open(prom_path, encoding='utf-8').read()
+        assert 'mysql_sync_table_duration_seconds{quantile="0.95"} 3.0' in prom
+        assert 'mysql_sync_table_duration_seconds_count 1' in prom
+        assert 'mysql_sync_run_rows{kind="written"} 7' in prom
+        assert 'mysql_sync_table_rows_written{table="mt_\\"part\\""} 7' in prom
+        assert not os.path.exists(prom_path + ".tmp")
+
+        # 第二次 export 追加 JSON lines,Prometheus 文件整体替换
+        metrics.export()
+        assert len(open(jsonl_path, encoding='utf-8').readlines()) == 3
+        assert 'mysql_sync_run_tables{status="ok"} 0' in open(prom_path, encoding='utf-8').read()
+
+def test_parse_datax_stats():
+    stats = parse_datax_stats(DATAX_OUTPUT)
+    assert stats['records'] == 120000 and stats['bytes'] == 12345678
+    assert stats['error_records'] == 3 and stats['task_seconds'] == 12
+    assert stats['wait_reader_seconds'] == 10.234 and stats['wait_writer_seconds'] == 0.523
+    assert parse_datax_stats("Exception in thread main") is None
+
+    result = build_datax_result(True, stats, started=0.0)
+    assert result['rows'] == 119997 and result['rows_read'] == 120000
+    record = TableResult('t')
+    record.add_transfer('datax', dict(result, seconds=15.0))
+    assert (record.rows_written, record.error_records, record.startup_seconds) == (119997, 3, 3.0)
+    assert build_datax_result(True, None, started=0.0)['rows'] is None
+
+def test_throughput_regression():
+    checkpoints = CheckpointManager(MemoryStore())
+    first = TableResult('t')
+    first.engine = 'datax'
+    check_throughput(checkpoints, first, 100000, 10.0)
+    assert first.throughput == 10000.0 and first.baseline is None and not first.regressed
+
+    slow = TableResult('t')
+    slow.engine = 'datax'
+    check_throughput(checkpoints, slow, 100000, 40.0)
+    assert slow.baseline == 10000.0 and slow.regressed
+    assert checkpoints.get('t', namespace='throughput') == {'engine': 'datax', 'rows_per_sec': 7750.0}
+
+    # 行数太少或换了引擎时不比较
+    small = TableResult('t')
+    small.engine = 'datax'
+    check_throughput(checkpoints, small, 10, 10.0)
+    assert small.throughput is None and not small.regressed
+    native = TableResult('t')
+    native.engine = 'native'
+    check_throughput(checkpoints, native, 100000, 100.0)
+    assert native.baseline is None and not native.regressed
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("运行指标测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试进程内(native)传输引擎(不依赖数据库)
+
+测试场景:
+1. REPLACE / ON DUPLICATE KEY UPDATE 语句能被 pymysql executemany 改写为多行语句
+2. 按批次读取、写入并提交
+3. 写入失败时回滚并返回已写入行数
+"""
+from pymysql.cursors import RE_INSERT_VALUES
+
+import sync
+from fakes import FakeConnection
+from sync import build_write_sql, run_native_transfer
+
+COLUMNS = ['`id`', '`key`', '`editTime`']
+
+def dest_connection(fail_on=None):
+    """fail_on 不为空时第 fail_on 批(从 0 开始)写入失败"""
+    dest = FakeConnection()
+
+    def write(sql, rows):
+        if fail_on is not None and len(dest.calls) - 1 == fail_on:
+            raise RuntimeError("Duplicate entry")
+        return []
+    return dest.on("", write)
+
+def test_write_sql_is_batchable():
+    for mode in ('replace', 'update'):
+        sql = build_write_sql('mt_part', COLUMNS, write_mode=mode)
+        assert RE_INSERT_VALUES.match(sql), sql
+    assert build_write_sql('t', COLUMNS, 'replace').startswith("REPLACE INTO `t`")
+    assert "`key` = VALUES(`key`)" in build_write_sql('t', COLUMNS, 'update')
+
+def test_native_transfer_batches():
+    rows = [(i, f"k{i}", '2025-12-09 00:00:00') for i in range(5)]
+    src = FakeConnection().on("SELECT", rows)
+    dest = dest_connection()
+    original = sync.NATIVE_BATCH_SIZE
+    sync.NATIVE_BATCH_SIZE = 2
+    try:
+        result = run_native_transfer('t', COLUMNS, "editTime > '2025-01-01'", src, dest)
+    finally:
+        sync.NATIVE_BATCH_SIZE = original
+    assert result['ok'] and result['rows'] == 5
+    assert [len(b) for _, b in dest.calls] == [2, 2, 1]
+    assert dest.commits == 3
+    assert src.statements[-1].endswith("WHERE editTime > '2025-01-01'")
+
+def test_native_transfer_failure():
+    rows = [(i, f"k{i}", None) for i in range(5)]
+    dest = dest_connection(fail_on=1)
+    original = sync.NATIVE_BATCH_SIZE
+    sync.NATIVE_BATCH_SIZE = 2
+    try:
+        result = run_native_transfer('t', COLUMNS, "1=1", FakeConnection().on("SELECT", rows), dest)
+    finally:
+        sync.NATIVE_BATCH_SIZE = original
+    assert not result['ok']
+    assert result['rows'] == 2
+    assert dest.rollbacks == 1
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("native 传输引擎测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试 (editTime, 主键) 复合水位和分段续传
+
+使用 sqlite 内存库模拟源表,验证:
+1. 旧格式(editTime 字符串)的 checkpoint 仍可读取
+2. keyset 条件按字段顺序比较
+3. 分段覆盖全部记录且互不重叠(包括同一 editTime 跨段的情况)
+4. 传输中途失败后,下次运行从最后成功的分段继续
+"""
+import sync
+from fakes import FakePool, MemoryStore, SqliteConnection
+from sync import (CheckpointManager, MetricsCollector, make_watermark, parse_watermark, build_keyset_condition,
+                  iter_sync_chunks, process_table)
+
+def make_table(rows):
+    return SqliteConnection().load("CREATE TABLE t (id INTEGER PRIMARY KEY, editTime TEXT, name TEXT)", rows)
+
+def select_ids(conn, where_clause):
+    return [row[0] for row in conn.raw.execute(f"SELECT id FROM t WHERE {where_clause}")]
+
+# 10 条记录,editTime 有重复,分段边界会落在同一 editTime 中间
+ROWS = [(i, f"2025-12-09 0{i // 3}:00:00", f"name{i}") for i in range(10)]
+
+def test_legacy_watermark():
+    assert parse_watermark("2025-12-09 09:15:00") == ("2025-12-09 09:15:00", None)
+    assert parse_watermark(make_watermark("2025-12-09 09:15:00", (42,))) == ("2025-12-09 09:15:00", (42,))
+    assert parse_watermark(make_watermark(None, (7,))) == (None, (7,))
+    assert parse_watermark(None) == (None, None)
+
+def test_keyset_condition():
+    assert build_keyset_condition(['id'], (5,), '>') == "((`id` > 5))"
+    assert build_keyset_condition(['editTime', 'id'], ('2025-12-09', 5), '<=') == (
+        "((`editTime` < '2025-12-09') OR (`editTime` = '2025-12-09' AND `id` < 5) "
+        "OR (`editTime` = '2025-12-09' AND `id` = 5))"
+    )
+
+def test_chunks_cover_all_rows_once():
+    conn = make_table(ROWS)
+    plan = {'table': 't', 'chunk_keys': ['editTime', 'id'],
+            'lower_clause': "editTime > '1970-01-01 00:00:00'", 'upper_clause': "editTime <= '2025-12-09 03:00:00'"}
+    chunks = list(iter_sync_chunks(conn, plan, chunk_rows=4))
+    assert [boundary for _, boundary in chunks] == [("2025-12-09 01:00:00", 3), ("2025-12-09 02:00:00", 7), None]
+    ids = [i for where, _ in chunks for i in select_ids(conn, where)]
+    assert sorted(ids) == list(range(10))
+
+def test_resume_after_failure():
+    src = make_table(ROWS)
+    copied = []
+    calls = {'n': 0, 'fail_on': 2}
+
+    def flaky_engine(table, columns_quoted, where_clause, src_conn, dest_conn, split_pk=None, channels=1,
+                     dest_table=None):
+        calls['n'] += 1
+        if calls['n'] == calls['fail_on']:
+            return {'ok': False, 'error': 'Communications link failure', 'log': '', 'rows': None, 'seconds': 0.0}
+        rows = select_ids(src, where_clause)
+        copied.extend(rows)
+        return {'ok': True, 'error': None, 'log': '', 'rows': len(rows), 'seconds': 0.0}
+
+    saved = (sync.src_pool, sync.dest_pool, sync.src_catalog, sync.dest_catalog, sync.SYNC_CHUNK_ROWS)
+    sync.src_pool = sync.dest_pool = FakePool(src)
+    sync.src_catalog = {
+        'tables': {'t': {'columns': ['id', 'editTime', 'name'], 'types': {'id': 'int'},
+                         'primary_keys': ['id'], 'has_edittime': True}},
+        'stats': {'t': {'rows': 10}},
+    }
+    sync.dest_catalog = {'tables': {}, 'stats': {}}
+    sync.SYNC_CHUNK_ROWS = 4
+    sync.TRANSFER_ENGINES['flaky'] = flaky_engine
+    try:
+        checkpoints = CheckpointManager(MemoryStore())
+        metrics = MetricsCollector(None, None)
+        result = process_table('t', detect_deletes=False, engine='flaky', checkpoints=checkpoints, metrics=metrics)
+        assert result.message.startswith("❌ t 失败!") and "已完成 1 段" in result.message
+        assert metrics.records == [result]
+        assert result.status == 'failed' and result.rows_written == 4
+        assert {'connect', 'prepare', 'transfer'} <= set(result.phases)
+        assert copied == [0, 1, 2, 3]
+        assert checkpoints.get('t') == make_watermark("2025-12-09 01:00:00", (3,))
+        
+        result = process_table('t', detect_deletes=False, engine='flaky', checkpoints=checkpoints)
+        assert result.status == 'ok', result.message
+        # 第二次运行从 (01:00:00, 3) 之后继续,没有重复复制
+        assert copied == list(range(10))
+        assert checkpoints.get('t') == make_watermark("2025-12-09 03:00:00")
+        
+        result = process_table('t', detect_deletes=False, engine='flaky', checkpoints=checkpoints)
+        assert result.status == 'skipped' and result.message.startswith("⏹️")
+    finally:
+        sync.src_pool, sync.dest_pool, sync.src_catalog, sync.dest_catalog, sync.SYNC_CHUNK_ROWS = saved
+        del sync.TRANSFER_ENGINES['flaky']
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("复合水位与分段续传测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+测试按预计耗时从大到小(LPT)调度(不依赖数据库)
+"""
+import heapq
+
+from sync import estimate_table_cost, order_by_expected_cost
+
+def simulate_makespan(durations, workers):
+    """模拟线程池按提交顺序取任务时的整体完成时间"""
+    finish = [0.0] * workers
+    for duration in durations:
+        earliest = heapq.heappop(finish)
+        heapq.heappush(finish, earliest + duration)
+    return max(finish)
+
+def test_cost_model():
+    big_full = {'rows': 50_000_000, 'data_length': 20 * 1024 ** 3, 'update_time': None}
+    small = {'rows': 100, 'data_length': 16384, 'update_time': None}
+    unchanged = {'rows': 1_000_000, 'data_length': 1024 ** 3, 'update_time': '2025-12-01 00:00:00'}
+    incremental = dict(unchanged, update_time='2025-12-10 00:00:00')
+    with_edittime = {'has_edittime': True}
+
+    assert estimate_table_cost('big', big_full) > estimate_table_cost('small', small)
+    # 增量表比同样大小的全量表便宜,UPDATE_TIME 早于 checkpoint 的表更便宜
+    full_cost = estimate_table_cost('t', incremental, {'has_edittime': False})
+    incr_cost = estimate_table_cost('t', incremental, with_edittime, '2025-12-09 00:00:00')
+    idle_cost = estimate_table_cost('t', unchanged, with_edittime, '2025-12-09 00:00:00')
+    assert full_cost > incr_cost > idle_cost
+    # --full 时按全量估算
+    assert estimate_table_cost('t', incremental, with_edittime, '2025-12-09 00:00:00', force_full_sync=True) == full_cost
+    # 没有统计信息的表排在最前
+    assert estimate_table_cost('unknown', None) == float('inf')
+
+def test_lpt_reduces_makespan():
+    # 一张 30 分钟的大表恰好排在 SHOW TABLES 的最后
+    durations = [1.0] * 40 + [30.0]
+    in_show_tables_order = simulate_makespan(durations, workers=8)
+    lpt = simulate_makespan(order_by_expected_cost(durations, lambda d: d), workers=8)
+    assert in_show_tables_order == 35.0
+    assert lpt == 30.0
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("LPT 调度测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
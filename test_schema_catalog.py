@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试元数据目录的批量加载与缓存(不依赖数据库)
+
+测试场景:
+1. 两条批量查询即可得到所有表的字段、类型、主键和 editTime 信息
+2. 结构指纹不变时使用缓存,不再查询字段和主键
+3. 结构指纹变化时重新加载
+4. 读取统计信息前关闭 information_schema 缓存,无法关闭时不使用 UPDATE_TIME
+"""
+import pymysql
+
+from fakes import FakeConnection
+from sync import load_schema_catalog, fetch_table_stats
+
+def catalog_connection(fingerprint=12345, set_error=None):
+    """按查询的元数据表返回固定结果,SET SESSION 返回 set_error"""
+    return (FakeConnection()
+            .on("SET SESSION", set_error or [])
+            .on("SUM(CRC32", [(4, fingerprint)])
+            .on("KEY_COLUMN_USAGE", [('mt_part', 'id'), ('mt_link', 'a'), ('mt_link', 'b')])
+            .on("information_schema.COLUMNS", [('mt_link', 'a', 'INT'), ('mt_link', 'b', 'varchar'),
+                                               ('mt_part', 'id', 'bigint'), ('mt_part', 'editTime', 'datetime')])
+            .on("information_schema.TABLES", [('mt_link', 10, 16384, None),
+                                              ('mt_part', 500, 65536, '2025-12-09 10:00:00')]))
+
+def queries(conn):
+    return [sql for sql in conn.statements if not sql.startswith("SET SESSION")]
+
+def test_bulk_load():
+    conn = catalog_connection()
+    catalog = load_schema_catalog(conn, 'meicloud_plm')
+    assert not catalog['from_cache']
+    part = catalog['tables']['mt_part']
+    assert part['columns'] == ['id', 'editTime']
+    assert part['primary_keys'] == ['id']
+    assert part['has_edittime'] and part['types']['id'] == 'bigint'
+    link = catalog['tables']['mt_link']
+    assert link['primary_keys'] == ['a', 'b'] and not link['has_edittime']
+    assert link['types']['a'] == 'int'
+    assert catalog['stats']['mt_part']['rows'] == 500
+    # 指纹 + 字段 + 主键 + 统计,与表的数量无关
+    assert len(queries(conn)) == 4
+
+def test_cache_hit_and_miss():
+    cached = load_schema_catalog(catalog_connection(), 'meicloud_plm')
+    conn = catalog_connection()
+    catalog = load_schema_catalog(conn, 'meicloud_plm', cached)
+    assert catalog['from_cache']
+    assert catalog['tables'] == cached['tables']
+    assert len(queries(conn)) == 2
+    
+    conn = catalog_connection(fingerprint=999)
+    catalog = load_schema_catalog(conn, 'meicloud_plm', cached)
+    assert not catalog['from_cache']
+    assert len(queries(conn)) == 4
+
+def test_stats_cache_disabled():
+    conn = catalog_connection()
+    stats = fetch_table_stats(conn, 'meicloud_plm')
+    assert conn.statements[0] == "SET SESSION information_schema_stats_expiry = 0"
+    assert stats['mt_part']['update_time'] == '2025-12-09 10:00:00'
+    # 5.7 / MariaDB 没有该变量(不缓存统计信息): UPDATE_TIME 仍可使用
+    conn = catalog_connection(set_error=pymysql.err.InternalError(1193, "Unknown system variable"))
+    assert fetch_table_stats(conn, 'meicloud_plm')['mt_part']['update_time'] == '2025-12-09 10:00:00'
+    # 其他原因设置失败: UPDATE_TIME 可能是缓存值,不使用
+    conn = catalog_connection(set_error=pymysql.err.OperationalError(1227, "Access denied"))
+    stats = fetch_table_stats(conn, 'meicloud_plm')
+    assert stats['mt_part']['update_time'] is None and stats['mt_part']['rows'] == 500
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("元数据目录测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+测试跳过未变化的表(不依赖数据库)
+
+测试场景:
+1. UPDATE_TIME 与上次成功同步时一致的表被跳过
+2. 无 editTime 的表只在显式开启时通过 CHECKSUM TABLE 判断,一次查询覆盖所有表
+3. 与当前时间同一秒的 UPDATE_TIME 不作为依据
+4. 表开始写入后状态被作废,只有同步成功后才重新记录
+"""
+from fakes import FakeConnection, MemoryStore
+from sync import (CheckpointManager, TABLE_STATE, observe_table_states, find_unchanged_tables,
+                  is_table_unchanged, finish_table_sync)
+
+def source_connection(now, checksums):
+    return (FakeConnection()
+            .on("SELECT NOW()", [(now,)])
+            .on("CHECKSUM TABLE", [(f"plm.{name}", value) for name, value in checksums.items()]))
+
+CATALOG = {
+    'tables': {
+        'mt_part': {'has_edittime': True},
+        'sys_config': {'has_edittime': False},
+        'sys_dict': {'has_edittime': False},
+    },
+    'stats': {
+        'mt_part': {'update_time': '2025-12-09 08:00:00'},
+        'sys_config': {'update_time': None},
+        'sys_dict': {'update_time': '2025-12-09 09:15:00'},
+    },
+}
+
+def test_observe_states():
+    conn = source_connection('2025-12-09 09:15:00', {'sys_config': 111, 'sys_dict': 222})
+    # 默认不执行 CHECKSUM TABLE(扫描整表并阻塞写入)
+    states = observe_table_states(conn, ['mt_part', 'sys_config', 'sys_dict'], CATALOG)
+    assert states == {'mt_part': {'update_time': '2025-12-09 08:00:00'},
+                      'sys_config': {'update_time': None}, 'sys_dict': {'update_time': None}}
+    assert not any(q.startswith("CHECKSUM") for q in conn.statements)
+
+    conn = source_connection('2025-12-09 09:15:00', {'sys_config': 111, 'sys_dict': 222})
+    states = observe_table_states(conn, ['mt_part', 'sys_config', 'sys_dict'], CATALOG, use_checksum=True)
+    assert states['mt_part'] == {'update_time': '2025-12-09 08:00:00'}
+    assert states['sys_config'] == {'update_time': None, 'checksum': 111}
+    # 与当前时间同一秒的 UPDATE_TIME 不可靠
+    assert states['sys_dict'] == {'update_time': None, 'checksum': 222}
+    assert conn.statements[1] == "CHECKSUM TABLE `sys_config`, `sys_dict`"
+
+def test_unchanged_signals():
+    assert is_table_unchanged({'update_time': 'a'}, {'update_time': 'a'})
+    assert not is_table_unchanged({'update_time': 'a'}, {'update_time': 'b'})
+    assert not is_table_unchanged({'update_time': None}, {'update_time': None})
+    assert is_table_unchanged({'update_time': None, 'checksum': 0}, {'update_time': None, 'checksum': 0})
+    assert not is_table_unchanged(None, {'update_time': 'a'})
+
+def test_find_unchanged_tables():
+    checkpoints = CheckpointManager(MemoryStore())
+    checkpoints.commit('mt_part', {'update_time': '2025-12-09 08:00:00'}, namespace=TABLE_STATE)
+    checkpoints.commit('sys_config', {'update_time': None, 'checksum': 111}, namespace=TABLE_STATE)
+    states = {
+        'mt_part': {'update_time': '2025-12-09 08:00:00'},
+        'sys_config': {'update_time': None, 'checksum': 112},
+        'sys_dict': {'update_time': '2025-12-09 07:00:00'},
+    }
+    assert find_unchanged_tables(['mt_part', 'sys_config', 'sys_dict'], states, checkpoints) == ['mt_part']
+    # 状态与水位分开保存
+    assert checkpoints.get('mt_part') is None
+
+def test_state_recorded_after_success():
+    store = MemoryStore()
+    checkpoints = CheckpointManager(store)
+    state = {'update_time': None, 'checksum': 111}
+    checkpoints.commit('sys_config', state, namespace=TABLE_STATE)
+    # 开始写入时作废(prepare_table_sync 的行为),同步成功后重新记录
+    checkpoints.commit('sys_config', None, namespace=TABLE_STATE)
+    assert checkpoints.get('sys_config', namespace=TABLE_STATE) is None
+    plan = {
+        'table': 'sys_config', 'meta': {'primary_keys': []}, 'columns_quoted': ['`id`'],
+        'current_max_time': None, 'is_incremental': False,
+        'result_msg': "🔄 sys_config: 全量同步 (无 editTime)", 'table_state': state,
+    }
+    msg = finish_table_sync(None, None, plan, detect_deletes=False, checkpoints=checkpoints)
+    assert msg.endswith("[✅ 成功]")
+    checkpoints.flush()
+    assert store.data[TABLE_STATE] == {'sys_config': state}
+    assert 'watermark' not in store.data
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("跳过未变化的表测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试整个运行共享的读取/写入流预算(不依赖数据库)
+
+测试场景:
+1. 申请的通道数限制在预算总量以内
+2. 预算不足时排队,归还后继续;同时占用不超过预算
+3. 按申请顺序先到先得,大申请不会被后来的小申请插队
+4. 排队时间计入 queue 阶段,未设置预算时不限制
+"""
+import threading
+import time
+
+from sync import StreamBudget, claim_streams, TableResult
+
+def test_fit():
+    assert StreamBudget(32, 24).fit(5) == 5
+    assert StreamBudget(4, 24).fit(5) == 4
+    assert StreamBudget(None, 3).fit(5) == 3
+    assert StreamBudget().fit(8) == 8
+
+def test_concurrent_claims_stay_within_budget():
+    budget = StreamBudget(readers=6, writers=4)
+    in_use, peak = [0], [0]
+    lock = threading.Lock()
+    def job(streams):
+        with claim_streams(budget, budget.fit(streams)):
+            with lock:
+                in_use[0] += budget.fit(streams)
+                peak[0] = max(peak[0], in_use[0])
+            time.sleep(0.01)
+            with lock:
+                in_use[0] -= budget.fit(streams)
+    threads = [threading.Thread(target=job, args=(n,)) for n in (5, 3, 2, 1, 4, 2, 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 4 and budget.peak_writers <= 4 and budget.peak_readers <= 6
+    assert budget.used_readers == budget.used_writers == 0 and budget.waits > 0
+
+def test_first_come_first_served():
+    budget = StreamBudget(readers=4, writers=4)
+    order = []
+    budget.acquire(3, 3)
+    big = threading.Thread(target=lambda: (budget.acquire(4, 4), order.append('big'), budget.release(4, 4)))
+    big.start()
+    while not budget._queue:
+        time.sleep(0.001)
+    # 剩余 1 个流足够小申请,但大申请先到,小申请需要等大申请完成
+    small = threading.Thread(target=lambda: (budget.acquire(1, 1), order.append('small'), budget.release(1, 1)))
+    small.start()
+    time.sleep(0.02)
+    assert order == []
+    budget.release(3, 3)
+    big.join()
+    small.join()
+    assert order == ['big', 'small']
+
+def test_queue_phase_recorded():
+    budget = StreamBudget(readers=1, writers=1)
+    budget.acquire(1, 1)
+    record = TableResult('t')
+    timer = threading.Timer(0.05, budget.release, args=(1, 1))
+    timer.start()
+    with claim_streams(budget, 1, record):
+        assert budget.used_readers == 1
+    assert record.phases['queue'] >= 0.04 and budget.used_readers == 0
+
+    record = TableResult('t')
+    with claim_streams(None, 8, record):
+        pass
+    assert 'queue' not in record.phases
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("流预算测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
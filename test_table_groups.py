@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试小表批量任务的分组、传输核对和大表切分(不依赖数据库)
+"""
+import re
+
+import sync
+from fakes import FakeConnection, FakePool
+from sync import (plan_table_groups, build_datax_content, plan_datax_split, run_datax_job,
+                  process_table_group, TableResult)
+
+def count_connection(counts):
+    """COUNT(*) 查询返回 counts 中对应表的行数"""
+    return FakeConnection().on("", lambda sql, params: [(counts[re.search(r"FROM `(\w+)`", sql).group(1)],)])
+
+def run_group(tables, src_counts, dest_counts, failed=()):
+    """
+    用假连接运行 process_table_group: native 传输只记录调用,dest_counts 为传输后目标表的行数
+    """
+    calls = {'native': [], 'finish': [], 'datax': [], 'held': []}
+    def fake_prepare(src_conn, dest_conn, table, *args):
+        return {'table': table, 'where_clause': "1=1", 'columns_quoted': ['`id`'], 'result_msg': f"🚀 {table}"}, None
+    def fake_native(table, *args, **kwargs):
+        calls['native'].append(table)
+        return {'ok': table not in failed, 'error': 'boom', 'log': '', 'rows': 1, 'seconds': 0.1}
+    def fake_finish(src_conn, dest_conn, plan, **kwargs):
+        calls['finish'].append(plan['table'])
+        return plan['result_msg'] + " [✅ 成功]"
+    def fake_process_table(table, engine=None, **kwargs):
+        calls['datax'].append((table, engine))
+        calls['held'].append(sync.src_pool.held + sync.dest_pool.held)
+        return TableResult(table).finish(f"🚀 {table}: DataX [✅ 成功]")
+    saved = {name: getattr(sync, name) for name in
+             ('src_pool', 'dest_pool', 'prepare_table_sync', 'run_native_transfer', 'finish_table_sync', 'process_table')}
+    sync.src_pool, sync.dest_pool = FakePool(count_connection(src_counts)), FakePool(count_connection(dest_counts))
+    sync.prepare_table_sync, sync.run_native_transfer = fake_prepare, fake_native
+    sync.finish_table_sync, sync.process_table = fake_finish, fake_process_table
+    try:
+        results = process_table_group(tables)
+    finally:
+        for name, value in saved.items():
+            setattr(sync, name, value)
+    return {r.table: r for r in results}, calls
+
+def test_small_tables_grouped_large_tables_single():
+    sizes = {'big': (10_000_000, 0), 'a': (10, 0), 'b': (20, 0), 'c': (30, 0)}
+    singles, groups = plan_table_groups(['big', 'a', 'b', 'c', 'unknown'], sizes, small_rows=1000)
+    assert singles == ['big', 'unknown']
+    assert groups == [['a', 'b', 'c']]
+
+def test_group_limits():
+    sizes = {f"t{i}": (100, 0) for i in range(7)}
+    tables = sorted(sizes)
+    _, groups = plan_table_groups(tables, sizes, small_rows=1000, max_tables=3, max_rows=10_000)
+    assert [len(g) for g in groups] == [3, 3]
+    # 最后剩下的单表分组改为单独运行
+    singles, groups = plan_table_groups(tables, sizes, small_rows=1000, max_tables=10, max_rows=250)
+    assert [len(g) for g in groups] == [2, 2, 2]
+    assert singles == ['t6']
+
+def test_datax_content_per_table():
+    content = build_datax_content('mt_part', ['`id`', '`key`'], "1=1")
+    assert content['reader']['parameter']['connection'][0]['table'] == ['mt_part']
+    assert content['writer']['parameter']['column'] == ['`id`', '`key`']
+    assert content['reader']['parameter']['where'] == "1=1"
+
+def test_datax_job_rejects_multiple_contents():
+    contents = [build_datax_content(t, ['`id`'], "1=1") for t in ('a', 'b')]
+    try:
+        run_datax_job('group', contents)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("多个 content 条目应当被拒绝")
+
+def test_group_transfers_each_table_and_checks_rows():
+    results, calls = run_group(['a', 'b'], {'a': 3, 'b': 5}, {'a': 3, 'b': 6})
+    assert calls['native'] == ['a', 'b'] and calls['finish'] == ['a', 'b'] and calls['datax'] == []
+    assert results['a'].message == "🚀 a (native: 1 行, 0.1 秒) (小表批量: 2 张表) [✅ 成功]"
+    # 每张表的传输行数计入各自的结果和运行汇总
+    assert results['a'].engine == 'native' and results['a'].rows_written == 1 and results['b'].rows_read == 1
+
+def test_group_falls_back_to_datax_per_table():
+    # b 传输后目标表行数少于源表,c 传输失败: 两张表都改为单独的 DataX job,checkpoint 不由批量任务提交
+    results, calls = run_group(['a', 'b', 'c'], {'a': 3, 'b': 5, 'c': 1}, {'a': 3, 'b': 4, 'c': 1}, failed={'c'})
+    assert calls['finish'] == ['a']
+    assert calls['datax'] == [('b', 'datax'), ('c', 'datax')]
+    assert results['b'].message == "🚀 b: DataX [✅ 成功]" and len(results) == 3
+    # 重跑前批量任务已归还自己的连接,不与 process_table 取的连接叠加
+    assert calls['held'] == [0, 0]
+
+def test_group_records_row_check():
+    results, _ = run_group(['a'], {'a': 3}, {'a': 3})
+    assert 'row_check' in results['a'].phases and results['a'].engine == 'native'
+
+def test_split_by_table_size():
+    meta = {'primary_keys': ['id'], 'types': {'id': 'bigint'}}
+    assert plan_datax_split(meta, {'rows': 100}, False) == (None, 1)
+    assert plan_datax_split(meta, {'rows': 1_200_000}, False, rows_per_channel=500_000) == ('id', 3)
+    assert plan_datax_split(meta, {'rows': 10 ** 9}, False, max_channels=8) == ('id', 8)
+    # 增量同步按比例估算待读取行数
+    assert plan_datax_split(meta, {'rows': 1_200_000}, True, rows_per_channel=500_000) == (None, 1)
+    # 复合主键/字符串主键/无统计信息: 单通道
+    assert plan_datax_split({'primary_keys': ['a', 'b'], 'types': {'a': 'int', 'b': 'int'}}, {'rows': 10 ** 9}, False) == (None, 1)
+    assert plan_datax_split({'primary_keys': ['code'], 'types': {'code': 'varchar'}}, {'rows': 10 ** 9}, False) == (None, 1)
+    assert plan_datax_split(meta, None, False) == (None, 1)
+
+def test_datax_content_split_pk():
+    assert 'splitPk' not in build_datax_content('t', ['`id`'], "1=1")['reader']['parameter']
+    assert build_datax_content('t', ['`id`'], "1=1", 'id')['reader']['parameter']['splitPk'] == 'id'
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("小表批量任务测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)
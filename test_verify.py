@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+测试 --verify 逐段校验(使用 sqlite 模拟两端,注册 CRC32 / CONCAT_WS / BIT_XOR 等 MySQL 函数)
+
+测试场景:
+1. 整数单主键按 MIN~MAX 等分,首段/末段不设下界/上界
+2. 字符串主键按 keyset 查找分段边界
+3. 内容修改、目标表缺失和多余的记录只报告所在分段,一致的表报告 ✅
+4. --verify-repair 只重新同步不一致的分段,修复后再次校验一致
+5. 并行修复同一张表的多个分段时,DataX 临时配置和错误日志文件互不覆盖
+"""
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import sync
+from fakes import FakePool, SqliteConnection
+from sync import plan_verify_chunks, run_verify
+
+def copy_range(table, columns_quoted, where_clause, src_conn, dest_conn, **kwargs):
+    with src_conn.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columns_quoted)} FROM `{table}` WHERE {where_clause}")
+        rows = cursor.fetchall()
+    with dest_conn.cursor() as cursor:
+        cursor.executemany(f"INSERT OR REPLACE INTO `{table}` VALUES ({', '.join('?' * len(columns_quoted))})", rows)
+    dest_conn.commit()
+    return {'ok': True, 'rows': len(rows), 'seconds': 0.0}
+
+TABLES = {
+    'orders': ("CREATE TABLE `orders` (`id` INTEGER PRIMARY KEY, `amount` INTEGER, `note` TEXT)",
+               {'columns': ['id', 'amount', 'note'], 'types': {'id': 'int'}, 'primary_keys': ['id']}),
+    'users': ("CREATE TABLE `users` (`code` TEXT PRIMARY KEY, `name` TEXT)",
+              {'columns': ['code', 'name'], 'types': {'code': 'varchar'}, 'primary_keys': ['code']}),
+}
+
+@contextmanager
+def sqlite_ends():
+    with tempfile.TemporaryDirectory() as tmp:
+        pools = tuple(FakePool(factory=lambda path=os.path.join(tmp, name): SqliteConnection(path))
+                      for name in ('src.db', 'dest.db'))
+        for pool in pools:
+            with pool.connection() as conn:
+                for ddl, _ in TABLES.values():
+                    conn.raw.execute(ddl)
+                conn.raw.executemany("INSERT INTO `orders` VALUES (?, ?, ?)",
+                                      [(i, i * 10, None if i % 7 else 'x') for i in range(1, 101)])
+                conn.raw.executemany("INSERT INTO `users` VALUES (?, ?)",
+                                      [(f"u{i:03d}", f"name{i}") for i in range(50)])
+                conn.commit()
+        catalog = {'tables': {t: meta for t, (_, meta) in TABLES.items()},
+                   'stats': {'orders': {'rows': 100}, 'users': {'rows': 50}}}
+        saved = sync.src_pool, sync.dest_pool, sync.src_catalog, sync.dest_catalog, sync.time.sleep
+        sync.src_pool, sync.dest_pool = pools
+        sync.src_catalog = sync.dest_catalog = catalog
+        sync.time.sleep = lambda seconds: None
+        sync.TRANSFER_ENGINES['copy'] = copy_range
+        try:
+            yield pools, os.path.join(tmp, 'report.json')
+        finally:
+            sync.src_pool, sync.dest_pool, sync.src_catalog, sync.dest_catalog, sync.time.sleep = saved
+            del sync.TRANSFER_ENGINES['copy']
+
+def execute(pool, *statements):
+    with pool.connection() as conn:
+        for sql in statements:
+            conn.raw.execute(sql)
+        conn.commit()
+
+def test_int_key_chunks():
+    with sqlite_ends() as ((src, _), _):
+        with src.connection() as conn:
+            chunks = plan_verify_chunks(conn, 'orders', TABLES['orders'][1], {'rows': 100}, chunk_rows=30)
+            assert chunks == ["`id` <= 25", "`id` BETWEEN 26 AND 50", "`id` BETWEEN 51 AND 75", "`id` >= 76"]
+            assert plan_verify_chunks(conn, 'orders', TABLES['orders'][1], {'rows': 100}, chunk_rows=1000) == ["1=1"]
+
+def test_keyset_chunks():
+    with sqlite_ends() as ((src, _), _):
+        with src.connection() as conn:
+            chunks = plan_verify_chunks(conn, 'users', TABLES['users'][1], None, chunk_rows=20)
+            assert len(chunks) == 3 and "'u019'" in chunks[0] and "'u039'" in chunks[1]
+            assert plan_verify_chunks(conn, 'users', dict(TABLES['users'][1], primary_keys=[]), None) == ["1=1"]
+
+def test_verify_reports_mismatched_ranges():
+    with sqlite_ends() as ((_, dest), report_file):
+        execute(dest, "UPDATE `orders` SET `amount` = 0 WHERE `id` = 30",
+                "DELETE FROM `orders` WHERE `id` = 90", "INSERT INTO `orders` VALUES (500, 1, NULL)")
+        assert run_verify(['orders', 'users'], chunk_rows=30, workers=4, report_file=report_file) == 2
+        report = json.load(open(report_file, encoding='utf-8'))
+        assert report['mismatched_chunks'] == 2
+        orders = report['tables']['orders']
+        assert orders['chunks'] == 4
+        assert orders['mismatched'] == [
+            {'where': "`id` BETWEEN 26 AND 50", 'src_rows': 25, 'dest_rows': 25},
+            {'where': "`id` >= 76", 'src_rows': 25, 'dest_rows': 25},
+        ]
+        assert report['tables']['users'] == {'chunks': 2, 'mismatched': [], 'repaired': []}
+
+def test_verify_repair_only_mismatched_ranges():
+    with sqlite_ends() as ((src, dest), report_file):
+        execute(dest, "UPDATE `users` SET `name` = 'stale' WHERE `code` = 'u025'",
+                "INSERT INTO `users` VALUES ('u030x', 'orphan')", "DELETE FROM `orders` WHERE `id` = 3")
+        assert run_verify(['orders', 'users'], chunk_rows=20, repair=True, engine='copy',
+                          workers=4, report_file=report_file) == 0
+        report = json.load(open(report_file, encoding='utf-8'))
+        assert [r['rows_written'] for r in report['tables']['orders']['repaired']] == [20]
+        assert [(r['rows_written'], r['rows_deleted']) for r in report['tables']['users']['repaired']] == [(20, 1)]
+        assert run_verify(['orders', 'users'], chunk_rows=20, report_file=report_file) == 0
+
+def test_parallel_datax_jobs_use_separate_files():
+    seen, lock = [], threading.Lock()
+    barrier = threading.Barrier(4)
+    def fake_run(cmd, **kwargs):
+        job = json.load(open(cmd[2], encoding='utf-8'))
+        barrier.wait(timeout=5)  # 四个 job 同时存在时各自的配置仍是自己的分段
+        with lock:
+            seen.append((cmd[2], job['job']['content'][0]['reader']['parameter']['where']))
+        return subprocess.CompletedProcess(cmd, 1, stdout="java.lang.Exception: boom\n")
+    saved, cwd = sync.subprocess.run, os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sync.subprocess.run = fake_run
+        try:
+            wheres = [f"`id` BETWEEN {i * 10 + 1} AND {i * 10 + 10}" for i in range(4)]
+            threads = [threading.Thread(target=sync.run_datax_transfer, args=('orders', ['`id`'], where))
+                       for where in wheres]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            logs = os.listdir(tmp)
+        finally:
+            sync.subprocess.run = saved
+            os.chdir(cwd)
+    assert len({path for path, _ in seen}) == 4
+    assert sorted(where for _, where in seen) == sorted(wheres)
+    # 临时配置已删除,每个失败的 job 各有一份错误日志
+    assert len(logs) == 4 and all(name.startswith("error_orders_") and name.endswith(".log") for name in logs)
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("数据校验测试")
+    print("=" * 70)
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("=" * 70)
+    print("✅ 所有测试通过!")
+    print("=" * 70)